@@ -13,6 +13,7 @@ import simfempy.tools.analyticalfunction
 import simfempy.tools.timer
 import simfempy.tools.iterationcounter
 import simfempy.applications.problemdata
+import simfempy.applications.coefficient
 from simfempy.tools.analyticalfunction import AnalyticalFunction
 import simfempy.solvers
 
@@ -33,7 +34,7 @@ class Application(object):
         repr += f"\n{self.timer}"
         return repr
     def __init__(self, **kwargs):
-        self.linearsolvers=['umf', 'lgmres', 'bicgstab']
+        self.linearsolvers=['umf', 'lgmres', 'gmres', 'bicgstab', 'cg']
         try:
             import pyamg
             self.linearsolvers.append('pyamg')
@@ -44,6 +45,7 @@ class Application(object):
         self.verbose = kwargs.pop('verbose', 0)
         self.linearsolver = kwargs.pop('linearsolver', 'umf')
         self.timer = simfempy.tools.timer.Timer(verbose=0)
+        self.coefficients = simfempy.applications.coefficient.Coefficients()
         if 'problemdata' in kwargs:
             self.problemdata = kwargs.get('problemdata')
             self.ncomp = self.problemdata.ncomp
@@ -67,6 +69,8 @@ class Application(object):
         self.problemdata.check(mesh)
         self.mesh = mesh
         if self.verbose: print(f"{self.mesh=}")
+        # new mesh (also with the same number of unknowns, e.g. renumbered): the AMG hierarchy is not reused
+        self.amg = simfempy.solvers.amg.AmgManager(self.build_pyamg)
         self._setMeshCalled = True
         if hasattr(self,'_generatePDforES') and self._generatePDforES:
             self.generatePoblemDataForAnalyticalSolution()
@@ -109,23 +113,11 @@ class Application(object):
         dim = self.mesh.dimension
         # print(f"defineAnalyticalSolution: {dim=} {self.ncomp=}")
         return simfempy.tools.analyticalfunction.analyticalSolution(exactsolution, dim, self.ncomp, random)
-    def compute_cell_vector_from_params(self, name, params):
-        if name in params.fct_glob:
-            fct = np.vectorize(params.fct_glob[name])
-            arr = np.empty(self.mesh.ncells)
-            for color, cells in self.mesh.cellsoflabel.items():
-                xc, yc, zc = self.mesh.pointsc[cells].T
-                arr[cells] = fct(color, xc, yc, zc)
-        elif name in params.scal_glob:
-            arr = np.full(self.mesh.ncells, params.scal_glob[name])
-        elif name in params.scal_cells:
-            arr = np.empty(self.mesh.ncells)
-            for color in params.scal_cells[name]:
-                arr[self.mesh.cellsoflabel[color]] = params.scal_cells[name][color]
-        else:
-            msg = f"{name} should be given in 'fct_glob' or 'scal_glob' or 'scal_cells' (problemdata.params)"
-            raise ValueError(msg)
-        return arr
+    def compute_cell_vector_from_params(self, name, params, u=None):
+        """
+        the coefficient 'name' on the cells, see applications.coefficient.Coefficients (a copy of the cached array)
+        """
+        return np.array(self.coefficients.cell(self.mesh, params, name, u))
     def initsolution(self, b):
         if isinstance(b,tuple):
             return [np.copy(bi) for bi in b]
@@ -162,6 +154,36 @@ class Application(object):
         self.timer.add('postp')
         result.setData(pp, timer=self.timer, iter={'lin':niter})
         return result
+    def staticBatch(self, problemdatas=None, rhs=None):
+        """
+        several load cases with the operator of self.problemdata:
+        the right-hand sides (computeRhsBatch()) are stacked as (n,k) array and solved together,
+        the matrix is computed and factorized (or preconditioned) once
+        returns a list of Results, postprocessed per case (setBatchCase())
+        """
+        if not self._setMeshCalled: self.setMesh(self.mesh)
+        self.timer.add('setMesh')
+        self.A = self.computeMatrix()
+        self.timer.add('matrix')
+        self.b = self.computeRhsBatch(problemdatas=problemdatas, rhs=rhs)
+        self.timer.add('rhs')
+        u, niter = self.linearSolverBatch(self.A, self.b, solver=self.linearsolver)
+        self.timer.add('solve')
+        results, problemdata = [], self.problemdata
+        try:
+            for i in range(u.shape[1]):
+                self.setBatchCase(i)
+                result = simfempy.applications.problemdata.Results()
+                result.setData(self.postProcess(u[:,i]), timer=self.timer, iter={'lin':niter})
+                results.append(result)
+        finally:
+            self.problemdata = problemdata
+        self.timer.add('postp')
+        return results
+    def computeRhsBatch(self, problemdatas=None, rhs=None):
+        raise NotImplementedError(f"computeRhsBatch() not written for {self.__class__.__name__}")
+    def setBatchCase(self, i):
+        raise NotImplementedError(f"setBatchCase() not written for {self.__class__.__name__}")
     def computeDefect(self, u):
         return self.computeForm(u)-self.b
     def computeForm(self, u):
@@ -226,7 +248,7 @@ class Application(object):
             self.Mass = self.fem.computeMassMatrix()
         if not hasattr(self, 'A'):
             self.Aimp = self.computeMatrix(coeffmass=1/dt/a)
-            self.ml = self.build_pyamg(self.Aimp)
+            self.ml = self.amg.hierarchy(self.Aimp) if spsp.issparse(self.Aimp) else None
         self.timer.add('matrix')
         u = u0
         self.time = t_span[0]
@@ -249,53 +271,89 @@ class Application(object):
                 self.timer.add('rhs')
                 # u, niterslinsol[iter] = self.linearSolver(self.ml, rhs, u=u, verbose=0)
                 #TODO organiser solveur linéaire
-                u, res = self.solve_pyamg(self.ml, rhs, u=u, maxiter = 100)
-                u, niterslinsol[iter] = u, len(res)
+                if self.ml is None:
+                    u, niterslinsol[iter] = self.linearSolver(self.Aimp, rhs, u=u)
+                else:
+                    u, res = self.solve_pyamg(self.ml, rhs, u=u, maxiter = 100)
+                    self.amg.report(len(res))
+                    u, niterslinsol[iter] = u, len(res)
                 # print(f"@3@{np.min(u)=} {np.max(u)=} {np.min(rhs)=} {np.max(rhs)=}")
                 self.timer.add('solve')
             result.addData(self.postProcess(u), time=self.time, iter=niterslinsol.mean())
             if callback: callback(self.time, u)
         return result
 
-    def linearSolver(self, A, b, u=None, solver = None, verbose=0):
-        if spsp.issparse(A):
+    def linearSolver(self, A, b, u=None, solver = None, verbose=0, atol=0, rtol=1e-14):
+        if spsp.issparse(A) or isinstance(A, splinalg.LinearOperator):
             if len(b.shape)!=1 or len(A.shape)!=2 or b.shape[0] != A.shape[0]:
                 raise ValueError(f"{A.shape=} {b.shape=}")
         if solver is None: solver = self.linearsolver
         if not hasattr(self, 'info'): self.info={}
         if solver not in self.linearsolvers: solver = "umf"
+        # matrix-free operators (fems.matrixfree): only Krylov methods with Jacobi
+        if not spsp.issparse(A) and solver in ['umf', 'pyamg']: solver = 'lgmres'
         if solver == 'umf':
-            return splinalg.spsolve(A, b), 1
-            return splinalg.spsolve(A, b, permc_spec='COLAMD'), 1
+            # factorizations are shared (same matrix: initialCondition(), static() with new data, dynamic())
+            return simfempy.solvers.direct.cache.solve(A, b), 1
         elif solver in ['gmres','lgmres','bicgstab','cg']:
-            if solver == 'cg':
-                def gaussSeidel(A):
-                    dd = A.diagonal()
-                    D = spsp.dia_matrix(A.shape)
-                    D.setdiag(dd)
-                    L = spsp.tril(A, -1)
-                    U = spsp.triu(A, 1)
-                    return splinalg.factorized(D + L)
-                M2 = gaussSeidel(A)
-            else:
-                # defaults: drop_tol=0.0001, fill_factor=10
-                M2 = splinalg.spilu(A.tocsc(), drop_tol=0.1, fill_factor=3)
-            M_x = lambda x: M2.solve(x)
-            M = splinalg.LinearOperator(A.shape, M_x)
-            counter = simfempy.tools.iterationcounter.IterationCounter(name=solver, verbose=verbose)
-            args=""
-            cmd = "u = splinalg.{}(A, b, M=M, tol=1e-14, callback=counter {})".format(solver,args)
-            exec(cmd)
-            return u, counter.niter
+            M = self.krylovPreconditioner(A, solver)
+            return self.solveKrylov(A, b, u, M, solver, verbose, atol, rtol)
         elif solver == 'pyamg':
-            ml = self.build_pyamg(A)
+            ml = self.amg.hierarchy(A)
             maxiter = 100
             u, res = self.solve_pyamg(ml, b, u, maxiter)
+            self.amg.report(len(res))
             if len(res) >= maxiter: raise ValueError(f"***no convergence {res=}")
             if(verbose): print('niter ({}) {:4d} ({:7.1e})'.format(solver, len(res),res[-1]/res[0]))
             return u, len(res)
         else:
             raise NotImplementedError("unknown solve '{}'".format(solver))
+    def krylovPreconditioner(self, A, solver):
+        if not spsp.issparse(A):
+            return A.jacobi()
+        if solver == 'cg':
+            # symmetric Gauss-Seidel M = (D+L) D^{-1} (D+U), cg needs a symmetric preconditioner
+            D = A.diagonal()
+            lower = splinalg.factorized(spsp.tril(A, format='csc'))
+            upper = splinalg.factorized(spsp.triu(A, format='csc'))
+            return splinalg.LinearOperator(A.shape, lambda x: upper(D*lower(x)))
+        # defaults: drop_tol=0.0001, fill_factor=10
+        M2 = splinalg.spilu(A.tocsc(), drop_tol=0.1, fill_factor=3)
+        return splinalg.LinearOperator(A.shape, M2.solve)
+    def solveKrylov(self, A, b, u, M, solver, verbose=0, atol=0, rtol=1e-14):
+        counter = simfempy.tools.iterationcounter.IterationCounter(name=solver, disp=20 if verbose else 0, verbose=verbose)
+        # stops if ||r|| <= max(rtol*||b||, atol), atol is given since scipy's default ('legacy') is deprecated
+        u, info = simfempy.solvers.krylov.solve(solver, A, b, rtol, atol, x0=u, M=M, callback=counter)
+        return u, counter.niter
+    def linearSolverBatch(self, A, b, solver=None, verbose=0, atol=0, rtol=1e-14):
+        """
+        solves A u[:,i] = b[:,i] for all columns of b (shape (n,k)):
+        the matrix is factorized (umf) or preconditioned (pyamg, Krylov) only once
+        returns u (shape (n,k)) and the maximal number of iterations
+        """
+        if len(b.shape)!=2 or len(A.shape)!=2 or b.shape[0] != A.shape[0]:
+            raise ValueError(f"{A.shape=} {b.shape=}")
+        if solver is None: solver = self.linearsolver
+        if solver not in self.linearsolvers: solver = "umf"
+        if not spsp.issparse(A) and solver in ['umf', 'pyamg']: solver = 'lgmres'
+        if solver == 'umf':
+            return simfempy.solvers.direct.cache.solve(A, b), 1
+        u, niter = np.zeros_like(b), 0
+        if solver in ['gmres','lgmres','bicgstab','cg']:
+            M = self.krylovPreconditioner(A, solver)
+            for i in range(b.shape[1]):
+                u[:,i], niteri = self.solveKrylov(A, b[:,i], None, M, solver, verbose, atol, rtol)
+                niter = max(niter, niteri)
+        elif solver == 'pyamg':
+            ml, maxiter = self.amg.hierarchy(A), 100
+            for i in range(b.shape[1]):
+                u[:,i], res = self.solve_pyamg(ml, b[:,i], None, maxiter)
+                self.amg.report(len(res))
+                if len(res) >= maxiter: raise ValueError(f"***no convergence {res=}")
+                niter = max(niter, len(res))
+        else:
+            raise NotImplementedError("unknown solve '{}'".format(solver))
+        return u, niter
     def pyamg_solver_args(self, maxiter):
         return {'cycle': 'V', 'maxiter': maxiter, 'tol': 1e-12, 'accel': 'gmres'}
     def solve_pyamg(self, ml, b, u, maxiter):
@@ -304,8 +362,7 @@ class Application(object):
         u = ml.solve(b=b, x0=u, residuals=res, **solver_args)
         return u, res
     def build_pyamg(self,A):
-        import pyamg
-        return pyamg.smoothed_aggregation_solver(A)
+        return simfempy.solvers.amg.smoothedAggregation(A)
         B = np.ones((A.shape[0], 1))
 
 
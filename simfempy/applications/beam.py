@@ -1,9 +1,9 @@
 import numpy as np
 from scipy import sparse
-from simfempy import fems
+from simfempy import fems, solvers
+from simfempy.tools import npext
 from simfempy.applications.application import Application
 from simfempy.tools.analyticalfunction import AnalyticalFunction
-import scipy.sparse.linalg as splinalg
 
 #=================================================================#
 class Beam(Application):
@@ -85,7 +85,7 @@ class Beam(Application):
             # print(f"{fc=}")
             self.fem.massDotCell(a, fc)
             Dmub = -dV**3/self.EIcell/24*fc
-            np.add.at(b, simplices, Dmub[:, np.newaxis])
+            npext.addAt(b, simplices, Dmub[:, np.newaxis])
         colors = self.problemdata.bdrycond.colorsOfType("Clamped")
         x, y, z = self.mesh.pointsf.T
         for i,color in enumerate(colors):
@@ -130,7 +130,7 @@ class Beam(Application):
         if solver == 'umf':
             Aall = self._to_single_matrix(Ain)
             ball = np.hstack((bin[0], bin[1], bin[2]))
-            uall =  splinalg.spsolve(Aall, ball, permc_spec='COLAMD')
+            uall = solvers.direct.cache.solve(Aall, ball)
             return (uall[:n], uall[n:2*n], uall[2*n:]), 1
         elif solver == 'gmres':
             raise NotImplemented()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+"""
+import warnings
+import numpy as np
+
+#=================================================================#
+class Coefficients(object):
+    """
+    coefficients given in problemdata.params, evaluated on cells, faces or nodes of a mesh:
+        scal_glob: constant
+        scal_cells: constant per cell label
+        fct_glob: fct(color, x, y, z) called once per label with the coordinates of all its entities
+        (fct(color, x, y, z, u) if the coefficient depends on the solution u, given at the entities)
+    functions which raise TypeError or ValueError on arrays are evaluated pointwise (np.vectorize) with a warning
+    faces and nodes get the label of a neighbouring cell (cellsOfFaces[:,0], resp. one of the cells of the node)
+    the results are cached per (mesh, name, where) as long as the parameter is unchanged and are read-only,
+    with a solution only the entities where it has changed are re-evaluated
+    """
+    def __repr__(self):
+        return f"Coefficients({self.nevaluations=} cached={list(self.cache.keys())})"
+    def __init__(self):
+        self.mesh, self.cache, self.nevaluations = None, {}, 0
+        # functions which are not vectorized
+        self.pointwise = set()
+    def cell(self, mesh, params, name, u=None): return self.evaluate(mesh, params, name, 'cell', u)
+    def face(self, mesh, params, name, u=None): return self.evaluate(mesh, params, name, 'face', u)
+    def node(self, mesh, params, name, u=None): return self.evaluate(mesh, params, name, 'node', u)
+    def _setMesh(self, mesh):
+        if self.mesh is not None and self.mesh[0] is mesh and self.mesh[1] is mesh.simplices and self.mesh[2] is mesh.points: return
+        self.mesh, self.cache, self.entities = (mesh, mesh.simplices, mesh.points), {}, {}
+    def _entities(self, mesh, where):
+        """
+        coordinates of the entities and their indices per label
+        """
+        if where in self.entities: return self.entities[where]
+        if where == 'cell':
+            points, labels = mesh.pointsc, mesh.cellsoflabel
+        else:
+            celllabel = np.empty(mesh.ncells, dtype=int)
+            colors = list(mesh.cellsoflabel.keys())
+            for i, cells in enumerate(mesh.cellsoflabel.values()): celllabel[cells] = i
+            if where == 'face':
+                points, cells = mesh.pointsf, mesh.cellsOfFaces[:,0]
+            elif where == 'node':
+                points, cells = mesh.points, np.empty(mesh.nnodes, dtype=int)
+                cells[mesh.simplices] = np.arange(mesh.ncells)[:,np.newaxis]
+            else:
+                raise ValueError(f"unknown {where=} (possible: 'cell', 'face', 'node')")
+            labels = {color: np.flatnonzero(celllabel[cells] == i) for i, color in enumerate(colors)}
+        self.entities[where] = points, labels
+        return self.entities[where]
+    def fingerprint(self, params, name):
+        """
+        the definition of the parameter (functions are compared by identity)
+        """
+        if name in params.fct_glob: return 'fct_glob', params.fct_glob[name]
+        if name in params.scal_glob: return 'scal_glob', params.scal_glob[name]
+        if name in params.scal_cells: return 'scal_cells', tuple(params.scal_cells[name].items())
+        msg = f"{name} should be given in 'fct_glob' or 'scal_glob' or 'scal_cells' (problemdata.params)"
+        raise ValueError(msg)
+    def _call(self, fct, color, points, *u):
+        x, y, z = points.T
+        self.nevaluations += 1
+        if fct not in self.pointwise:
+            try:
+                r = fct(color, x, y, z, *u)
+            except (TypeError, ValueError) as error:
+                warnings.warn(f"{fct} failed on arrays ({error!r}), it is evaluated pointwise")
+                self.pointwise.add(fct)
+        if fct in self.pointwise:
+            r = np.vectorize(fct, otypes=[float])(color, x, y, z, *u)
+        return np.broadcast_to(r, x.shape)
+    def evaluate(self, mesh, params, name, where='cell', u=None):
+        self._setMesh(mesh)
+        fingerprint, key = self.fingerprint(params, name), (name, where)
+        cached = self.cache.get(key, None)
+        if cached is not None and cached[0] == fingerprint and (u is None or fingerprint[0] != 'fct_glob'):
+            return cached[1]
+        points, labels = self._entities(mesh, where)
+        kind, param = fingerprint
+        if kind == 'scal_glob':
+            arr = np.full(len(points), param, dtype=float)
+        elif kind == 'scal_cells':
+            arr = np.empty(len(points))
+            for color, value in param: arr[labels[color]] = value
+        elif u is not None and cached is not None and cached[0] == fingerprint and cached[2] is not None and cached[2].shape == u.shape:
+            arr, changed = cached[1].copy(), u != cached[2]
+            for color, ind in labels.items():
+                ind = ind[changed[ind]]
+                if len(ind): arr[ind] = self._call(param, color, points[ind], u[ind])
+        else:
+            arr = np.empty(len(points))
+            for color, ind in labels.items():
+                arr[ind] = self._call(param, color, points[ind], *([] if u is None else [u[ind]]))
+        arr.flags.writeable = False
+        self.cache[key] = fingerprint, arr, None if u is None else np.array(u)
+        return arr
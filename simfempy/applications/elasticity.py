@@ -1,7 +1,7 @@
 import numpy as np
 import scipy.sparse as sparse
 import scipy.sparse.linalg as splinalg
-from simfempy import fems
+from simfempy import fems, solvers
 from simfempy.applications.application import Application
 
 #=================================================================#
@@ -35,6 +35,9 @@ class Elasticity(Application):
         fem = kwargs.pop('fem', 'p1')
         ncomp = kwargs['problemdata'].ncomp
         self.dirichletmethod = kwargs.pop('dirichletmethod', 'strong')
+        self.matrixfree = kwargs.pop('matrixfree', False)
+        if self.matrixfree and self.dirichletmethod != 'strong':
+            raise ValueError(f"matrixfree needs dirichletmethod 'strong' ({self.dirichletmethod=})")
         if fem == 'p1':
             self.fem = fems.p1sys.P1sys(ncomp=ncomp)
         elif fem == 'cr1':
@@ -104,6 +107,9 @@ class Elasticity(Application):
         b = self.fem.vectorBoundary(b, bdrycond.fct, bdrydata, self.dirichletmethod)
         return b
     def computeMatrix(self):
+        if self.matrixfree:
+            A = self.fem.computeOperatorElasticity(self.mucell, self.lamcell)
+            return self.fem.operatorBoundary(A, self.bdrydata, self.dirichletmethod)
         A = self.fem.computeMatrixElasticity(self.mucell, self.lamcell)
         A = self.fem.matrixBoundary(A, self.bdrydata, self.dirichletmethod)
         return A
@@ -151,9 +157,9 @@ class Elasticity(Application):
         strength = [('evolution', {'k': 2, 'epsilon': 10.0})]
         presmoother = (smoother, {'sweep': 'symmetric', 'iterations': 3})
         postsmoother = (smoother, {'sweep': 'symmetric', 'iterations': 3})
-        return pyamg.smoothed_aggregation_solver(A, B, smooth=smooth, strength=strength, presmoother=presmoother,
-                                                 postsmoother=postsmoother, improve_candidates=improve_candidates,
-                                                **SA_build_args)
+        return solvers.amg.smoothedAggregation(A, B, smooth=smooth, strength=strength, presmoother=presmoother,
+                                               postsmoother=postsmoother, improve_candidates=improve_candidates,
+                                               **SA_build_args)
         return pyamg.smoothed_aggregation_solver(A, B=B, smooth='energy')
         # ml = pyamg.smoothed_aggregation_solver(A, B=config['B'], smooth='jacobi')
         # return pyamg.rootnode_solver(A, B=config['B'], smooth='energy')
@@ -1,5 +1,5 @@
 import numpy as np
-from simfempy import fems
+from simfempy import fems, solvers
 from simfempy.applications.application import Application
 from simfempy.tools.analyticalfunction import AnalyticalFunction
 
@@ -18,6 +18,7 @@ class Heat(Application):
         problemdata
         method
         masslumpedbdry, masslumpedvol
+        matrixfree: computeMatrix() returns a matrix-free operator (fems.matrixfree.FormOperator), iterative solvers only
     Paramaters used from problemdata:
         rhocp
         kheat
@@ -54,6 +55,9 @@ class Heat(Application):
         fem = kwargs.pop('fem','p1')
         self.dirichletmethod = kwargs.pop('dirichletmethod', 'strong')
         self.convmethod = kwargs.pop('convmethod', 'supg')
+        self.matrixfree = kwargs.pop('matrixfree', False)
+        if self.matrixfree and self.dirichletmethod == 'new':
+            raise ValueError(f"matrixfree needs dirichletmethod 'strong' or 'nitsche' ({self.dirichletmethod=})")
         femargs = {'dirichletmethod':self.dirichletmethod, 'stab': self.convmethod}
         if fem == 'p1': self.fem = fems.p1.P1(**femargs)
         elif fem == 'cr1': self.fem = fems.cr1.CR1(**femargs)
@@ -182,6 +186,7 @@ class Heat(Application):
             raise ValueError(f"\n{du=}\n{du2=}")
         return du
     def computeMatrix(self, u=None, coeffmass=None):
+        if self.matrixfree: return self.computeOperator(coeffmass)
         bdrycond = self.problemdata.bdrycond
         colorsrobin = bdrycond.colorsOfType("Robin")
         colorsdir = bdrycond.colorsOfType("Dirichlet")
@@ -189,7 +194,7 @@ class Heat(Application):
         if self.dirichletmethod=="new":
             A = self.fem.matrixBoundary(A, self.bdrydata, self.dirichletmethod)
         elif self.dirichletmethod=="nitsche":
-            A = self.fem.computeMatrixNitscheDiffusion(diffcoff=self.kheatcell, colorsdir=colorsdir)
+            A += self.fem.computeMatrixNitscheDiffusion(diffcoff=self.kheatcell, colorsdir=colorsdir)
         if self.verbose: print(f"{A.diagonal()=}")
         A += self.fem.computeBdryMassMatrix(colorsrobin, bdrycond.param, lumped=True)
         if self.convection:
@@ -199,6 +204,28 @@ class Heat(Application):
         if self.dirichletmethod=="strong":
             A = self.fem.matrixBoundary(A, self.bdrydata, self.dirichletmethod)
         return A
+    def computeOperator(self, coeffmass=None):
+        """
+        matrix-free version of computeMatrix(): diffusion, convection and mass by their forms,
+        the boundary terms (Robin, Nitsche) are assembled
+        """
+        bdrycond = self.problemdata.bdrycond
+        colorsrobin = bdrycond.colorsOfType("Robin")
+        colorsdir = bdrycond.colorsOfType("Dirichlet")
+        forms = [lambda du, u: self.fem.computeFormDiffusion(du, u, self.kheatcell)]
+        diagonals = [lambda: self.fem.diagonalDiffusion(self.kheatcell)]
+        if self.convection:
+            forms.append(lambda du, u: self.fem.computeFormConvection(du, u, self.convdata, self.convmethod))
+        if coeffmass is not None:
+            forms.append(lambda du, u: self.fem.massDot(du, u, coeff=coeffmass))
+            diagonals.append(lambda: self.fem.diagonalMass(coeff=coeffmass))
+        A = fems.matrixfree.FormOperator(self.fem.nunknowns(), forms, diagonals)
+        A += self.fem.computeBdryMassMatrix(colorsrobin, bdrycond.param, lumped=True)
+        if self.dirichletmethod=="nitsche":
+            A += self.fem.computeMatrixNitscheDiffusion(diffcoff=self.kheatcell, colorsdir=colorsdir)
+        else:
+            A = self.fem.operatorBoundary(A, self.bdrydata, self.dirichletmethod)
+        return A
     def computeRhs(self, b=None, coeffmass=None, u=None):
         if b is None:
             b = np.zeros(self.fem.nunknowns())
@@ -246,6 +273,49 @@ class Heat(Application):
         if self.dirichletmethod == "strong" or self.dirichletmethod == "new":
             self.fem.vectorBoundary(b, bdrycond, self.bdrydata, self.dirichletmethod)
         return b
+    def computeRhsBatch(self, problemdatas=None, rhs=None):
+        """
+        right-hand sides of several load cases as (n,k) array, either from
+        - problemdatas: list of ProblemData with the boundary types of self.problemdata (the matrix is not recomputed)
+        - rhs: (n,k) array of sources at the dofs, added to the right-hand side of self.problemdata (one massDot for all columns)
+        """
+        if (problemdatas is None) == (rhs is None):
+            raise ValueError(f"give either 'problemdatas' or 'rhs' ({problemdatas=} {rhs=})")
+        problemdata, bdrydata = self.problemdata, getattr(self, 'bdrydata', None)
+        self.batchcases = []
+        if problemdatas is not None:
+            b = np.zeros((self.fem.nunknowns(), len(problemdatas)), order="F")
+            try:
+                for i, pd in enumerate(problemdatas):
+                    if pd.bdrycond.type != problemdata.bdrycond.type:
+                        raise ValueError(f"boundary types differ {pd.bdrycond.type=} {problemdata.bdrycond.type=}")
+                    pd.check(self.mesh)
+                    self.problemdata = pd
+                    self.computeRhs(b[:,i])
+                    self.batchcases.append((pd, None if bdrydata is None else dict(bdrydata.bsaved)))
+            finally:
+                self.problemdata = problemdata
+            return b
+        if rhs.ndim != 2 or rhs.shape[0] != self.fem.nunknowns():
+            raise ValueError(f"{rhs.shape=} {self.fem.nunknowns()=}")
+        b0 = self.computeRhs()
+        b = self.fem.massDot(np.zeros(rhs.shape), rhs)
+        if self.convection and self.convmethod[:4] == 'supg':
+            self.fem.massDotSupg(b, rhs, self.convdata)
+        if bdrydata is not None:
+            # with 'new', computeRhs() saves the Dirichlet rows after having overwritten them
+            if self.dirichletmethod == 'new': self.fem.vectorBoundaryZero(b, bdrydata)
+            bsaved = self.fem.vectorBoundarySaved(b, bdrydata)
+            for i in range(b.shape[1]):
+                self.batchcases.append((problemdata, {color: bdrydata.bsaved[color] + bs[:,i] for color, bs in bsaved.items()}))
+            self.fem.vectorBoundaryZero(b, bdrydata)
+        else:
+            self.batchcases = [(problemdata, None)]*b.shape[1]
+        b += b0[:,np.newaxis]
+        return b
+    def setBatchCase(self, i):
+        self.problemdata, bsaved = self.batchcases[i]
+        if bsaved is not None: self.bdrydata.bsaved = bsaved
     def postProcess(self, u):
         # TODO: virer 'error' et 'postproc'
         data = {'point':{}, 'cell':{}, 'global':{}}
@@ -331,9 +401,9 @@ class Heat(Application):
             'coarse_solver': 'pinv2',
             'symmetry': symmetry
         }
-        return pyamg.smoothed_aggregation_solver(A, B, smooth=smooth, strength=strength, presmoother=presmoother,
-                                                 postsmoother=postsmoother, improve_candidates=improve_candidates,
-                                                **SA_build_args)
+        return solvers.amg.smoothedAggregation(A, B, smooth=smooth, strength=strength, presmoother=presmoother,
+                                               postsmoother=postsmoother, improve_candidates=improve_candidates,
+                                               **SA_build_args)
         # return pyamg.rootnode_solver(A, B, **SA_build_args)
 
 
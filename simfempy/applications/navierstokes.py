@@ -41,7 +41,7 @@ class NavierStokes(Stokes):
 
     def computeMatrixConvection(self, v):
         A = self.femv.fem.computeMatrixConvection(self.convdata, method=self.convmethod)
-        return self.femv.matrix2systemdiagonal(A, self.ncomp).tocsr()
+        return self.femv.matrix2systemdiagonal(A, self.ncomp)
 
     def computeDx(self, b, u, info):
         # it,rhor,dx, step, y = info
@@ -60,7 +60,7 @@ class NavierStokes(Stokes):
         return u, niter
 
     def getVelocitySolver(self, A):
-        return solvers.cfd.VelcoitySolver(A)
+        return solvers.cfd.VelcoitySolver(A, amg=self.velocityamg)
     def getPressureSolver(self, A, B, AP):
         mu = self.problemdata.params.scal_glob['mu']
         # return solvers.cfd.PressureSolverDiagonal(self.mesh, mu)    
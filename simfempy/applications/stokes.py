@@ -20,6 +20,8 @@ class Stokes(Application):
     def __init__(self, **kwargs):
         self.dirichlet_nitsche = 4
         self.dirichletmethod = kwargs.pop('dirichletmethod', 'nitsche')
+        # matrix-free velocity block (fems.matrixfree), only with the iterative solver
+        self.matrixfree = kwargs.pop('matrixfree', False)
         self.problemdata = kwargs.pop('problemdata')
         self.ncomp = self.problemdata.ncomp
         self.femv = fems.cr1sys.CR1sys(self.ncomp)
@@ -41,6 +43,8 @@ class Stokes(Application):
         assert self.ncomp==self.mesh.dimension
         self.femv.setMesh(self.mesh)
         self.femp.setMesh(self.mesh)
+        # pattern of the saddle-point matrix, AMG hierarchy of the velocity block (iterative solvers)
+        self.saddlepoint, self.velocityamg = None, solvers.amg.AmgManager()
         self.mucell = self.compute_cell_vector_from_params('mu', self.problemdata.params)
         # self.pmean = list(self.problemdata.bdrycond.type.values()) == len(self.problemdata.bdrycond.type)*['Dirichlet']
         self.pmean = not ('Neumann' in self.problemdata.bdrycond.type.values())
@@ -159,29 +163,18 @@ class Stokes(Application):
                     raise ValueError(f"unknown postprocess type '{type}' for key '{name}'\nknown types={types=}")
         return data
     def _to_single_matrix(self, Ain):
-        ncells, nfaces = self.mesh.ncells, self.mesh.nfaces
-        # print("Ain", Ain)
+        """
+        the saddle-point matrix (csc), its pattern is computed once (fems.stencil.BlockStencil)
+        """
         if self.pmean:
             A, B, C = Ain
+            blocks = [[A, -B.T, None], [B, None, C.T], [None, C, None]]
         else:
             A, B = Ain
-        nullP = sparse.dia_matrix((np.zeros(ncells), 0), shape=(ncells, ncells))
-        A1 = sparse.hstack([A, -B.T])
-        A2 = sparse.hstack([B, nullP])
-        Aall = sparse.vstack([A1, A2])
-        if not self.pmean:
-            return Aall.tocsr()
-        ncomp = self.ncomp
-        nullV = sparse.coo_matrix((1, ncomp*nfaces)).tocsr()
-        # rows = np.zeros(ncomp*nfaces, dtype=int)
-        # cols = np.arange(0, ncomp*nfaces)
-        # nullV = sparse.coo_matrix((np.zeros(ncomp*nfaces), (rows, cols)), shape=(1, ncomp*nfaces)).tocsr()
-        CL = sparse.hstack([nullV, C])
-        Abig = sparse.hstack([Aall,CL.T])
-        nullL = sparse.dia_matrix((np.zeros(1), 0), shape=(1, 1))
-        Cbig = sparse.hstack([CL,nullL])
-        Aall = sparse.vstack([Abig, Cbig])
-        return Aall.tocsr()
+            blocks = [[A, -B.T], [B, None]]
+        if self.saddlepoint is None or not self.saddlepoint.fits(blocks):
+            self.saddlepoint = fems.stencil.BlockStencil(blocks, format='csc')
+        return self.saddlepoint.matrix(blocks)
     def matrixVector(self, Ain, x):
         ncells, nfaces, ncomp = self.mesh.ncells, self.mesh.nfaces, self.ncomp
         if self.pmean:
@@ -230,19 +223,21 @@ class Stokes(Application):
                 return np.hstack([w, q])
         return pmult
     def getVelocitySolver(self, A):
-        return solvers.cfd.VelcoitySolver(A)
+        if not sparse.issparse(A): return fems.matrixfree.KrylovSolver(A)
+        return solvers.cfd.VelcoitySolver(A, amg=self.velocityamg)
     def getPressureSolver(self, A, B, AP):
         mu = self.problemdata.params.scal_glob['mu']
         return solvers.cfd.PressureSolverDiagonal(self.mesh, mu)    
     def linearSolver(self, Ain, bin, uin=None, solver='umf', verbose=0, atol=1e-14, rtol=1e-10):
         ncells, nfaces, ncomp = self.mesh.ncells, self.mesh.nfaces, self.ncomp
+        if self.matrixfree and solver == 'umf': solver = 'iter'
         if solver == 'umf':
             Aall = self._to_single_matrix(Ain)
-            uall =  splinalg.spsolve(Aall, bin, permc_spec='COLAMD')
+            uall = solvers.direct.cache.solve(Aall, bin)
             return uall, 1
         elif solver[:4] == 'iter':
             ssolver = solver.split('_')
-            method=ssolver[1] if len(ssolver)>1 else 'lgmres'
+            method=ssolver[1] if len(ssolver)>1 else ('gcrotmk' if self.matrixfree else 'lgmres')
             disp=int(ssolver[2]) if len(ssolver)>2 else 0
             nall = ncomp*nfaces + ncells
             if self.pmean: nall += 1
@@ -301,7 +296,8 @@ class Stokes(Application):
         #     raise ValueError(f"{d=}\n{d2=}")
         return d
     def computeMatrix(self, u=None):
-        A = self.femv.computeMatrixLaplace(self.mucell)
+        if self.matrixfree: A = self.femv.computeOperatorLaplace(self.mucell)
+        else: A = self.femv.computeMatrixLaplace(self.mucell)
         B = self.femv.computeMatrixDivergence()
         colorsdir = self.problemdata.bdrycond.colorsOfType("Dirichlet")
         colorsnav = self.problemdata.bdrycond.colorsOfType("Navier")
@@ -360,7 +356,7 @@ class Stokes(Application):
         faces = self.mesh.bdryFaces(colors)
         cells = self.mesh.cellsOfFaces[faces,0]
         normalsS = self.mesh.normals[faces][:,:ncomp]
-        np.add.at(bp, cells, -np.einsum('nk,nk->n', coeff*vdir[faces], normalsS))
+        npext.addAt(bp, cells, -np.einsum('nk,nk->n', coeff*vdir[faces], normalsS))
         self.femv.computeRhsNitscheDiffusion(bv, mucell, colors, vdir, ncomp)
     def computeRhsBdryNitscheNavier(self, b, colors, mucell, bdryfct):
         if len(set(bdryfct.keys()).intersection(colors)) == 0: return
@@ -373,7 +369,7 @@ class Stokes(Application):
         assert isinstance(next(iter(bdryfct.values())),list)
         vnfct = {col: bdryfct[col][0] for col in colors if col in bdryfct.keys()}
         vn = self.femv.fem.interpolateBoundary(colors, vnfct, lumped=True)
-        np.add.at(bp, cells, -dS*vn[faces])
+        npext.addAt(bp, cells, -dS*vn[faces])
 
         normals = normalsS/dS[:,np.newaxis]
         foc = self.mesh.facesOfCells[cells]
@@ -382,12 +378,12 @@ class Stokes(Application):
         mat = -np.einsum('f,fk,fjk,fl->fjl', mucell[cells]*vn[faces], normalsS, cellgrads, normals)
         indices = np.repeat(ncomp*foc, ncomp).reshape(faces.shape[0], dim+1, ncomp)
         indices +=  np.arange(ncomp)[np.newaxis,np.newaxis,:]
-        np.add.at(bv, indices.ravel(), mat.ravel())
+        npext.addAt(bv, indices.ravel(), mat.ravel())
 
         mat = np.einsum('f,fk->fk', self.dirichlet_nitsche*mucell[cells]/self.mesh.dV[cells]*dS*vn[faces], normalsS)
         indices = np.repeat(ncomp*faces, ncomp).reshape(faces.shape[0], ncomp)
-        indices +=  np.arange(ncomp, dtype='uint')[np.newaxis,:]
-        np.add.at(bv, indices.ravel(), mat.ravel())
+        indices +=  np.arange(ncomp)[np.newaxis,:]
+        npext.addAt(bv, indices.ravel(), mat.ravel())
 
         vtfct = {col: bdryfct[col][1] for col in colors if col in bdryfct.keys()}
         vt = self.femv.interpolateBoundary(colors, vtfct, lumped=False)
@@ -395,12 +391,12 @@ class Stokes(Application):
         # print(f"{vt[faces]=}")
 
         mat = np.einsum('f,fk->fk', dS, vt[faces])
-        np.add.at(bv, indices.ravel(), mat.ravel())
+        npext.addAt(bv, indices.ravel(), mat.ravel())
         
         mat = -np.einsum('f,fk,fk,fl->fl', dS, vt[faces],normals,normals)
         indices = np.repeat(ncomp*faces, ncomp).reshape(faces.shape[0], ncomp)
-        indices +=  np.arange(ncomp, dtype='uint')[np.newaxis,:]
-        np.add.at(bv, indices.ravel(), mat.ravel())
+        indices +=  np.arange(ncomp)[np.newaxis,:]
+        npext.addAt(bv, indices.ravel(), mat.ravel())
 
 
         # if len(colors): raise Warning("trop tot")
@@ -425,7 +421,7 @@ class Stokes(Application):
             indfaces = self.mesh.facesOfCells[cells]
             for icomp in range(ncomp):
                 mat2 = np.einsum('fj,f->fj', mat, dirichv[icomp])
-                np.add.at(bv, icomp+ncomp*indfaces, -mat2)
+                npext.addAt(bv, icomp+ncomp*indfaces, -mat2)
             ind = npext.positionin(faces, indfaces).astype(int)
             for icomp in range(ncomp):
                 bv[icomp+ncomp*faces] += self.dirichlet_nitsche * np.choose(ind, mat.T)*dirichv[icomp]
@@ -439,9 +435,9 @@ class Stokes(Application):
         normalsS = self.mesh.normals[faces][:, :self.ncomp]
         for icomp in range(ncomp):
             r = np.einsum('f,f->f', p[cells], normalsS[:,icomp])
-            np.add.at(dv[icomp::ncomp], faces, r)
+            npext.addAt(dv[icomp::ncomp], faces, r)
             r = np.einsum('f,f->f', normalsS[:,icomp], v[icomp::ncomp][faces])
-            np.add.at(dp, cells, -r)
+            npext.addAt(dp, cells, -r)
     def computeMatrixBdryNitscheDirichlet(self, A, B, colorsdir, mucell):
         nfaces, ncells, ncomp, dim  = self.mesh.nfaces, self.mesh.ncells, self.femv.ncomp, self.mesh.dimension
         A += self.femv.computeMatrixNitscheDiffusion(mucell, colorsdir, ncomp)
@@ -471,9 +467,9 @@ class Stokes(Application):
         cellgrads = self.femv.fem.cellgrads[cells, :, :dim]
         nloc = dim+1
         foc = self.mesh.facesOfCells[cells]
-        mat = np.einsum('f,fk,fjk,fl,fm->fjlm', mucell[cells], normalsS, cellgrads, normals, normals)
+        mat = fems.kernels.localNavier(mucell[cells], normalsS, cellgrads, normals)
         rows = np.repeat(ncomp*faces, nloc*ncomp*ncomp).reshape(faces.shape[0], nloc, ncomp, ncomp)
-        rows +=  np.arange(ncomp, dtype='uint')[np.newaxis,np.newaxis,np.newaxis,:]
+        rows +=  np.arange(ncomp)[np.newaxis,np.newaxis,np.newaxis,:]
         cols = np.repeat(ncomp*foc,ncomp*ncomp).reshape(faces.shape[0], nloc, ncomp, ncomp)
         cols +=  np.arange(ncomp)[np.newaxis,np.newaxis,:,np.newaxis]
         # print(f"{cols.ravel()=}")
@@ -481,12 +477,12 @@ class Stokes(Application):
 
         mat = np.einsum('f,fk,fl->fkl', self.dirichlet_nitsche*mucell[cells]/self.mesh.dV[cells] -lambdaR/dS, normalsS, normalsS)
         rows = np.repeat(ncomp*faces, ncomp*ncomp).reshape(faces.shape[0], ncomp, ncomp)
-        rows +=  np.arange(ncomp, dtype='uint')[np.newaxis,np.newaxis,:]
+        rows +=  np.arange(ncomp)[np.newaxis,np.newaxis,:]
         cols = np.repeat(ncomp*faces, ncomp*ncomp).reshape(faces.shape[0], ncomp, ncomp)
-        cols +=  np.arange(ncomp, dtype='uint')[np.newaxis,:,np.newaxis]
+        cols +=  np.arange(ncomp)[np.newaxis,:,np.newaxis]
         AD = sparse.coo_matrix((mat.ravel(), (rows.ravel(), cols.ravel())), shape=(ncomp*nfaces, ncomp*nfaces))
         rows = np.repeat(ncomp*faces, ncomp).reshape(faces.shape[0], ncomp)
-        rows +=  np.arange(ncomp, dtype='uint')[np.newaxis,:]
+        rows +=  np.arange(ncomp)[np.newaxis,:]
         AD += sparse.coo_matrix((lambdaR*dS.repeat(ncomp), (rows.ravel(), rows.ravel())), shape=(ncomp*nfaces, ncomp*nfaces))
 
 
@@ -511,23 +507,20 @@ class Stokes(Application):
         bp -= bdrydata.B_inner_dir * bv[inddir]
         return (bv,bp)
     def matrixBoundary(self, A, B, bdrydata, method):
-        A = self.femv.matrixBoundary(A, bdrydata, method)
+        if self.matrixfree: A = self.femv.operatorBoundary(A, bdrydata, method)
+        else: A = self.femv.matrixBoundary(A, bdrydata, method)
         facesdirall, facesinner, colorsdir, facesdirflux = bdrydata.facesdirall, bdrydata.facesinner, bdrydata.colorsdir, bdrydata.facesdirflux
         nfaces, ncells, ncomp  = self.mesh.nfaces, self.mesh.ncells, self.femv.ncomp
         bdrydata.Bsaved = {}
         for key, faces in facesdirflux.items():
-            nb = faces.shape[0]
-            helpB = sparse.dok_matrix((ncomp*nfaces, ncomp*nb))
-            for icomp in range(ncomp):
-                for i in range(nb): helpB[icomp + ncomp*faces[i], icomp + ncomp*i] = 1
-            bdrydata.Bsaved[key] = B.dot(helpB)
-        inddir = np.repeat(ncomp * facesdirall, ncomp)
-        for icomp in range(ncomp): inddir[icomp::ncomp] += icomp
-        bdrydata.B_inner_dir = B[:,:][:,inddir]
-        help = np.ones((ncomp * nfaces))
-        help[inddir] = 0
-        help = sparse.dia_matrix((help, 0), shape=(ncomp * nfaces, ncomp * nfaces))
-        B = B.dot(help)
+            bdrydata.Bsaved[key] = B[:, self.femv.systemIndices(faces)]
+        inddir = self.femv.systemIndices(facesdirall)
+        bdrydata.B_inner_dir = B[:,inddir]
+        isdir = np.zeros(ncomp * nfaces, dtype=bool)
+        isdir[inddir] = True
+        B = sparse.csr_matrix(B, copy=True)
+        B.data[isdir[B.indices]] = 0
+        B.eliminate_zeros()
         return A,B
     def computeBdryNormalFluxStrong(self, v, p, colors):
         nfaces, ncells, ncomp, bdrydata  = self.mesh.nfaces, self.mesh.ncells, self.ncomp, self.bdrydata
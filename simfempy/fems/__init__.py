@@ -1 +1 @@
-from . import data, d0, p1, cr1, rt0, p1sys, cr1sys
+from . import stencil, kernels, matrixfree, data, d0, p1, cr1, rt0, p1sys, cr1sys
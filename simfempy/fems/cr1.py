@@ -26,15 +26,16 @@ class CR1(fems.fem.Fem):
     def nlocal(self): return self.mesh.dimension+1
     def nunknowns(self): return self.mesh.nfaces
     def dofspercell(self): return self.mesh.facesOfCells
+    def basisBarycentric(self, lam): return 1 - self.mesh.dimension*lam
     def tonode(self, u):
         # print(f"{u=}")
         unodes = np.zeros(self.mesh.nnodes)
         if u.shape[0] != self.mesh.nfaces: raise ValueError(f"{u.shape=} {self.mesh.nfaces=}")
         scale = self.mesh.dimension
-        np.add.at(unodes, self.mesh.simplices.T, np.sum(u[self.mesh.facesOfCells], axis=1))
-        np.add.at(unodes, self.mesh.simplices.T, -scale*u[self.mesh.facesOfCells].T)
+        npext.addAt(unodes, self.mesh.simplices.T, np.sum(u[self.mesh.facesOfCells], axis=1))
+        npext.addAt(unodes, self.mesh.simplices.T, -scale*u[self.mesh.facesOfCells].T)
         countnodes = np.zeros(self.mesh.nnodes, dtype=int)
-        np.add.at(countnodes, self.mesh.simplices.T, 1)
+        npext.addAt(countnodes, self.mesh.simplices.T, 1)
         unodes /= countnodes
         # print(f"{unodes=}")
         return unodes
@@ -75,7 +76,7 @@ class CR1(fems.fem.Fem):
     # strong bc
     def prepareBoundary(self, colorsdir, colorsflux=[]):
         bdrydata = fems.data.BdryData()
-        bdrydata.facesdirall = np.empty(shape=(0), dtype=np.uint32)
+        bdrydata.facesdirall = np.empty(shape=(0), dtype=self.mesh.faces.dtype)
         bdrydata.colorsdir = colorsdir
         for color in colorsdir:
             facesdir = self.mesh.bdrylabels[color]
@@ -99,7 +100,7 @@ class CR1(fems.fem.Fem):
             dirichlet = bdrycond.fct[color]
             u = dirichlet(x[faces], y[faces], z[faces])
             mat = np.einsum('f,fi,fji->fj', coeff*u*diffcoff[cells], normalsS, self.cellgrads[cells, :, :dim])
-            np.add.at(b, self.mesh.facesOfCells[cells], -mat)
+            npext.addAt(b, self.mesh.facesOfCells[cells], -mat)
             ind = npext.positionin(faces, self.mesh.facesOfCells[cells]).astype(int)
             if not np.all(faces == self.mesh.facesOfCells[cells,ind]):
                 print(f"{faces=}")
@@ -114,7 +115,7 @@ class CR1(fems.fem.Fem):
         normalsS = self.mesh.normals[faces][:,:dim]
         dS, dV = np.linalg.norm(normalsS,axis=1), self.mesh.dV[cells]
         mat = np.einsum('f,fi,fji->fj', coeff*udir[faces]*diffcoff[cells], normalsS, self.cellgrads[cells, :, :dim])
-        np.add.at(b, self.mesh.facesOfCells[cells], -mat)
+        npext.addAt(b, self.mesh.facesOfCells[cells], -mat)
         self.massDotBoundary(b, f=udir, colors=colorsdir, coeff=self.dirichlet_nitsche * dS/dV)
     def computeFormNitscheDiffusion(self, du, u, diffcoff, colorsdir):
         assert u.shape[0] == self.mesh.nfaces
@@ -123,25 +124,30 @@ class CR1(fems.fem.Fem):
         foc, normalsS, cellgrads = self.mesh.facesOfCells[cells], self.mesh.normals[faces][:,:dim], self.cellgrads[cells, :, :dim]
         dS, dV = np.linalg.norm(normalsS,axis=1), self.mesh.dV[cells]
         mat = np.einsum('f,fk,fik->fi', u[faces]*diffcoff[cells], normalsS, cellgrads)
-        np.add.at(du, foc, -mat)
+        npext.addAt(du, foc, -mat)
         mat = np.einsum('f,fk,fjk,fj->f', diffcoff[cells], normalsS, cellgrads, u[foc])
-        np.add.at(du, faces, -mat)
+        npext.addAt(du, faces, -mat)
         self.massDotBoundary(du, f=u, colors=colorsdir, coeff=self.dirichlet_nitsche * dS/dV)
     def computeMatrixNitscheDiffusion(self, diffcoff, colorsdir, coeff=1):
-        nfaces, ncells, dim, nlocal  = self.mesh.nfaces, self.mesh.ncells, self.mesh.dimension, self.nlocal()
+        dim, nlocal  = self.mesh.dimension, self.nlocal()
         faces = self.mesh.bdryFaces(colorsdir)
         cells = self.mesh.cellsOfFaces[faces, 0]
         normalsS = self.mesh.normals[faces][:, :dim]
-        cols = self.mesh.facesOfCells[cells, :].ravel()
-        rows = faces.repeat(nlocal)
-        mat = np.einsum('f,fi,fji->fj', coeff * diffcoff[cells], normalsS, self.cellgrads[cells, :, :dim]).ravel()
-        AN = sparse.coo_matrix((mat, (rows, cols)), shape=(nfaces, nfaces)).tocsr()
-        # AD = sparse.diags(AN.diagonal(), offsets=(0), shape=(nfaces, nfaces))
         dS = np.linalg.norm(normalsS,axis=1)
         dV = self.mesh.dV[cells]
-        # AD = sparse.coo_matrix((dS**2/dV,(faces,faces)), shape=(nfaces, nfaces))
-        AD = self.computeBdryMassMatrix(colors=colorsdir, coeff=dS/dV)
-        return - AN -AN.T + self.dirichlet_nitsche*AD
+        # local position of the face and of the other faces of the cell: all entries are in the cell stencil
+        mask = self.mesh.facesOfCells[cells] != faces[:, np.newaxis]
+        loc = np.argmin(mask, axis=1)[:, np.newaxis]
+        others = np.nonzero(mask)[1].reshape(len(faces), nlocal-1)
+        c, j = cells[:, np.newaxis], np.arange(nlocal)
+        mat = -np.einsum('f,fi,fji->fj', coeff * diffcoff[cells], normalsS, self.cellgrads[cells, :, :dim])
+        # boundary mass matrix (see computeBdryMassMatrix) with coeff=dS/dV
+        dSD = self.dirichlet_nitsche * dS**2/dV
+        matD = np.einsum('n,kl->nkl', dSD, barycentric.crbdryothers(dim))
+        pos = np.concatenate((self.cellEntries(c, loc, j).ravel(), self.cellEntries(c, j, loc).ravel(), self.cellEntries(cells, loc[:, 0], loc[:, 0]),
+                              self.cellEntries(c[:, :, np.newaxis], others[:, :, np.newaxis], others[:, np.newaxis, :]).ravel()))
+        data = np.bincount(pos, weights=np.concatenate((mat.ravel(), mat.ravel(), dSD, matD.ravel())), minlength=self.stencil.nnz)
+        return self.stencil.csr(data)
     def computeBdryNormalFluxNitscheOld(self, u, colors, bdrycond, diffcoff):
         flux= np.zeros(len(colors))
         nfaces, ncells, dim, nlocal  = self.mesh.nfaces, self.mesh.ncells, self.mesh.dimension, self.nlocal()
@@ -183,6 +189,8 @@ class CR1(fems.fem.Fem):
         du[facesdirall] = u[facesdirall]
     def vectorBoundaryZero(self, du, bdrydata):
         du[bdrydata.facesdirall] = 0
+    def vectorBoundarySaved(self, b, bdrydata):
+        return {color: b[faces] for color, faces in bdrydata.facesdirflux.items()}
     def vectorBoundary(self, b, bdrycond, bdrydata, method):
         facesdirflux, facesinner, facesdirall, colorsdir = bdrydata.facesdirflux, bdrydata.facesinner, bdrydata.facesdirall, bdrydata.colorsdir
         x, y, z = self.mesh.pointsf.T
@@ -200,31 +208,10 @@ class CR1(fems.fem.Fem):
         else:
             b[facesdirall] = bdrydata.A_dir_dir * help[facesdirall]
     def matrixBoundary(self, A, bdrydata, method):
-        assert method != 'nitsche'
-        facesdirflux, facesinner, facesdirall, colorsdir = bdrydata.facesdirflux, bdrydata.facesinner, bdrydata.facesdirall, bdrydata.colorsdir
-        nfaces = self.mesh.nfaces
-        for color, faces in facesdirflux.items():
-            nb = faces.shape[0]
-            help = sparse.dok_matrix((nb, nfaces))
-            for i in range(nb): help[i, faces[i]] = 1
-            bdrydata.Asaved[color] = help.dot(A)
-        bdrydata.A_inner_dir = A[facesinner, :][:, facesdirall]
-        help = np.ones((nfaces))
-        help[facesdirall] = 0
-        help = sparse.dia_matrix((help, 0), shape=(nfaces, nfaces))
-        # A = help.dot(A.dot(help))
-        diag = np.zeros((nfaces))
-        if method == 'strong':
-            diag[facesdirall] = 1.0
-            diag = sparse.dia_matrix((diag, 0), shape=(nfaces, nfaces))
-        else:
-            bdrydata.A_dir_dir = self.dirichlet_al*A[facesdirall, :][:, facesdirall]
-            diag[facesdirall] = np.sqrt(self.dirichlet_al)
-            diag = sparse.dia_matrix((diag, 0), shape=(nfaces, nfaces))
-            diag = diag.dot(A.dot(diag))
-        A = help.dot(A)
-        A += diag
-        return A
+        return self.matrixBoundaryScalar(A, bdrydata, method, bdrydata.facesdirall, bdrydata.facesinner, bdrydata.facesdirflux)
+    def operatorBoundary(self, A, bdrydata, method):
+        if method != 'strong': raise ValueError(f"matrix-free operator only with method='strong' ({method=})")
+        return fems.matrixfree.boundaryOperator(A, bdrydata, bdrydata.facesdirall, bdrydata.facesinner, bdrydata.facesdirflux)
     # interpolate
     def interpolate(self, f):
         x, y, z = self.mesh.pointsf.T
@@ -284,8 +271,8 @@ class CR1(fems.fem.Fem):
         scalemass = (2-dim) / (dim+1) / (dim+2)
         massloc = np.tile(scalemass, (self.nloc,self.nloc))
         massloc.reshape((self.nloc*self.nloc))[::self.nloc+1] = (2-dim + dim*dim) / (dim+1) / (dim+2)
-        mass = np.einsum('n,kl->nkl', dV, massloc).ravel()
-        return sparse.coo_matrix((mass, (self.rows, self.cols)), shape=(nfaces, nfaces)).tocsr()
+        mass = self.localmatrices.get('mass', lambda: np.einsum('n,kl->nkl', dV, massloc))
+        return self.stencil.matrix(mass)
     def computeBdryMassMatrix(self, colors=None, coeff=1, lumped=False):
         nfaces, dim = self.mesh.nfaces, self.mesh.dimension
         massloc = barycentric.crbdryothers(dim)
@@ -357,7 +344,7 @@ class CR1(fems.fem.Fem):
             r = np.einsum('n,kl,nl->nk', dS, massloc, f[fi])
             if b is None: return bmean+np.sum(r)
             # print(f"{np.linalg.norm(f[fi])=}")
-            np.add.at(b, fi, r)
+            npext.addAt(b, fi, r)
             return b
 
         assert(isinstance(coeff, dict))
@@ -373,7 +360,7 @@ class CR1(fems.fem.Fem):
             fi = foc[mask].reshape(foc.shape[0],foc.shape[1]-1)
             r = np.einsum('n,kl,nl->nk', dS, massloc, f[fi])
             # print(f"{np.linalg.norm(f[fi])=}")
-            np.add.at(b, fi, r)
+            npext.addAt(b, fi, r)
         return b
     def computeMassMatrixSupg(self, xd, coeff=1):
         raise NotImplemented(f"computeMassMatrixSupg")
@@ -533,15 +520,10 @@ class CR1(fems.fem.Fem):
         beta, betart = data.beta, data.betart
         nfaces, dim, dV = self.mesh.nfaces, self.mesh.dimension, self.mesh.dV
         cellgrads = self.cellgrads[:,:,:dim]
-        if type=='centered':
-            # betagrad = np.einsum('njk,nk -> nj', cellgrads, beta)
-            mat = np.einsum('n,njk,nk,i -> nij', dV, cellgrads, beta, 1/(dim+1)*np.ones(dim+1))
-            # mat += np.einsum('n,nj,ni -> nij', dV*deltas, betagrad, betagrad)
-        elif type=='supg':
-            mus = data.md.mus
-            mat = np.einsum('n,njk,nk,ni -> nij', dV, cellgrads, beta, 1-dim*mus)
+        if type=='centered': mus = 1/(dim+1)*np.ones(dim+1)
+        elif type=='supg': mus = 1-dim*data.md.mus
         else: raise ValueError(f"unknown type {type=}")
-        A = sparse.coo_matrix((mat.ravel(), (self.rows, self.cols)), shape=(nfaces, nfaces))
+        A = self.stencil.csr(fems.kernels.transport(self.stencil, cellgrads, beta, dV, mus))
         return A - self.computeBdryMassMatrix(coeff=np.minimum(betart, 0), lumped=False)
     def computeMatrixJump(self, betart, mode='primal', monotone=False):
         dim, dV, nfaces, ndofs = self.mesh.dimension, self.mesh.dV, self.mesh.nfaces, self.nunknowns()
@@ -606,9 +588,9 @@ class CR1(fems.fem.Fem):
         massloc = barycentric.crbdryothers(self.mesh.dimension)
         if mode == 'primal':
             mat = np.einsum('n,kl,nl->nk', np.minimum(betart[innerfaces], 0) * dS, massloc, u[fi1]-u[fi0])
-            np.add.at(du, fi0, mat)
+            npext.addAt(du, fi0, mat)
             mat = np.einsum('n,kl,nl->nk', np.maximum(betart[innerfaces], 0)*dS, massloc, u[fi1]-u[fi0])
-            np.add.at(du, fi1, mat)
+            npext.addAt(du, fi1, mat)
         elif mode =='dual':
             assert 0
         elif mode =='centered':
@@ -625,7 +607,7 @@ class CR1(fems.fem.Fem):
             mus = data.md.mus
             mat = np.einsum('n,njk,nk,ni,nj -> ni', dV, cellgrads, beta, 1-dim*mus,u[foc])
         else: raise ValueError(f"unknown type {type=}")
-        np.add.at(du, foc, mat)
+        npext.addAt(du, foc, mat)
         self.massDotBoundary(du, u, coeff=-np.minimum(betart, 0))
     def computeFormTransportUpwindAlg(self, du, u, data):
         self.computeFormTransportCellWise(du, u, data, type='centered')
@@ -640,24 +622,29 @@ class CR1(fems.fem.Fem):
         # cellgrads = self.cellgrads[:,:,:dim]
         # betagrad = np.einsum('njk,nk -> nj', cellgrads, beta)
         # r = np.einsum('n,ni->ni', deltas*dV*f[facesOfCells].mean(axis=1), betagrad)
-        r = np.einsum('n,nk->nk', coeff*dV*f[facesOfCells].mean(axis=1), dim/(dim+1)-dim*data.md.mus)
-        np.add.at(b, facesOfCells, r)
+        r = np.einsum('n,n...,nk->nk...', coeff*dV, f[facesOfCells].mean(axis=1), dim/(dim+1)-dim*data.md.mus)
+        npext.addAt(b, facesOfCells, r)
         return b
     # dotmat
     def massDotCell(self, b, f, coeff=1):
         assert f.shape[0] == self.mesh.ncells
         dimension, facesOfCells, dV = self.mesh.dimension, self.mesh.facesOfCells, self.mesh.dV
         massloc = 1/(dimension+1)
-        np.add.at(b, facesOfCells, (massloc*coeff*dV*f)[:, np.newaxis])
+        npext.addAt(b, facesOfCells, (massloc*coeff*dV*f)[:, np.newaxis])
         return b
     def massDot(self, b, f, coeff=1):
         dim, facesOfCells, dV = self.mesh.dimension, self.mesh.facesOfCells, self.mesh.dV
         scalemass = (2-dim) / (dim+1) / (dim+2)
         massloc = np.tile(scalemass, (self.nloc,self.nloc))
         massloc.reshape((self.nloc*self.nloc))[::self.nloc+1] = (2-dim + dim*dim) / (dim+1) / (dim+2)
-        r = np.einsum('n,kl,nl->nk', coeff*dV, massloc, f[facesOfCells])
-        np.add.at(b, facesOfCells, r)
+        r = np.einsum('n,kl,nl...->nk...', coeff*dV, massloc, f[facesOfCells])
+        npext.addAt(b, facesOfCells, r)
         return b
+    def diagonalMass(self, coeff=1):
+        dim, facesOfCells, dV = self.mesh.dimension, self.mesh.facesOfCells, self.mesh.dV
+        d = np.zeros(self.mesh.nfaces)
+        npext.addAt(d, facesOfCells, np.repeat(coeff*dV*(2-dim + dim*dim) / (dim+1) / (dim+2), self.nloc).reshape(-1, self.nloc))
+        return d
     # rhs
     # postprocess
     def computeErrorL2Cell(self, solexact, uh):
@@ -8,7 +8,7 @@ Created on Sun Dec  4 18:14:29 2016
 import numpy as np
 import scipy.linalg as linalg
 import scipy.sparse as sparse
-from simfempy.fems import femsys, cr1
+from simfempy.fems import femsys, cr1, kernels, matrixfree
 from simfempy.tools import barycentric, npext
 
 #=================================================================#
@@ -38,41 +38,12 @@ class CR1sys(femsys.Femsys):
         else:
             raise ValueError(f"don't know how to handle {type(next(iter(f.values())))=}")
     def matrixBoundary(self, A, bdrydata, method):
-        facesdirflux, facesinner, facesdirall, colorsdir = bdrydata.facesdirflux, bdrydata.facesinner, bdrydata.facesdirall, bdrydata.colorsdir
-        x, y, z = self.mesh.pointsf.T
-        nfaces, ncomp = self.mesh.nfaces, self.ncomp
-        for color, faces in facesdirflux.items():
-            ind = np.repeat(ncomp * faces, ncomp)
-            for icomp in range(ncomp): ind[icomp::ncomp] += icomp
-            nb = faces.shape[0]
-            help = sparse.dok_matrix((ncomp *nb, ncomp * nfaces))
-            for icomp in range(ncomp):
-                for i in range(nb): help[icomp + ncomp * i, icomp + ncomp * faces[i]] = 1
-            bdrydata.Asaved[color] = help.dot(A)
-        indin = np.repeat(ncomp * facesinner, ncomp)
-        for icomp in range(ncomp): indin[icomp::ncomp] += icomp
-        inddir = np.repeat(ncomp * facesdirall, ncomp)
-        for icomp in range(ncomp): inddir[icomp::ncomp] += icomp
-        bdrydata.A_inner_dir = A[indin, :][:, inddir]
-        if method == 'strong':
-            help = np.ones((ncomp * nfaces))
-            help[inddir] = 0
-            help = sparse.dia_matrix((help, 0), shape=(ncomp * nfaces, ncomp * nfaces))
-            A = help.dot(A.dot(help))
-            help = np.zeros((ncomp * nfaces))
-            help[inddir] = 1.0
-            help = sparse.dia_matrix((help, 0), shape=(ncomp * nfaces, ncomp * nfaces))
-            A += help
-        else:
-            bdrydata.A_dir_dir = A[inddir, :][:, inddir]
-            help = np.ones((ncomp * nfaces))
-            help[inddir] = 0
-            help = sparse.dia_matrix((help, 0), shape=(ncomp * nfaces, ncomp * nfaces))
-            help2 = np.zeros((ncomp * nfaces))
-            help2[inddir] = 1
-            help2 = sparse.dia_matrix((help2, 0), shape=(ncomp * nfaces, ncomp * nfaces))
-            A = help.dot(A.dot(help)) + help2.dot(A.dot(help2))
-        return A
+        return self.matrixBoundarySystem(A, bdrydata, method, bdrydata.facesdirall, bdrydata.facesinner, bdrydata.facesdirflux)
+    def operatorBoundary(self, A, bdrydata, method):
+        if method != 'strong': raise ValueError(f"matrix-free operator only with method='strong' ({method=})")
+        dirflux = {key: self.systemIndices(faces) for key, faces in bdrydata.facesdirflux.items()}
+        inddir, indin = self.systemIndices(bdrydata.facesdirall), self.systemIndices(bdrydata.facesinner)
+        return matrixfree.boundaryOperator(A, bdrydata, inddir, indin, dirflux, symmetric=True)
     def formBoundary(self, b, bdrydata, method):
         facesdirall, ncomp = bdrydata.facesdirall, self.ncomp
         inddir = np.repeat(ncomp * facesdirall, ncomp)
@@ -147,10 +118,10 @@ class CR1sys(femsys.Femsys):
         ncomp, dV, cellgrads, foc = self.ncomp, self.mesh.dV, self.fem.cellgrads, self.mesh.facesOfCells
         for icomp in range(ncomp):
             r = np.einsum('n,ni->ni', -dV*p, cellgrads[:,:,icomp])
-            np.add.at(dv[icomp::ncomp], foc, r)
+            npext.addAt(dv[icomp::ncomp], foc, r)
             dp += np.einsum('n,ni,ni->n', dV, cellgrads[:,:,icomp], v[icomp::ncomp][foc])
     def computeMatrixLaplace(self, mucell):
-        return self.matrix2systemdiagonal(self.fem.computeMatrixDiffusion(mucell), self.ncomp).tocsr()
+        return self.matrix2systemdiagonal(self.fem.computeMatrixDiffusion(mucell), self.ncomp)
         # OLD VERSION: twice slower
         # import time
         # t0 = time.time()
@@ -170,10 +141,18 @@ class CR1sys(femsys.Femsys):
         #     raise ValueError(f"{A.diagonal()=} {B.diagonal()=}")
         # return A
     def computeFormLaplace(self, mu, dv, v):
-        ncomp, dV, cellgrads, foc = self.ncomp, self.mesh.dV, self.fem.cellgrads, self.mesh.facesOfCells
-        for icomp in range(ncomp):
-            r = np.einsum('n,nil,njl,nj->ni', dV*mu, cellgrads, cellgrads, v[icomp::ncomp][foc])
-            np.add.at(dv[icomp::ncomp], foc, r)
+        ncomp, dV, cellgrads, foc = self.ncomp, self.mesh.dV, self.fem.cellgrads[:, :, :self.mesh.dimension], self.mesh.facesOfCells
+        # batched matmul is much faster than einsum for these small products
+        grad = np.matmul(v.reshape(-1, ncomp)[foc].swapaxes(1, 2), cellgrads)*(dV*mu)[:, np.newaxis, np.newaxis]
+        r = np.matmul(cellgrads, grad.swapaxes(1, 2))
+        npext.addAt(dv, ncomp*foc[:, :, np.newaxis] + np.arange(ncomp), r)
+    def computeOperatorLaplace(self, mucell):
+        """
+        matrix-free operator (matrixfree.FormOperator) of computeMatrixLaplace()
+        """
+        form = lambda dv, v: self.computeFormLaplace(mucell, dv, v)
+        diagonal = lambda: np.repeat(self.fem.diagonalDiffusion(mucell), self.ncomp)
+        return matrixfree.FormOperator(self.ncomp*self.nunknowns(), [form], [diagonal])
     def computeRhsNitscheDiffusion(self, b, diffcoff, colorsdir, udir, ncomp, coeff=1):
         for icomp in range(ncomp):
             self.fem.computeRhsNitscheDiffusion(b[icomp::ncomp], diffcoff, colorsdir, udir[:,icomp], coeff)
@@ -186,57 +165,45 @@ class CR1sys(femsys.Femsys):
 
 
     def computeMatrixElasticity(self, mucell, lamcell):
-        nfaces, ncells, ncomp, dV = self.mesh.nfaces, self.mesh.ncells, self.ncomp, self.mesh.dV
-        nloc, rows, cols, cellgrads = self.fem.nloc, self.rowssys, self.colssys, self.fem.cellgrads
-        mat = np.zeros(shape=rows.shape, dtype=float).reshape(ncells, ncomp * nloc, ncomp * nloc)
-        for i in range(ncomp):
-            for j in range(self.ncomp):
-                mat[:, i::ncomp, j::ncomp] += (np.einsum('nk,nl->nkl', cellgrads[:, :, i], cellgrads[:, :, j]).T * dV * lamcell).T
-                mat[:, i::ncomp, j::ncomp] += (np.einsum('nk,nl->nkl', cellgrads[:, :, j], cellgrads[:, :, i]).T * dV * mucell).T
-                mat[:, i::ncomp, i::ncomp] += (np.einsum('nk,nl->nkl', cellgrads[:, :, j], cellgrads[:, :, j]).T * dV * mucell).T
-        A = sparse.coo_matrix((mat.ravel(), (rows, cols)), shape=(ncomp*nfaces, ncomp*nfaces)).tocsr()
-        A += self.computeMatrixKorn(mucell)
-        return A
-    def computeMatrixKorn(self, mucell):
-        ncomp = self.ncomp
-        dimension, dV, ndofs = self.mesh.dimension, self.mesh.dV, self.nunknowns()
-        nloc, dofspercell, nall = self.nlocal(), self.dofspercell(), ncomp*ndofs
+        # the cell and the face terms in one bsr build
+        facestencil = self.fem.faceStencil()
+        celldata = kernels.scatterScaled(self.stencilsys, self.localElasticity(), [lamcell, mucell])
+        return facestencil.bsr(facestencil.data(self.localKorn(mucell)), self.ncomp, celldata)
+    def computeOperatorElasticity(self, mucell, lamcell):
+        # only the nonzeros of the face stencil are stored
+        A = self.computeMatrixKorn(mucell).tocsr()
+        A.eliminate_zeros()
+        return super().computeOperatorElasticity(mucell, lamcell) + A
+    def localKorn(self, mucell):
+        """
+        (ninnerfaces, 2, 2, nloc, nloc): penalty of the jumps for the Korn inequality in the layout of fem.faceStencil()
+        (couples the faces of the two cells of an interior face except the face itself)
+        """
+        dV, nloc = self.mesh.dV, self.nlocal()
         ci0 = self.mesh.cellsOfInteriorFaces[:,0]
         ci1 = self.mesh.cellsOfInteriorFaces[:,1]
         assert np.all(ci1>=0)
         normalsS = self.mesh.normals[self.mesh.innerfaces]
         dS = linalg.norm(normalsS, axis=1)
         faces = self.mesh.faces[self.mesh.innerfaces]
-        ind0 = npext.positionin(faces, self.mesh.simplices[ci0])
-        ind1 = npext.positionin(faces, self.mesh.simplices[ci1])
-        fi0 = np.take_along_axis(self.mesh.facesOfCells[ci0], ind0, axis=1)
-        fi1 = np.take_along_axis(self.mesh.facesOfCells[ci1], ind1, axis=1)
-        d = self.mesh.dimension
-        massloc = barycentric.crbdryothers(d)
+        ind = [npext.positionin(faces, self.mesh.simplices[ci]) for ci in [ci0, ci1]]
+        massloc = barycentric.crbdryothers(self.mesh.dimension)
         if isinstance(mucell,(int,float)):
             scale = mucell*dS/(dV[ci0]+ dV[ci1])
         else:
             scale = (mucell[ci0] + mucell[ci1]) * dS / (dV[ci0] + dV[ci1])
         scale *= 8
-        A = sparse.coo_matrix((nall, nall))
-        mat = np.einsum('n,kl->nkl', dS*scale, massloc).reshape(-1)
-        for icomp in range(ncomp):
-            d0 = ncomp*fi0+icomp
-            d1 = ncomp*fi1+icomp
-            rows0 = d0.repeat(nloc-1)
-            cols0 = np.tile(d0,nloc-1).reshape(-1)
-            rows1 = d1.repeat(nloc-1)
-            cols1 = np.tile(d1,nloc-1).reshape(-1)
-            # print(f"{mat.shape=}")
-            # print(f"{rows0.shape=}")
-            # print(f"{cols0.shape=}")
-            # print(f"{fi0.shape=}")
-            # print(f"{fi1.shape=}")
-            A += sparse.coo_matrix((mat, (rows0, cols0)), shape=(nall, nall))
-            A += sparse.coo_matrix((-mat, (rows0, cols1)), shape=(nall, nall))
-            A += sparse.coo_matrix((-mat, (rows1, cols0)), shape=(nall, nall))
-            A += sparse.coo_matrix((mat, (rows1, cols1)), shape=(nall, nall))
-        return A
+        local = np.einsum('n,kl->nkl', dS*scale, massloc)
+        nf = len(dS)
+        mat = np.zeros((nf, 2, 2, nloc, nloc))
+        f = np.arange(nf)[:, np.newaxis, np.newaxis]
+        for a in range(2):
+            for b in range(2):
+                mat[f, a, b, ind[a][:, :, np.newaxis], ind[b][:, np.newaxis, :]] = local if a == b else -local
+        return mat
+    def computeMatrixKorn(self, mucell):
+        facestencil = self.fem.faceStencil()
+        return facestencil.bsr(facestencil.data(self.localKorn(mucell)), self.ncomp)
     def computeBdryNormalFlux(self, u, colors, bdrydata):
         flux, omega = np.zeros(shape=(len(colors),self.ncomp)), np.zeros(len(colors))
         for i,color in enumerate(colors):
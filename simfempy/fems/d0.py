@@ -8,7 +8,7 @@ import numpy as np
 import scipy.linalg as linalg
 import scipy.sparse as sparse
 from simfempy.fems import fem
-from simfempy.tools import barycentric
+from simfempy.tools import barycentric, npext
 
 #=================================================================#
 class D0(fem.Fem):
@@ -18,12 +18,14 @@ class D0(fem.Fem):
         super().setMesh(mesh)
     def nlocal(self): return 1
     def nunknowns(self): return self.mesh.ncells
+    def dofspercell(self): return np.arange(self.mesh.ncells)[:,np.newaxis]
+    def basisBarycentric(self, lam): return np.ones((lam.shape[0], 1))
     def tonode(self, u):
         unodes = np.zeros(self.mesh.nnodes)
         if u.shape[0] != self.mesh.ncells: raise ValueError(f"{u.shape=} {self.mesh.ncells=}")
-        np.add.at(unodes, self.mesh.simplices.T, u.T)
+        npext.addAt(unodes, self.mesh.simplices.T, u.T)
         countnodes = np.zeros(self.mesh.nnodes, dtype=int)
-        np.add.at(countnodes, self.mesh.simplices.T, 1)
+        npext.addAt(countnodes, self.mesh.simplices.T, 1)
         unodes /= countnodes
         return unodes
     def interpolate(self, f):
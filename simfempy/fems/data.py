@@ -1,3 +1,5 @@
+from simfempy.fems import stencil
+
 #=================================================================#
 class BdryData(object):
     """
@@ -6,6 +8,14 @@ class BdryData(object):
     def __init__(self):
         self.bsaved = {}
         self.Asaved = {}
+        self.dirichletstencil = None
+    def dirichletStencil(self, A, dirall, inner, dirflux):
+        """
+        the stencil.DirichletStencil of the pattern of A, recomputed only if the pattern changes
+        """
+        if self.dirichletstencil is None or not self.dirichletstencil.fits(A):
+            self.dirichletstencil = stencil.DirichletStencil(A, dirall, inner, dirflux)
+        return self.dirichletstencil
 
     def __repr__(self):
         return ", ".join("'{}': {}".format(attr, value) for attr, value in self.__dict__.items())
@@ -9,6 +9,8 @@ import numpy.linalg as linalg
 from simfempy import fems
 from simfempy.meshes.simplexmesh import SimplexMesh
 import scipy.sparse as sparse
+from simfempy.tools import npext
+from simfempy.fems import stencil, kernels
 
 
 #=================================================================#
@@ -24,8 +26,13 @@ class Fem(object):
         self.nloc = self.nlocal()
         if innersides: self.mesh.constructInnerFaces()
     def computeStencilCell(self, dofspercell):
+        dofspercell = npext.asIndex(dofspercell)
         self.cols = np.tile(dofspercell, self.nloc).ravel()
         self.rows = np.repeat(dofspercell, self.nloc).ravel()
+        # all matrices on the cell stencil share the csr pattern
+        self.stencil = stencil.CsrStencil(self.rows, self.cols, self.nunknowns())
+        self.localmatrices = stencil.LocalMatrixCache()
+        self.facestencil = None
         #Alternative
         # self.rows = dofspercell.repeat(self.nloc).reshape(self.mesh.ncells, self.nloc, self.nloc)
         # self.cols = self.rows.swapaxes(1, 2)
@@ -63,6 +70,17 @@ class Fem(object):
         else:
             xc, yc, zc = self.mesh.pointsc.T
             return f(xc, yc, zc)
+    def evaluate(self, u, points):
+        """
+        values of the discrete function u at the points (n,k), nan outside the mesh
+        needs dofspercell() and basisBarycentric(lam)
+        """
+        cells, lam = self.mesh.locate(points)
+        inside = cells >= 0
+        values = np.full((len(cells),)+u.shape[1:], np.nan)
+        dofs = self.dofspercell()[cells[inside]]
+        values[inside] = np.einsum('nk,nk...->n...', self.basisBarycentric(lam[inside]), u[dofs])
+        return values
     def computeMatrixDiffusion(self, coeff):
         ndofs = self.nunknowns()
         # matxx = np.einsum('nk,nl->nkl', self.cellgrads[:, :, 0], self.cellgrads[:, :, 0])
@@ -70,38 +88,68 @@ class Fem(object):
         # matzz = np.einsum('nk,nl->nkl', self.cellgrads[:, :, 2], self.cellgrads[:, :, 2])
         # mat = ( (matxx+matyy+matzz).T*self.mesh.dV*coeff).T.ravel()
         cellgrads = self.cellgrads[:,:,:self.mesh.dimension]
-        mat = np.einsum('n,nil,njl->nij', self.mesh.dV*coeff, cellgrads, cellgrads).ravel()
-        return sparse.coo_matrix((mat, (self.rows, self.cols)), shape=(ndofs, ndofs)).tocsr()
+        local = self.localmatrices.get('diffusion', lambda: kernels.localDiffusion(cellgrads, self.mesh.dV))
+        return self.stencil.csr(kernels.scatterScaled(self.stencil, local, coeff))
     def computeFormDiffusion(self, du, u, coeff):
         doc = self.dofspercell()
         cellgrads = self.cellgrads[:,:,:self.mesh.dimension]
-        r = np.einsum('n,nil,njl,nj->ni', self.mesh.dV*coeff, cellgrads, cellgrads, u[doc])
-        np.add.at(du, doc, r)
+        # gradient first: O(nloc*dim) per cell instead of O(nloc*nloc*dim)
+        grad = np.einsum('njl,nj->nl', cellgrads, u[doc])*(self.mesh.dV*coeff)[:,np.newaxis]
+        r = np.einsum('nil,nl->ni', cellgrads, grad)
+        npext.addAt(du, doc, r)
+    def diagonalDiffusion(self, coeff):
+        doc = self.dofspercell()
+        cellgrads = self.cellgrads[:,:,:self.mesh.dimension]
+        d = np.zeros(self.nunknowns())
+        npext.addAt(d, doc, np.einsum('n,nil,nil->ni', self.mesh.dV*coeff, cellgrads, cellgrads))
+        return d
 
+    def matrixBoundaryScalar(self, A, bdrydata, method, dirall, inner, dirflux):
+        """
+        Dirichlet conditions for the csr matrix A on the data array (the index arrays are cached in bdrydata)
+        strong: rows of dirall replaced by the identity, otherwise: they keep only dirichlet_al*A[dirall][:, dirall]
+        """
+        assert method != 'nitsche'
+        A = sparse.csr_matrix(A)
+        A.sum_duplicates()
+        dirichlet = bdrydata.dirichletStencil(A, dirall, inner, dirflux)
+        for color, sub in dirichlet.flux.items():
+            bdrydata.Asaved[color] = sub.matrix(A)
+        bdrydata.A_inner_dir = dirichlet.inner_dir.matrix(A)
+        if method != 'strong': bdrydata.A_dir_dir = self.dirichlet_al*dirichlet.dir_dir.matrix(A)
+        return dirichlet.matrix(A, method, scale=self.dirichlet_al)
+    def cellEntries(self, cells, i, j):
+        """
+        positions in the data array of the cell stencil of the local entries (i, j) of the cells (broadcast)
+        """
+        # up to nloc**2*ncells: may not fit the index type of the mesh (npext.asIndex())
+        cells = np.asarray(cells, dtype=np.int64)
+        return self.stencil.scatter[(cells*self.nloc + i)*self.nloc + j]
+    def faceStencil(self):
+        """
+        stencil of the couplings over the interior faces, computed on first use
+        """
+        if self.facestencil is None:
+            self.facestencil = stencil.FaceStencil(self.stencil, npext.asIndex(self.dofspercell()), self.mesh.cellsOfInteriorFaces)
+        return self.facestencil
+    def localLps(self, scale):
+        """
+        (ninnerfaces, 2, 2, nloc, nloc): scale * jump(grad(phi_i)).jump(grad(phi_j)) in the layout of faceStencil()
+        """
+        cg = self.cellgrads[self.mesh.cellsOfInteriorFaces]
+        mat = np.matmul(cg[:, :, np.newaxis], cg[:, np.newaxis].swapaxes(-1, -2))
+        mat *= np.multiply.outer(scale, np.array([[1, -1], [-1, 1]]))[:, :, :, np.newaxis, np.newaxis]
+        return mat
     def computeMatrixLps(self, betaC):
-        dimension, dV, ndofs = self.mesh.dimension, self.mesh.dV, self.nunknowns()
-        nloc, dofspercell = self.nlocal(), self.dofspercell()
+        dV = self.mesh.dV
         ci = self.mesh.cellsOfInteriorFaces
         normalsS = self.mesh.normals[self.mesh.innerfaces]
         dS = linalg.norm(normalsS, axis=1)
         scale = 0.5*(dV[ci[:,0]]+ dV[ci[:,1]])
         betan = 0.5*(np.linalg.norm(betaC[ci[:,0]],axis=1)+ np.linalg.norm(betaC[ci[:,1]],axis=1))
         scale *= 0.01*dS*betan
-        cg0 = self.cellgrads[ci[:,0], :, :]
-        cg1 = self.cellgrads[ci[:,1], :, :]
-        mat00 = np.einsum('nki,nli,n->nkl', cg0, cg0, scale)
-        mat01 = np.einsum('nki,nli,n->nkl', cg0, cg1, -scale)
-        mat10 = np.einsum('nki,nli,n->nkl', cg1, cg0, -scale)
-        mat11 = np.einsum('nki,nli,n->nkl', cg1, cg1, scale)
-        rows0 = dofspercell[ci[:,0],:].repeat(nloc)
-        cols0 = np.tile(dofspercell[ci[:,0],:],nloc).reshape(-1)
-        rows1 = dofspercell[ci[:,1],:].repeat(nloc)
-        cols1 = np.tile(dofspercell[ci[:,1],:],nloc).reshape(-1)
-        A00 = sparse.coo_matrix((mat00.reshape(-1), (rows0, cols0)), shape=(ndofs, ndofs))
-        A01 = sparse.coo_matrix((mat01.reshape(-1), (rows0, cols1)), shape=(ndofs, ndofs))
-        A10 = sparse.coo_matrix((mat10.reshape(-1), (rows1, cols0)), shape=(ndofs, ndofs))
-        A11 = sparse.coo_matrix((mat11.reshape(-1), (rows1, cols1)), shape=(ndofs, ndofs))
-        return A00+A01+A10+A11
+        facestencil = self.faceStencil()
+        return facestencil.csr(facestencil.data(self.localLps(scale)))
 
     def computeFormConvection(self, du, u, data, method):
         if method[:4] == 'supg':
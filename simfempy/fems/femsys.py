@@ -8,6 +8,8 @@ Created on Sun Dec  4 18:14:29 2016
 import numpy as np
 import scipy.linalg as linalg
 import scipy.sparse as sparse
+from simfempy.tools import npext
+from simfempy.fems import stencil, kernels, matrixfree
 
 #=================================================================#
 class Femsys():
@@ -24,14 +26,49 @@ class Femsys():
     def setMesh(self, mesh):
         self.mesh = mesh
         self.fem.setMesh(mesh)
-        ncomp, nloc, ncells = self.ncomp, self.fem.nloc, self.mesh.ncells
-        dofs = self.fem.dofspercell()
-        nlocncomp = ncomp * nloc
-        self.rowssys = np.repeat(ncomp * dofs, ncomp).reshape(ncells * nloc, ncomp) + np.arange(ncomp, dtype=np.uint32)
-        self.rowssys = self.rowssys.reshape(ncells, nlocncomp).repeat(nlocncomp).reshape(ncells, nlocncomp, nlocncomp)
-        self.colssys = self.rowssys.swapaxes(1, 2)
-        self.colssys = self.colssys.reshape(-1)
-        self.rowssys = self.rowssys.reshape(-1)
+        # the system matrices are bsr with blocks (ncomp, ncomp) on the pattern of the scalar fem
+        self.stencilsys = stencil.BsrStencil(self.fem.stencil, (self.ncomp, self.ncomp))
+        self.localmatrices = stencil.LocalMatrixCache()
+    def localElasticity(self):
+        """
+        local matrices of the lam- and mu-parts of the elasticity operator (2, ncells, nloc, nloc, ncomp, ncomp)
+        """
+        compute = lambda: kernels.localElasticity(self.fem.cellgrads, self.mesh.dV, self.ncomp)
+        return self.localmatrices.get('elasticity', compute)
+    def computeFormElasticity(self, du, u, mucell, lamcell):
+        """
+        matrix-free version of computeMatrixElasticity() (without the Korn term of CR1sys)
+        """
+        ncomp, dim, dV = self.ncomp, self.mesh.dimension, self.mesh.dV
+        doc, cellgrads = self.fem.dofspercell(), self.fem.cellgrads[:, :, :dim]
+        # grad[n,i,j]: derivative in direction j of component i
+        # batched matmul is much faster than einsum for these small products
+        grad = np.matmul(u.reshape(-1, ncomp)[doc].swapaxes(1, 2), cellgrads)
+        div = np.einsum('nii->n', grad)
+        sig = (grad + grad.swapaxes(1, 2))*(dV*mucell)[:, np.newaxis, np.newaxis]
+        sig[:, np.arange(ncomp), np.arange(ncomp)] += (dV*lamcell*div)[:, np.newaxis]
+        r = np.matmul(cellgrads, sig.swapaxes(1, 2))
+        npext.addAt(du, ncomp*doc[:, :, np.newaxis] + np.arange(ncomp), r)
+    def diagonalElasticity(self, mucell, lamcell):
+        ncomp, dim, dV = self.ncomp, self.mesh.dimension, self.mesh.dV
+        doc, cellgrads = self.fem.dofspercell(), self.fem.cellgrads[:, :, :dim]
+        cg2 = cellgrads**2
+        r = np.einsum('n,nki->nki', dV*(lamcell+mucell), cg2) + np.einsum('n,nk->nk', dV*mucell, cg2.sum(axis=2))[:, :, np.newaxis]
+        d = np.zeros(ncomp*self.nunknowns())
+        npext.addAt(d, ncomp*doc[:, :, np.newaxis] + np.arange(ncomp), r)
+        return d
+    def computeOperatorElasticity(self, mucell, lamcell):
+        """
+        matrix-free operator (matrixfree.FormOperator) of computeMatrixElasticity()
+        """
+        form = lambda du, u: self.computeFormElasticity(du, u, mucell, lamcell)
+        diagonal = lambda: self.diagonalElasticity(mucell, lamcell)
+        return matrixfree.FormOperator(self.ncomp*self.nunknowns(), [form], [diagonal])
+    def systemIndices(self, ind):
+        """
+        indices of all components of the scalar dofs ind
+        """
+        return (self.ncomp*np.asarray(ind)[:, np.newaxis] + np.arange(self.ncomp)).ravel()
     def prepareBoundary(self, colorsdirichlet, colorsflux=[]):
         return self.fem.prepareBoundary(colorsdirichlet, colorsflux)
     def computeRhsCells(self, b, rhs):
@@ -64,45 +101,40 @@ class Femsys():
             all.append(a)
         return all
     def computeMatrixLps(self):
-        ncomp = self.ncomp
-        dimension, dV, ndofs = self.mesh.dimension, self.mesh.dV, self.nunknowns()
-        nloc, dofspercell, nall = self.nlocal(), self.dofspercell(), ncomp*ndofs
+        dV = self.mesh.dV
         ci = self.mesh.cellsOfInteriorFaces
         normalsS = self.mesh.normals[self.mesh.innerfaces]
         dS = linalg.norm(normalsS, axis=1)
         scale = 0.5*(dV[ci[:,0]]+ dV[ci[:,1]])
         scale *= 0.0001*dS
-        cg0 = self.fem.cellgrads[ci[:,0], :, :]
-        cg1 = self.fem.cellgrads[ci[:,1], :, :]
-        mat00 = np.einsum('nki,nli,n->nkl', cg0, cg0, scale)
-        mat01 = np.einsum('nki,nli,n->nkl', cg0, cg1, -scale)
-        mat10 = np.einsum('nki,nli,n->nkl', cg1, cg0, -scale)
-        mat11 = np.einsum('nki,nli,n->nkl', cg1, cg1, scale)
-        A = sparse.coo_matrix((nall, nall))
-        for icomp in range(ncomp):
-            d0 = ncomp*dofspercell[ci[:,0],:]+icomp
-            d1 = ncomp*dofspercell[ci[:,1],:]+icomp
-            rows0 = d0.repeat(nloc)
-            cols0 = np.tile(d0,nloc).reshape(-1)
-            rows1 = d1.repeat(nloc)
-            cols1 = np.tile(d1,nloc).reshape(-1)
-            A += sparse.coo_matrix((mat00.ravel(), (rows0, cols0)), shape=(nall, nall))
-            A += sparse.coo_matrix((mat01.ravel(), (rows0, cols1)), shape=(nall, nall))
-            A += sparse.coo_matrix((mat10.ravel(), (rows1, cols0)), shape=(nall, nall))
-            A += sparse.coo_matrix((mat11.ravel(), (rows1, cols1)), shape=(nall, nall))
-        return A
+        facestencil = self.fem.faceStencil()
+        return facestencil.bsr(facestencil.data(self.fem.localLps(scale)), self.ncomp)
     def getPointData(self, u):
         return {f"u_{i}":self.fem.tonode(u[i::self.ncomp]) for i in range(self.ncomp)}
     def matrix2systemdiagonal(self, A, ncomp):
-        A = A.tocoo()
-        data, row, col, shape = A.data, A.row, A.col, A.shape
-        n = shape[0]
-        assert n==shape[1]
-        data2 = np.repeat(data, ncomp)
-        nr = row.shape[0]
-        row2 = np.repeat(ncomp*row, ncomp) + np.tile(np.arange(ncomp),nr).ravel()
-        col2 = np.repeat(ncomp*col, ncomp) + np.tile(np.arange(ncomp),nr).ravel()
-        return sparse.coo_matrix((data2, (row2, col2)), shape=(ncomp*n, ncomp*n)).tocsr()
+        """
+        the bsr matrix with blocks A[i,j]*Id (ncomp, ncomp)
+        """
+        A = sparse.csr_matrix(A)
+        n = A.shape[0]
+        assert n==A.shape[1]
+        A.sum_duplicates()
+        data = A.data[:, np.newaxis, np.newaxis]*np.eye(ncomp)
+        return sparse.bsr_matrix((data, A.indices, A.indptr), shape=(ncomp*n, ncomp*n))
+    def matrixBoundarySystem(self, A, bdrydata, method, dirall, inner, dirflux):
+        """
+        Dirichlet conditions for the bsr matrix A (all components of the dofs dirall are Dirichlet), done on the blocks
+        strong: rows and columns of dirall replaced by the identity, otherwise: inner and Dirichlet dofs decoupled
+        the index arrays are cached in bdrydata
+        """
+        ncomp = self.ncomp
+        if not sparse.isspmatrix_bsr(A) or A.blocksize != (ncomp, ncomp): A = sparse.bsr_matrix(A, blocksize=(ncomp, ncomp))
+        dirichlet = bdrydata.dirichletStencil(A, dirall, inner, dirflux)
+        for color, sub in dirichlet.flux.items():
+            bdrydata.Asaved[color] = sub.matrix(A)
+        bdrydata.A_inner_dir = dirichlet.inner_dir.matrix(A)
+        if method != 'strong': bdrydata.A_dir_dir = dirichlet.dir_dir.matrix(A)
+        return dirichlet.matrix(A, method, symmetric=True)
 
 
 # ------------------------------
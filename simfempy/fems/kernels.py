@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+
+element kernels: local matrices and their scatter into the data of a stencil.CsrStencil (or stencil.BsrStencil)
+two backends with identical results:
+    'numpy': reference implementation (einsum and bincount)
+    'numba': compiled loops, the scaling (resp. the computation) of the local matrices is fused with the scatter
+'auto' uses numba if it is installed, the default can be changed by the environment variable SIMFEMPY_KERNELS
+"""
+import os
+import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# ------------------------------------- #
+backend = os.environ.get('SIMFEMPY_KERNELS', 'auto')
+if backend not in ['auto', 'numpy', 'numba'] or (backend == 'numba' and numba is None): backend = 'auto'
+def setBackend(name):
+    global backend
+    if name not in ['auto', 'numpy', 'numba']: raise ValueError(f"unknown backend {name=}")
+    if name == 'numba' and numba is None: raise ValueError(f"backend {name=} needs numba (not installed)")
+    backend = name
+def getBackend():
+    """
+    the backend actually used ('numpy' or 'numba')
+    """
+    if backend == 'numpy' or numba is None: return 'numpy'
+    return 'numba'
+
+# ------------------------------------- #
+def localDiffusion(cellgrads, dV):
+    """
+    (ncells, nloc, nloc): dV * grad(phi_i).grad(phi_j)
+    """
+    if getBackend() == 'numba': return _nbLocalDiffusion(cellgrads, dV)
+    return np.einsum('n,nil,njl->nij', dV, cellgrads, cellgrads)
+def localElasticity(cellgrads, dV, ncomp):
+    """
+    (2, ncells, nloc, nloc, ncomp, ncomp): lam- and mu-parts of the elasticity operator in block form
+    """
+    if getBackend() == 'numba': return _nbLocalElasticity(cellgrads, dV, ncomp)
+    cellgrads = cellgrads[:, :, :ncomp]
+    mat = np.empty(shape=(2, cellgrads.shape[0], cellgrads.shape[1], cellgrads.shape[1], ncomp, ncomp))
+    mat[0] = np.einsum('n,nki,nlj->nklij', dV, cellgrads, cellgrads)
+    mat[1] = mat[0].swapaxes(3, 4)
+    mat[1] += np.einsum('nkl,ij->nklij', localDiffusion(cellgrads, dV), np.eye(ncomp))
+    return mat
+def localNavier(mu, normalsS, cellgrads, normals):
+    """
+    (nfaces, nloc, ncomp, ncomp): mu * (normalsS.grad(phi_j)) * n_l * n_m (Nitsche term of the Navier condition)
+    """
+    if getBackend() == 'numba': return _nbLocalNavier(mu, normalsS, cellgrads, normals)
+    ngrad = mu[:, np.newaxis]*np.einsum('fk,fjk->fj', normalsS, cellgrads)
+    return ngrad[:, :, np.newaxis, np.newaxis]*np.einsum('fl,fm->flm', normals, normals)[:, np.newaxis]
+
+# ------------------------------------- #
+def scatterScaled(stencil, local, coeff):
+    """
+    csr (bsr) data of sum_m coeff[m]*local[m]
+    local: (ncells, ...) with coeff scalar or (ncells,), or (m, ncells, ...) with a list of m coefficients
+    """
+    local = np.asarray(local)
+    if not isinstance(coeff, (list, tuple)): local, coeff = local[np.newaxis], [coeff]
+    if len(coeff) != local.shape[0]: raise ValueError(f"{local.shape=} needs {local.shape[0]} coefficients ({len(coeff)=})")
+    ncells = local.shape[1]
+    local = local.reshape(len(coeff), ncells, -1)
+    coeff = [np.broadcast_to(np.asarray(c, dtype=float), (ncells,)) for c in coeff]
+    if getBackend() == 'numba':
+        return _nbScatterScaled(stencil.scatter, stencil.nnz, np.ascontiguousarray(local), np.stack(coeff))
+    values = local[0]*coeff[0][:, np.newaxis]
+    for l, c in zip(local[1:], coeff[1:]): values += l*c[:, np.newaxis]
+    return np.bincount(stencil.scatter, weights=values.ravel(), minlength=stencil.nnz)
+def transport(stencil, cellgrads, beta, weight, mus):
+    """
+    csr data of the cell-wise transport matrix weight * (beta.grad(phi_j)) * mus_i
+    mus: (nloc,) or (ncells, nloc)
+    """
+    ncells, nloc = cellgrads.shape[0], cellgrads.shape[1]
+    mus = np.broadcast_to(np.asarray(mus, dtype=float), (ncells, nloc))
+    weight = np.broadcast_to(np.asarray(weight, dtype=float), (ncells,))
+    if getBackend() == 'numba':
+        return _nbTransport(stencil.scatter, stencil.nnz, cellgrads, beta, np.ascontiguousarray(weight), np.ascontiguousarray(mus))
+    mat = np.einsum('n,njk,nk,ni -> nij', weight, cellgrads, beta, mus)
+    return np.bincount(stencil.scatter, weights=mat.ravel(), minlength=stencil.nnz)
+
+# ------------------------------------- #
+# the compiled kernels, the scatter loops run in the order of np.bincount
+if numba is not None:
+    @numba.njit(cache=True)
+    def _nbLocalDiffusion(cellgrads, dV):
+        ncells, nloc, dim = cellgrads.shape
+        mat = np.empty((ncells, nloc, nloc))
+        for ic in range(ncells):
+            for i in range(nloc):
+                for j in range(nloc):
+                    s = 0.0
+                    for l in range(dim): s += cellgrads[ic, i, l]*cellgrads[ic, j, l]
+                    mat[ic, i, j] = dV[ic]*s
+        return mat
+    @numba.njit(cache=True)
+    def _nbLocalElasticity(cellgrads, dV, ncomp):
+        ncells, nloc = cellgrads.shape[0], cellgrads.shape[1]
+        mat = np.zeros((2, ncells, nloc, nloc, ncomp, ncomp))
+        for ic in range(ncells):
+            for k in range(nloc):
+                for l in range(nloc):
+                    s = 0.0
+                    for m in range(ncomp): s += cellgrads[ic, k, m]*cellgrads[ic, l, m]
+                    for i in range(ncomp):
+                        mat[1, ic, k, l, i, i] = dV[ic]*s
+                        for j in range(ncomp):
+                            mat[0, ic, k, l, i, j] = dV[ic]*cellgrads[ic, k, i]*cellgrads[ic, l, j]
+                            mat[1, ic, k, l, i, j] += dV[ic]*cellgrads[ic, k, j]*cellgrads[ic, l, i]
+        return mat
+    @numba.njit(cache=True)
+    def _nbLocalNavier(mu, normalsS, cellgrads, normals):
+        nfaces, nloc, dim = cellgrads.shape
+        ncomp = normals.shape[1]
+        mat = np.empty((nfaces, nloc, ncomp, ncomp))
+        for f in range(nfaces):
+            for j in range(nloc):
+                s = 0.0
+                for k in range(dim): s += normalsS[f, k]*cellgrads[f, j, k]
+                s *= mu[f]
+                for l in range(ncomp):
+                    for m in range(ncomp): mat[f, j, l, m] = s*normals[f, l]*normals[f, m]
+        return mat
+    @numba.njit(cache=True)
+    def _nbScatterScaled(scatter, nnz, local, coeff):
+        nm, ncells, nentries = local.shape
+        data = np.zeros(nnz)
+        p = 0
+        for ic in range(ncells):
+            for i in range(nentries):
+                v = 0.0
+                for m in range(nm): v += local[m, ic, i]*coeff[m, ic]
+                data[scatter[p]] += v
+                p += 1
+        return data
+    @numba.njit(cache=True)
+    def _nbTransport(scatter, nnz, cellgrads, beta, weight, mus):
+        ncells, nloc, dim = cellgrads.shape
+        data = np.zeros(nnz)
+        betagrad = np.empty(nloc)
+        p = 0
+        for ic in range(ncells):
+            for j in range(nloc):
+                s = 0.0
+                for k in range(dim): s += cellgrads[ic, j, k]*beta[ic, k]
+                betagrad[j] = weight[ic]*s
+            for i in range(nloc):
+                for j in range(nloc):
+                    data[scatter[p]] += betagrad[j]*mus[ic, i]
+                    p += 1
+        return data
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+
+matrix-free operators: the action of the operator is computed cell-wise by the computeFormXXX of the fems
+(from the cached cellgrads and dV), only small (boundary) parts are kept assembled
+"""
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+from simfempy.solvers import krylov
+
+#=================================================================#
+class FormOperator(splinalg.LinearOperator):
+    """
+    u -> sum of form(du, u) for form in forms + assembled*u
+    diagonals: functions returning the diagonals of the forms (for Jacobi), forms without diagonal are ignored
+    dirichlet: the rows are replaced by the identity (strong Dirichlet), if symmetric also the columns
+    """
+    def __repr__(self):
+        return f"FormOperator({self.shape=} nforms={len(self.forms)} {self.nbytes()=})"
+    def __init__(self, n, forms, diagonals=[], assembled=None, dirichlet=None, symmetric=False):
+        super().__init__(dtype=float, shape=(n, n))
+        self.forms, self.diagonals = list(forms), list(diagonals)
+        self.assembled, self.dirichlet, self.symmetric = assembled, dirichlet, symmetric
+    def __add__(self, other):
+        if not sparse.issparse(other): return super().__add__(other)
+        assembled = sparse.csr_matrix(other) if self.assembled is None else (self.assembled + other).tocsr()
+        return FormOperator(self.shape[0], self.forms, self.diagonals, assembled, self.dirichlet, self.symmetric)
+    def constrained(self, dirichlet, symmetric=False):
+        return FormOperator(self.shape[0], self.forms, self.diagonals, self.assembled, dirichlet, symmetric)
+    def _matvec(self, u):
+        u = np.ravel(u)
+        v = u
+        if self.dirichlet is not None and self.symmetric:
+            v = u.copy()
+            v[self.dirichlet] = 0
+        du = np.zeros(self.shape[0])
+        for form in self.forms: form(du, v)
+        if self.assembled is not None: du += self.assembled.dot(v)
+        if self.dirichlet is not None: du[self.dirichlet] = u[self.dirichlet]
+        return du
+    def _rmatvec(self, u):
+        raise NotImplementedError(f"no transpose for the matrix-free operator")
+    def diagonal(self):
+        d = np.zeros(self.shape[0])
+        for diagonal in self.diagonals: d += diagonal()
+        if self.assembled is not None: d += self.assembled.diagonal()
+        if self.dirichlet is not None: d[self.dirichlet] = 1
+        return d
+    def jacobi(self, omega=1):
+        return Jacobi(self.diagonal(), omega)
+    def nbytes(self):
+        """
+        memory of the assembled part
+        """
+        return matrixBytes(self.assembled) if self.assembled is not None else 0
+
+#=================================================================#
+class SubOperator(splinalg.LinearOperator):
+    """
+    x -> (A*y)[rows] with y[cols]=x and zero elsewhere (all columns if cols is None)
+    replaces the sub-matrices A[rows,:][:,cols] of the assembled case (bdrydata.Asaved, bdrydata.A_inner_dir)
+    """
+    def __init__(self, A, rows, cols=None):
+        self.A, self.rows, self.cols = A, rows, cols
+        m = A.shape[1] if cols is None else len(cols)
+        super().__init__(dtype=float, shape=(len(rows), m))
+    def _matvec(self, x):
+        x = np.ravel(x)
+        if self.cols is not None:
+            y = np.zeros(self.A.shape[1])
+            y[self.cols] = x
+            x = y
+        return self.A.dot(x)[self.rows]
+
+#=================================================================#
+class Jacobi(splinalg.LinearOperator):
+    """
+    damped Jacobi x -> omega*x/diag, solve() as for the other preconditioners
+    zero diagonal entries (e.g. pure convection without diagonal) are replaced by one
+    """
+    def __init__(self, diag, omega=1):
+        super().__init__(dtype=float, shape=(len(diag), len(diag)))
+        self.dinv = omega/np.where(diag == 0, 1, diag)
+    def _matvec(self, x):
+        return self.dinv*np.ravel(x)
+    def solve(self, b):
+        return self.dinv*b
+#=================================================================#
+class KrylovSolver(object):
+    """
+    inexact inner solver (e.g. for the velocity block of Stokes): Jacobi-preconditioned Krylov method
+    with relative tolerance tol, the outer iteration should be flexible (gcrotmk)
+    """
+    def __init__(self, A, method='cg', tol=1e-4, maxiter=None):
+        self.A, self.M, self.method, self.tol, self.maxiter = A, A.jacobi(), method, tol, maxiter
+    def solve(self, b):
+        return krylov.solve(self.method, self.A, b, self.tol, M=self.M, maxiter=self.maxiter)[0]
+# ----------------------------------------------------------------#
+def boundaryOperator(A, bdrydata, dirall, inner, dirflux, symmetric=False):
+    """
+    strong Dirichlet conditions for a FormOperator, the analogue of matrixBoundary() of the fems
+    the rows (and columns if symmetric) of the Dirichlet dofs dirall are replaced by the identity
+    """
+    for color, ind in dirflux.items():
+        bdrydata.Asaved[color] = SubOperator(A, ind)
+    bdrydata.A_inner_dir = SubOperator(A, inner, dirall)
+    return A.constrained(dirall, symmetric)
+# ----------------------------------------------------------------#
+def matrixBytes(A):
+    """
+    memory of a sparse matrix (csr, csc, bsr or coo)
+    """
+    if sparse.isspmatrix_coo(A): return A.data.nbytes + A.row.nbytes + A.col.nbytes
+    return A.data.nbytes + A.indices.nbytes + A.indptr.nbytes
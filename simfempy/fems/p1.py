@@ -8,6 +8,7 @@ import numpy as np
 import scipy.linalg as linalg
 import scipy.sparse as sparse
 from simfempy import fems, tools, meshes
+from simfempy.tools import npext
 
 #=================================================================#
 class P1(fems.fem.Fem):
@@ -53,6 +54,7 @@ class P1(fems.fem.Fem):
     def nlocal(self): return self.mesh.dimension+1
     def nunknowns(self): return self.mesh.nnodes
     def dofspercell(self): return self.mesh.simplices
+    def basisBarycentric(self, lam): return lam
     def computeCellGrads(self):
         ncells, normals, cellsOfFaces, facesOfCells, dV = self.mesh.ncells, self.mesh.normals, self.mesh.cellsOfFaces, self.mesh.facesOfCells, self.mesh.dV
         scale = -1/self.mesh.dimension
@@ -77,31 +79,10 @@ class P1(fems.fem.Fem):
             bdrydata.nodesdirflux[color] = np.unique(self.mesh.faces[facesdir].ravel())
         return bdrydata
     def matrixBoundary(self, A, bdrydata, method):
-        assert method != 'nitsche'
-        nodesdir, nodedirall, nodesinner, nodesdirflux = bdrydata.nodesdir, bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux
-        nnodes = self.mesh.nnodes
-        for color, nodes in nodesdirflux.items():
-            nb = nodes.shape[0]
-            help = sparse.dok_matrix((nb, nnodes))
-            for i in range(nb): help[i, nodes[i]] = 1
-            bdrydata.Asaved[color] = help.dot(A)
-        bdrydata.A_inner_dir = A[nodesinner, :][:, nodedirall]
-        help = np.ones((nnodes))
-        help[nodedirall] = 0
-        help = sparse.dia_matrix((help, 0), shape=(nnodes, nnodes))
-        # A = help.dot(A.dot(help))
-        diag = np.zeros((nnodes))
-        if method == 'strong':
-            diag[nodedirall] = 1.0
-            diag = sparse.dia_matrix((diag, 0), shape=(nnodes, nnodes))
-        else:
-            bdrydata.A_dir_dir = self.dirichlet_al*A[nodedirall, :][:, nodedirall]
-            diag[nodedirall] = np.sqrt(self.dirichlet_al)
-            diag = sparse.dia_matrix((diag, 0), shape=(nnodes, nnodes))
-            diag = diag.dot(A.dot(diag))
-        A = help.dot(A)
-        A += diag
-        return A
+        return self.matrixBoundaryScalar(A, bdrydata, method, bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux)
+    def operatorBoundary(self, A, bdrydata, method):
+        if method != 'strong': raise ValueError(f"matrix-free operator only with method='strong' ({method=})")
+        return fems.matrixfree.boundaryOperator(A, bdrydata, bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux)
     def vectorBoundary(self, b, bdrycond, bdrydata, method):
         assert method != 'nitsche'
         nodesdir, nodedirall, nodesinner, nodesdirflux = bdrydata.nodesdir, bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux
@@ -130,6 +111,8 @@ class P1(fems.fem.Fem):
         du[nodedirall] = u[nodedirall]
     def vectorBoundaryZero(self, du, bdrydata):
         du[bdrydata.nodedirall] = 0
+    def vectorBoundarySaved(self, b, bdrydata):
+        return {color: b[nodes] for color, nodes in bdrydata.nodesdirflux.items()}
     def formBoundary(self, du, u, bdrydata, dirichletmethod):
         assert(dirichletmethod=='new')
         nodedirall = bdrydata.nodedirall
@@ -146,15 +129,15 @@ class P1(fems.fem.Fem):
         simp, dV = self.mesh.simplices[cells], self.mesh.dV[cells]
         dS *= self.dirichlet_nitsche * coeff * diffcoff[cells] * dS / dV
         r = np.einsum('n,kl,nl->nk', dS, massloc, fp1[nodes])
-        np.add.at(b, nodes, r)
+        npext.addAt(b, nodes, r)
         cellgrads = self.cellgrads[cells, :, :dim]
         u = fp1[nodes].mean(axis=1)
         mat = np.einsum('f,fk,fik->fi', coeff*u*diffcoff[cells], normalsS, cellgrads)
-        np.add.at(b, simp, -mat)
+        npext.addAt(b, simp, -mat)
     def computeFormNitscheDiffusion(self, du, u, diffcoff, colorsdir):
         assert u.shape[0]==self.mesh.nnodes
         dim  = self.mesh.dimension
-        massloc = simfempy.tools.barycentric.tensor(d=dim - 1, k=2)
+        massloc = tools.barycentric.tensor(d=dim - 1, k=2)
         massloc = np.diag(np.sum(massloc,axis=1))
         faces = self.mesh.bdryFaces(colorsdir)
         nodes, cells, normalsS = self.mesh.faces[faces], self.mesh.cellsOfFaces[faces,0], self.mesh.normals[faces,:dim]
@@ -162,42 +145,32 @@ class P1(fems.fem.Fem):
         simp, dV = self.mesh.simplices[cells], self.mesh.dV[cells]
         dS *= self.dirichlet_nitsche * diffcoff[cells] * dS / dV
         r = np.einsum('n,kl,nl->nk', dS, massloc, u[nodes])
-        np.add.at(du, nodes, r)
+        npext.addAt(du, nodes, r)
         cellgrads = self.cellgrads[cells, :, :dim]
         um = u[nodes].mean(axis=1)
         mat = np.einsum('f,fk,fik->fi', um*diffcoff[cells], normalsS, cellgrads)
-        np.add.at(du, simp, -mat)
+        npext.addAt(du, simp, -mat)
         mat = np.einsum('f,fk,fjk,fj->f', diffcoff[cells]/dim, normalsS, cellgrads,u[simp]).repeat(dim).reshape(faces.shape[0],dim)
-        np.add.at(du, nodes, -mat)
+        npext.addAt(du, nodes, -mat)
     def computeMatrixNitscheDiffusion(self, diffcoff, colorsdir, coeff=1):
-        nnodes, ncells, dim, nlocal  = self.mesh.nnodes, self.mesh.ncells, self.mesh.dimension, self.nlocal()
+        dim, nlocal  = self.mesh.dimension, self.nlocal()
         faces = self.mesh.bdryFaces(colorsdir)
         cells = self.mesh.cellsOfFaces[faces, 0]
         normalsS = self.mesh.normals[faces, :dim]
         dS = np.linalg.norm(normalsS, axis=1)
         dV = self.mesh.dV[cells]
         cellgrads = self.cellgrads[cells, :, :dim]
-        simp = self.mesh.simplices[cells]
-        facenodes = self.mesh.faces[faces]
-        # ind = npext.positionin(facenodes, simp).astype(int)
-        # fnind = np.take_along_axis(simp,ind,axis=1)
-        # if not np.all(facenodes == fnind):
-        #     raise ValueError(f"***not found***\n{facenodes=}\n{fnind=} {ind=}")
-        cols = np.tile(simp,dim)
-        rows = facenodes.repeat(dim+1)
-        mat = np.einsum('f,fk,fjk,i->fij', coeff * diffcoff[cells]/dim, normalsS, cellgrads, np.ones(dim))
-        # mat = np.repeat(mat,dim)
-        # print(f"{cols.shape=} {rows.shape=} {mat.shape=}")
-        AN = sparse.coo_matrix((mat.ravel(), (rows.ravel(), cols.ravel())), shape=(nnodes, nnodes)).tocsr()
+        # local positions of the nodes of the faces: all entries are in the cell stencil
+        ind = npext.positionin(self.mesh.faces[faces], self.mesh.simplices[cells])
+        c, i, j = cells[:, np.newaxis, np.newaxis], ind[:, :, np.newaxis], np.arange(nlocal)
+        mat = np.einsum('f,fk,fjk->fj', coeff * diffcoff[cells]/dim, normalsS, cellgrads)
+        mat = np.broadcast_to(-mat[:, np.newaxis, :], (len(faces), dim, nlocal))
         massloc = tools.barycentric.tensor(d=dim-1, k=2)
-        massloc = np.diag(np.sum(massloc,axis=1))
-        # print(f"{massloc=}")
-        mat = np.einsum('f,ij->fij', coeff * dS**2/dV*diffcoff[cells], massloc)
-        # mat = np.repeat(coeff * diffcoff[cells]/dS, dim)
-        rows = np.repeat(facenodes,dim)
-        cols = np.tile(facenodes,dim)
-        AD = sparse.coo_matrix((mat.ravel(), (rows.ravel(), cols.ravel())), shape=(nnodes, nnodes)).tocsr()
-        return  - AN - AN.T + self.dirichlet_nitsche * AD
+        massloc = np.sum(massloc,axis=1)
+        matD = np.einsum('f,i->fi', self.dirichlet_nitsche * coeff * dS**2/dV*diffcoff[cells], massloc)
+        pos = np.concatenate((self.cellEntries(c, i, j).ravel(), self.cellEntries(c, j, i).ravel(), self.cellEntries(c[:, 0], ind, ind).ravel()))
+        data = np.bincount(pos, weights=np.concatenate((mat.ravel(), mat.ravel(), matD.ravel())), minlength=self.stencil.nnz)
+        return self.stencil.csr(data)
     def computeBdryNormalFluxNitsche(self, u, colors, udir, diffcoff):
         flux= np.zeros(len(colors))
         nnodes, dim  = self.mesh.nnodes, self.mesh.dimension
@@ -252,9 +225,9 @@ class P1(fems.fem.Fem):
             mass = coeff/(dim+1)*dV.repeat(dim+1)
             rows = self.mesh.simplices.ravel()
             return sparse.coo_matrix((mass, (rows, rows)), shape=(nnodes, nnodes)).tocsr()
-        massloc = barycentric.tensor(d=dim, k=2)
-        mass = np.einsum('n,kl->nkl', coeff*dV, massloc).ravel()
-        return sparse.coo_matrix((mass, (self.rows, self.cols)), shape=(nnodes, nnodes)).tocsr()
+        massloc = tools.barycentric.tensor(d=dim, k=2)
+        local = self.localmatrices.get('mass', lambda: np.einsum('n,kl->nkl', dV, massloc))
+        return self.stencil.csr(fems.kernels.scatterScaled(self.stencil, local, coeff))
     def computeBdryMassMatrix(self, colors=None, coeff=1, lumped=False):
         nnodes = self.mesh.nnodes
         rows = np.empty(shape=(0), dtype=int)
@@ -368,17 +341,22 @@ class P1(fems.fem.Fem):
         return A
     def computeMatrixTransportCellWise(self, data, type):
         nnodes, ncells, nfaces, dim = self.mesh.nnodes, self.mesh.ncells, self.mesh.nfaces, self.mesh.dimension
-        if type=='centered':
-            beta, mus = data.beta, np.full(dim+1,1.0/(dim+1))
-            mat = np.einsum('n,njk,nk,i -> nij', self.mesh.dV, self.cellgrads[:,:,:dim], beta, mus)
-            A =  sparse.coo_matrix((mat.ravel(), (self.rows, self.cols)), shape=(nnodes, nnodes)).tocsr()
-        elif type=='supg':
-            beta, mus = data.beta, data.md.mus
-            mat = np.einsum('n,njk,nk,ni -> nij', self.mesh.dV, self.cellgrads[:,:,:dim], beta, mus)
-            A =  sparse.coo_matrix((mat.ravel(), (self.rows, self.cols)), shape=(nnodes, nnodes)).tocsr()
+        if type=='centered': mus = np.full(dim+1,1.0/(dim+1))
+        elif type=='supg': mus = data.md.mus
         else: raise ValueError(f"unknown type {type=}")
+        A = self.stencil.csr(fems.kernels.transport(self.stencil, self.cellgrads[:,:,:dim], data.beta, self.mesh.dV, mus))
         A -= self.computeBdryMassMatrix(coeff=np.minimum(data.betart, 0), lumped=True)
         return A
+    def computeFormTransportCellWise(self, du, u, data, type):
+        dim, simplices = self.mesh.dimension, self.mesh.simplices
+        if type=='centered': mus = np.full(dim+1,1.0/(dim+1))
+        elif type=='supg': mus = data.md.mus
+        else: raise ValueError(f"unknown type {type=}")
+        betagrad = np.einsum('n,njk,nk,nj -> n', self.mesh.dV, self.cellgrads[:,:,:dim], data.beta, u[simplices])
+        npext.addAt(du, simplices, betagrad[:,np.newaxis]*mus)
+        self.massDotBoundary(du, u, coeff=-np.minimum(data.betart, 0), lumped=True)
+    def computeFormTransportSupg(self, du, u, data, method):
+        self.computeFormTransportCellWise(du, u, data, type='supg')
     def computeMassMatrixSupg(self, xd, data, coeff=1):
         dim, dV, nnodes, xK = self.mesh.dimension, self.mesh.dV, self.mesh.nnodes, self.mesh.pointsc
         massloc = tools.barycentric.tensor(d=dim, k=2)
@@ -387,7 +365,7 @@ class P1(fems.fem.Fem):
         # marche si xd = xK + delta*betaC
         # mass += np.einsum('n,nik,nk,j -> nij', coeff*delta*dV, self.cellgrads[:,:,:dim], betaC, massloc)
         mass += np.einsum('n,nik,nk,j -> nij', coeff*dV, self.cellgrads[:,:,:dim], xd[:,:dim]-xK[:,:dim], massloc)
-        return sparse.coo_matrix((mass.ravel(), (self.rows, self.cols)), shape=(nnodes, nnodes)).tocsr()
+        return self.stencil.matrix(mass)
     # dotmat
     def formDiffusion(self, du, u, coeff):
         graduh = np.einsum('nij,ni->nj', self.cellgrads, u[self.mesh.simplices])
@@ -399,18 +377,24 @@ class P1(fems.fem.Fem):
         assert f.shape[0] == self.mesh.ncells
         dimension, simplices, dV = self.mesh.dimension, self.mesh.simplices, self.mesh.dV
         massloc = 1/(dimension+1)
-        np.add.at(b, simplices, (massloc*coeff*dV*f)[:, np.newaxis])
+        npext.addAt(b, simplices, (massloc*coeff*dV*f)[:, np.newaxis])
         return b
     def massDot(self, b, f, coeff=1):
         dim, simplices, dV = self.mesh.dimension, self.mesh.simplices, self.mesh.dV
         massloc = tools.barycentric.tensor(d=dim, k=2)
-        r = np.einsum('n,kl,nl->nk', coeff * dV, massloc, f[simplices])
-        np.add.at(b, simplices, r)
+        r = np.einsum('n,kl,nl...->nk...', coeff * dV, massloc, f[simplices])
+        npext.addAt(b, simplices, r)
         return b
+    def diagonalMass(self, coeff=1):
+        dim, simplices, dV = self.mesh.dimension, self.mesh.simplices, self.mesh.dV
+        massloc = tools.barycentric.tensor(d=dim, k=2)
+        d = np.zeros(self.mesh.nnodes)
+        npext.addAt(d, simplices, np.einsum('n,k->nk', coeff*dV, np.diag(massloc)))
+        return d
     def massDotSupg(self, b, f, data, coeff=1):
         dim, simplices, dV = self.mesh.dimension, self.mesh.simplices, self.mesh.dV
-        r = np.einsum('n,nk,n->nk', coeff*dV, data.md.mus-1/(dim+1), f[simplices].mean(axis=1))
-        np.add.at(b, simplices, r)
+        r = np.einsum('n,nk,n...->nk...', coeff*dV, data.md.mus-1/(dim+1), f[simplices].mean(axis=1))
+        npext.addAt(b, simplices, r)
         return b
     def massDotBoundary(self, b, f, colors=None, coeff=1, lumped=True):
         if colors is None: colors = self.mesh.bdrylabels.keys()
@@ -426,11 +410,11 @@ class P1(fems.fem.Fem):
                 dS *= coeff[faces]
             # print(f"{scalemass=}")
             if lumped:
-                np.add.at(b, nodes, f[nodes]*dS[:,np.newaxis]/self.mesh.dimension)
+                npext.addAt(b, nodes, f[nodes]*dS[:,np.newaxis]/self.mesh.dimension)
             else:
                 massloc = tools.barycentric.tensor(d=self.mesh.dimension-1, k=2)
                 r = np.einsum('n,kl,nl->nk', dS, massloc, f[nodes])
-                np.add.at(b, nodes, r)
+                npext.addAt(b, nodes, r)
         return b
     # rhs
     def computeRhsMass(self, b, rhs, mass):
@@ -447,7 +431,7 @@ class P1(fems.fem.Fem):
             xc, yc, zc = self.mesh.pointsc[cells].T
             bC = scale * fct(xc, yc, zc) * self.mesh.dV[cells]
             # print("bC", bC)
-            np.add.at(b, self.mesh.simplices[cells].T, bC)
+            npext.addAt(b, self.mesh.simplices[cells].T, bC)
         return b
     def computeRhsPoint(self, b, rhspoint):
         if rhspoint is None: return b
@@ -471,7 +455,7 @@ class P1(fems.fem.Fem):
             xf, yf, zf = self.mesh.pointsf[faces].T
             nx, ny, nz = normalsS.T
             bS = scale * bdryfct[color](xf, yf, zf, nx, ny, nz) * dS
-            np.add.at(b, self.mesh.faces[faces].T, bS)
+            npext.addAt(b, self.mesh.faces[faces].T, bS)
         return b
     def computeRhsBoundaryMass(self, b, bdrycond, types, mass):
         normals =  self.mesh.normals
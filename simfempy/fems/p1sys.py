@@ -8,45 +8,20 @@ Created on Sun Dec  4 18:14:29 2016
 import numpy as np
 import scipy.linalg as linalg
 import scipy.sparse as sparse
-from simfempy.fems import femsys, p1
+from simfempy.fems import femsys, p1, kernels, matrixfree
+from simfempy.tools import npext
 
 #=================================================================#
 class P1sys(femsys.Femsys):
     def __init__(self, ncomp, mesh=None):
         super().__init__(p1.P1(mesh=mesh), ncomp, mesh)
     def matrixBoundary(self, A, bdrydata, method):
-        nnodes, ncomp = self.mesh.nnodes, self.ncomp
-        nodesdir, nodedirall, nodesinner, nodesdirflux = bdrydata.nodesdir, bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux
-        for key, nodes in nodesdirflux.items():
-            nb = nodes.shape[0]
-            help = sparse.dok_matrix((ncomp *nb, ncomp * nnodes))
-            for icomp in range(ncomp):
-                for i in range(nb): help[icomp + ncomp * i, icomp + ncomp * nodes[i]] = 1
-            bdrydata.Asaved[key] = help.dot(A)
-        indin = np.repeat(ncomp * nodesinner, ncomp)
-        for icomp in range(ncomp): indin[icomp::ncomp] += icomp
-        inddir = np.repeat(ncomp * nodedirall, ncomp)
-        for icomp in range(ncomp): inddir[icomp::ncomp] += icomp
-        bdrydata.A_inner_dir = A[indin, :][:, inddir]
-        if method == 'strong':
-            help = np.ones((ncomp * nnodes))
-            help[inddir] = 0
-            help = sparse.dia_matrix((help, 0), shape=(ncomp * nnodes, ncomp * nnodes))
-            A = help.dot(A.dot(help))
-            help = np.zeros((ncomp * nnodes))
-            help[inddir] = 1.0
-            help = sparse.dia_matrix((help, 0), shape=(ncomp * nnodes, ncomp * nnodes))
-            A += help
-        else:
-            bdrydata.A_dir_dir = A[inddir, :][:, inddir]
-            help = np.ones((ncomp * nnodes))
-            help[inddir] = 0
-            help = sparse.dia_matrix((help, 0), shape=(ncomp * nnodes, ncomp * nnodes))
-            help2 = np.zeros((ncomp * nnodes))
-            help2[inddir] = 1
-            help2 = sparse.dia_matrix((help2, 0), shape=(ncomp * nnodes, ncomp * nnodes))
-            A = help.dot(A.dot(help)) + help2.dot(A.dot(help2))
-        return A
+        return self.matrixBoundarySystem(A, bdrydata, method, bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux)
+    def operatorBoundary(self, A, bdrydata, method):
+        if method != 'strong': raise ValueError(f"matrix-free operator only with method='strong' ({method=})")
+        dirflux = {key: self.systemIndices(nodes) for key, nodes in bdrydata.nodesdirflux.items()}
+        inddir, indin = self.systemIndices(bdrydata.nodedirall), self.systemIndices(bdrydata.nodesinner)
+        return matrixfree.boundaryOperator(A, bdrydata, inddir, indin, dirflux, symmetric=True)
     def vectorBoundary(self, b, bdryfct, bdrydata, method):
         x, y, z = self.mesh.points.T
         nnodes, ncomp = self.mesh.nnodes, self.ncomp
@@ -112,18 +87,10 @@ class P1sys(femsys.Femsys):
             for i in range(self.ncomp):
                 bS = scale * dS * neumanns[i]
                 indices = i + self.ncomp * self.mesh.faces[faces]
-                np.add.at(b, indices.T, bS)
+                npext.addAt(b, indices.T, bS)
         return b
     def computeMatrixElasticity(self, mucell, lamcell):
-        nnodes, ncells, ncomp, dV = self.mesh.nnodes, self.mesh.ncells, self.ncomp, self.mesh.dV
-        nloc, rows, cols, cellgrads = self.fem.nloc, self.rowssys, self.colssys, self.fem.cellgrads
-        mat = np.zeros(shape=rows.shape, dtype=float).reshape(ncells, ncomp * nloc, ncomp * nloc)
-        for i in range(ncomp):
-            for j in range(self.ncomp):
-                mat[:, i::ncomp, j::ncomp] += (np.einsum('nk,nl->nkl', cellgrads[:, :, i], cellgrads[:, :, j]).T * dV * lamcell).T
-                mat[:, i::ncomp, j::ncomp] += (np.einsum('nk,nl->nkl', cellgrads[:, :, j], cellgrads[:, :, i]).T * dV * mucell).T
-                mat[:, i::ncomp, i::ncomp] += (np.einsum('nk,nl->nkl', cellgrads[:, :, j], cellgrads[:, :, j]).T * dV * mucell).T
-        A = sparse.coo_matrix((mat.ravel(), (rows, cols)), shape=(ncomp*nnodes, ncomp*nnodes)).tocsr()
+        A = self.stencilsys.bsr(kernels.scatterScaled(self.stencilsys, self.localElasticity(), [lamcell, mucell]))
         return A
     def computeBdryNormalFlux(self, u, colors, bdrydata):
         flux, omega = np.zeros(shape=(len(colors),self.ncomp)), np.zeros(len(colors))
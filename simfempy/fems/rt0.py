@@ -9,6 +9,7 @@ import numpy as np
 import scipy.linalg as linalg
 import scipy.sparse as sparse
 from simfempy import fems
+from simfempy.tools import npext
 
 #=================================================================#
 class RT0(fems.fem.Fem):
@@ -257,7 +258,7 @@ class RT0(fems.fem.Fem):
         cols = np.repeat(dim*np.arange(ncells),dim*(dim+1)).reshape(ncells * (dim+1), dim) + np.arange(dim)
         mat = np.einsum("nij, n -> nij", xdiff, diffinv)
         A = sparse.coo_matrix((mat.reshape(-1), (rows.reshape(-1), cols.reshape(-1))), shape=(nnodes, dim*ncells)).tocsr()
-        np.add.at(pn2, self.mesh.simplices.T, p)
+        npext.addAt(pn2, self.mesh.simplices.T, p)
         pn2 += A*vc
         pn2 /= counts
         return pn2
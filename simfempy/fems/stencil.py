@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+"""
+import os, weakref, collections
+import numpy as np
+import scipy.sparse as sparse
+
+#=================================================================#
+class CsrStencil(object):
+    """
+    csr pattern of the entries (rows[k], cols[k]) computed once:
+    indptr, indices: shared by all matrices assembled with matrix()
+    scatter[k]: position of the k-th local entry in the data array
+    """
+    def __repr__(self):
+        return f"CsrStencil({self.shape=} {self.nnz=} {len(self.scatter)=})"
+    def __init__(self, rows, cols, n, m=None):
+        if m is None: m = n
+        self.shape = (n, m)
+        keys, self.scatter = np.unique(np.asarray(rows, dtype=np.int64)*m + cols, return_inverse=True)
+        self.nnz = len(keys)
+        itype = np.int32 if max(self.nnz, n, m) < np.iinfo(np.int32).max else np.int64
+        self.scatter = self.scatter.astype(itype)
+        self.indices = (keys % m).astype(itype)
+        self.indptr = np.zeros(n+1, dtype=itype)
+        np.cumsum(np.bincount(keys // m, minlength=n), out=self.indptr[1:])
+    def data(self, values):
+        """
+        sums the local values into the csr data array
+        """
+        return np.bincount(self.scatter, weights=np.ravel(values), minlength=self.nnz)
+    def matrix(self, values):
+        return self.csr(self.data(values))
+    def csr(self, data):
+        """
+        the csr matrix of the data array (e.g. computed by the fems.kernels)
+        """
+        A = sparse.csr_matrix((data, self.indices, self.indptr), shape=self.shape)
+        A.has_sorted_indices = True
+        return A
+
+#=================================================================#
+class BsrStencil(object):
+    """
+    bsr pattern of a system with blocks of size blocksize on the pattern of a scalar CsrStencil
+    (the local entries are ordered (cell, i, j, icomp, jcomp), the dof icomp of the scalar dof i is ncomp*i+icomp)
+    scatter[k]: position of the k-th local entry in the data array
+    """
+    def __repr__(self):
+        return f"BsrStencil({self.shape=} {self.blocksize=} {self.nnz=})"
+    def __init__(self, stencil, blocksize):
+        self.blocksize, nb = blocksize, blocksize[0]*blocksize[1]
+        self.shape = (stencil.shape[0]*blocksize[0], stencil.shape[1]*blocksize[1])
+        self.nnz = stencil.nnz*nb
+        itype = np.int32 if self.nnz < np.iinfo(np.int32).max else np.int64
+        self.scatter = (nb*stencil.scatter.astype(itype)[:, np.newaxis] + np.arange(nb, dtype=itype)).ravel()
+        self.indices, self.indptr = stencil.indices, stencil.indptr
+    def data(self, values):
+        return np.bincount(self.scatter, weights=np.ravel(values), minlength=self.nnz)
+    def matrix(self, values):
+        return self.bsr(self.data(values))
+    def bsr(self, data):
+        """
+        the bsr matrix of the data array (e.g. computed by the fems.kernels)
+        """
+        A = sparse.bsr_matrix((data.reshape(-1, *self.blocksize), self.indices, self.indptr), shape=self.shape)
+        A.has_sorted_indices = True
+        return A
+
+#=================================================================#
+class FaceStencil(object):
+    """
+    csr pattern of the couplings over the interior faces (the dofs of the two cells ci[f]) united with a cell stencil, computed once:
+    the local face entries are ordered (face, a, b, i, j): row dofspercell[ci[f,a],i], column dofspercell[ci[f,b],j]
+    scatter[k]: position of the k-th local face entry in the data array
+    cellmap[k]: position of the k-th entry of the data array of the cell stencil
+    """
+    def __repr__(self):
+        return f"FaceStencil({self.shape=} {self.nnz=} {len(self.scatter)=})"
+    def __init__(self, cellstencil, dofspercell, ci):
+        n, nloc = cellstencil.shape[0], dofspercell.shape[1]
+        dofs = dofspercell[ci]
+        shape = (ci.shape[0], 2, 2, nloc, nloc)
+        rows = np.broadcast_to(dofs[:, :, np.newaxis, :, np.newaxis], shape).ravel()
+        cols = np.broadcast_to(dofs[:, np.newaxis, :, np.newaxis, :], shape).ravel()
+        cellrows = np.repeat(np.arange(n), np.diff(cellstencil.indptr))
+        union = CsrStencil(np.concatenate((rows, cellrows)), np.concatenate((cols, cellstencil.indices)), n)
+        self.shape, self.nnz, self.indices, self.indptr = union.shape, union.nnz, union.indices, union.indptr
+        self.scatter, self.cellmap = union.scatter[:len(rows)], union.scatter[len(rows):]
+    def data(self, values):
+        return np.bincount(self.scatter, weights=np.ravel(values), minlength=self.nnz)
+    def csr(self, data, celldata=None):
+        """
+        the csr matrix of the data array, celldata: data array of the cell stencil added in place
+        """
+        if celldata is not None: data[self.cellmap] += celldata
+        A = sparse.csr_matrix((data, self.indices, self.indptr), shape=self.shape)
+        A.has_sorted_indices = True
+        return A
+    def bsr(self, data, ncomp, celldata=None):
+        """
+        the bsr matrix with the blocks data*Id(ncomp), celldata: data array of the cell stencil.BsrStencil added in place
+        """
+        data = data[:, np.newaxis, np.newaxis]*np.eye(ncomp)
+        if celldata is not None: data[self.cellmap] += celldata.reshape(-1, ncomp, ncomp)
+        A = sparse.bsr_matrix((data, self.indices, self.indptr), shape=(ncomp*self.shape[0], ncomp*self.shape[1]))
+        A.has_sorted_indices = True
+        return A
+
+#=================================================================#
+def entries(M):
+    """
+    rows and columns of the entries of the csr, csc or bsr matrix M in the order of M.data
+    """
+    if sparse.isspmatrix_csr(M):
+        return np.repeat(np.arange(M.shape[0]), np.diff(M.indptr)), M.indices
+    if sparse.isspmatrix_csc(M):
+        return M.indices, np.repeat(np.arange(M.shape[1]), np.diff(M.indptr))
+    if sparse.isspmatrix_bsr(M):
+        (R, C), shape = M.blocksize, M.data.shape
+        rows = R*np.repeat(np.arange(M.shape[0]//R), np.diff(M.indptr))
+        rows = np.broadcast_to(rows[:, np.newaxis, np.newaxis] + np.arange(R)[:, np.newaxis], shape)
+        cols = np.broadcast_to(C*M.indices[:, np.newaxis, np.newaxis] + np.arange(C), shape)
+        return rows.ravel(), cols.ravel()
+    raise ValueError(f"need csr, csc or bsr matrix ({type(M)=})")
+def samePattern(M, pattern):
+    """
+    pattern: (format, shape, blocksize, indices, indptr) of a matrix
+    """
+    format, shape, blocksize, indices, indptr = pattern
+    if M.format != format or M.shape != shape or getattr(M, 'blocksize', None) != blocksize: return False
+    if len(M.indices) != len(indices): return False
+    if M.indices is indices and M.indptr is indptr: return True
+    return np.array_equal(M.indptr, indptr) and np.array_equal(M.indices, indices)
+
+#=================================================================#
+class SubStencil(object):
+    """
+    the sub-matrix A[rows][:, cols] (cols=None: all columns) of the matrices on a csr (bsr) pattern, computed once
+    shape: in blocks for bsr
+    pos[k]: position in the data array of A of the k-th entry of the sub-matrix
+    """
+    def __repr__(self):
+        return f"SubStencil({self.shape=} {len(self.pos)=})"
+    def __init__(self, indices, indptr, shape, rows, cols=None):
+        rows = np.asarray(rows)
+        lengths = indptr[rows+1] - indptr[rows]
+        pos = np.repeat(indptr[rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        subrows = np.repeat(np.arange(len(rows)), lengths)
+        if cols is None:
+            subcols, ncols = indices[pos], shape[1]
+        else:
+            colpos = np.full(shape[1], -1)
+            colpos[cols] = np.arange(len(cols))
+            subcols = colpos[indices[pos]]
+            keep = subcols >= 0
+            pos, subrows, subcols, ncols = pos[keep], subrows[keep], subcols[keep], len(cols)
+        self.shape, self.pos, self.indices = (len(rows), ncols), pos, subcols
+        self.indptr = np.zeros(len(rows)+1, dtype=indptr.dtype)
+        np.cumsum(np.bincount(subrows, minlength=len(rows)), out=self.indptr[1:])
+    def matrix(self, A):
+        data = A.data[self.pos]
+        if data.ndim == 1: return sparse.csr_matrix((data, self.indices, self.indptr), shape=self.shape)
+        shape = (self.shape[0]*data.shape[1], self.shape[1]*data.shape[2])
+        return sparse.bsr_matrix((data, self.indices, self.indptr), shape=shape)
+
+#=================================================================#
+class DirichletStencil(object):
+    """
+    Dirichlet conditions for the matrices on a csr (bsr) pattern, computed once per pattern (see fits())
+    only the data arrays are computed: no products with diagonal matrices
+    inner_dir, dir_dir, flux[color]: SubStencil of A[inner][:, dirall], A[dirall][:, dirall] and A[dirflux[color]]
+    """
+    def __repr__(self):
+        return f"DirichletStencil({self.shape=} {self.blocksize=} {list(self.patterns.keys())})"
+    def __init__(self, A, dirall, inner, dirflux):
+        self.blocksize = A.blocksize if sparse.isspmatrix_bsr(A) else (1, 1)
+        self.shape, self.indices, self.indptr = A.shape, A.indices, A.indptr
+        self.pattern = (A.format, A.shape, getattr(A, 'blocksize', None), A.indices, A.indptr)
+        shape = (A.shape[0]//self.blocksize[0], A.shape[1]//self.blocksize[1])
+        rows = np.repeat(np.arange(shape[0]), np.diff(A.indptr))
+        isdir = np.zeros(shape[1], dtype=bool)
+        isdir[dirall] = True
+        self.rowdir, self.coldir, self.diagonal = isdir[rows], isdir[A.indices], rows == A.indices
+        self.inner_dir = SubStencil(A.indices, A.indptr, shape, inner, dirall)
+        self.dir_dir = SubStencil(A.indices, A.indptr, shape, dirall, dirall)
+        self.flux = {color: SubStencil(A.indices, A.indptr, shape, ind) for color, ind in dirflux.items()}
+        self.patterns = {}
+    def fits(self, A):
+        """
+        True if A has the pattern of the stencil
+        """
+        return samePattern(A, self.pattern)
+    def matrix(self, A, method, symmetric=False, scale=1):
+        """
+        A with Dirichlet conditions on the reduced pattern (computed on first use for each method, shared by the results)
+        strong: the rows of dirall are replaced by the identity
+        otherwise: the rows of dirall only keep their couplings to dirall, multiplied by scale
+        symmetric: the couplings of the inner dofs to dirall are removed as well
+        """
+        key = (method=='strong', symmetric)
+        if key not in self.patterns:
+            if method == 'strong':
+                keep = ~self.rowdir | self.diagonal
+                if symmetric: keep &= ~self.coldir | self.diagonal
+            else:
+                keep = ~self.rowdir | self.coldir
+                if symmetric: keep &= self.rowdir | ~self.coldir
+            pos = np.flatnonzero(keep)
+            indptr = np.concatenate(([0], np.cumsum(keep)))[self.indptr].astype(self.indptr.dtype)
+            dirpos = np.flatnonzero((self.rowdir & self.diagonal if method == 'strong' else self.rowdir & self.coldir)[pos])
+            self.patterns[key] = pos, self.indices[pos], indptr, dirpos
+        pos, indices, indptr, dirpos = self.patterns[key]
+        data = A.data[pos]
+        if method == 'strong': data[dirpos] = 1 if data.ndim == 1 else np.eye(*data.shape[1:])
+        elif scale != 1: data[dirpos] *= scale
+        if data.ndim == 1: A = sparse.csr_matrix((data, indices, indptr), shape=self.shape)
+        else: A = sparse.bsr_matrix((data, indices, indptr), shape=self.shape)
+        A.has_sorted_indices = True
+        return A
+
+#=================================================================#
+class BlockStencil(object):
+    """
+    csr (csc) pattern of the block matrix of the sparse matrices blocks[i][j] (None: zero block), computed once
+    matrix() only sums the data arrays of the blocks, they must have the patterns of the construction (see fits())
+    (transposed blocks: e.g. B.T of a csr matrix B is a csc matrix with the data of B)
+    """
+    def __repr__(self):
+        return f"BlockStencil({self.shape=} {self.format=} {self.stencil.nnz=})"
+    def __init__(self, blocks, format='csr'):
+        if format not in ['csr', 'csc']: raise ValueError(f"unknown {format=}")
+        nrows = [next(M.shape[0] for M in row if M is not None) for row in blocks]
+        ncols = [next(row[j].shape[1] for row in blocks if row[j] is not None) for j in range(len(blocks[0]))]
+        roffset, coffset = np.cumsum([0]+nrows), np.cumsum([0]+ncols)
+        self.shape, self.format = (roffset[-1], coffset[-1]), format
+        rows, cols, self.patterns = [], [], []
+        for i, row in enumerate(blocks):
+            for j, M in enumerate(row):
+                if M is None: continue
+                if M.shape != (nrows[i], ncols[j]): raise ValueError(f"block {i=} {j=}: {M.shape=} {nrows[i]=} {ncols[j]=}")
+                r, c = entries(M)
+                rows.append(roffset[i]+r)
+                cols.append(coffset[j]+c)
+                self.patterns.append((M.format, M.shape, getattr(M, 'blocksize', None), M.indices, M.indptr))
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        if format == 'csr': self.stencil = CsrStencil(rows, cols, *self.shape)
+        else: self.stencil = CsrStencil(cols, rows, self.shape[1], self.shape[0])
+    def fits(self, blocks):
+        """
+        True if the blocks have the patterns of the stencil
+        """
+        blocks = [M for row in blocks for M in row if M is not None]
+        return len(blocks) == len(self.patterns) and all(samePattern(M, p) for M, p in zip(blocks, self.patterns))
+    def matrix(self, blocks):
+        data = self.stencil.data(np.concatenate([M.data.ravel() for row in blocks for M in row if M is not None]))
+        if self.format == 'csr': return self.stencil.csr(data)
+        A = sparse.csc_matrix((data, self.stencil.indices, self.stencil.indptr), shape=self.shape)
+        A.has_sorted_indices = True
+        return A
+
+#=================================================================#
+class LocalMatrixCache(object):
+    """
+    coefficient-independent local matrices (ncells, nloc, nloc), computed once per mesh (one instance per fem)
+    maxbytes is shared by all instances: if exceeded, the least recently used entries (of any instance) are dropped,
+    a matrix larger than maxbytes is not stored
+    it is set by setLocalMatrixCacheSize() or the environment variable SIMFEMPY_LOCALMATRIXCACHE (in MB)
+    """
+    maxbytes = int(float(os.environ.get('SIMFEMPY_LOCALMATRIXCACHE', 512))*2**20)
+    # entries of all instances, least recently used first: (id(instance), name) -> (weakref(instance), nbytes)
+    entries = collections.OrderedDict()
+    def __repr__(self):
+        return f"LocalMatrixCache({list(self.data.keys())} {self.nbytes()/2**20:.1f}MB, all: {self.totalbytes()/2**20:.1f}MB/{self.maxbytes/2**20:.1f}MB)"
+    def __init__(self):
+        self.data = {}
+        weakref.finalize(self, LocalMatrixCache._forget, id(self))
+    @classmethod
+    def totalbytes(cls):
+        return sum(nbytes for ref, nbytes in cls.entries.values())
+    @classmethod
+    def evict(cls, nbytes=0):
+        """
+        drops the least recently used entries until nbytes more fit into maxbytes
+        """
+        total = cls.totalbytes()
+        while len(cls.entries) and total + nbytes > cls.maxbytes:
+            (key, name), (ref, n) = cls.entries.popitem(last=False)
+            cache = ref()
+            if cache is not None: del cache.data[name]
+            total -= n
+    @classmethod
+    def _forget(cls, key):
+        for k in [k for k in cls.entries if k[0] == key]: del cls.entries[k]
+    def nbytes(self):
+        return sum(a.nbytes for a in self.data.values())
+    def get(self, name, compute):
+        """
+        returns data[name], compute() is called if it is not stored
+        """
+        if name in self.data:
+            self.entries.move_to_end((id(self), name))
+            return self.data[name]
+        a = compute()
+        if a.nbytes > self.maxbytes: return a
+        self.evict(a.nbytes)
+        self.data[name] = a
+        self.entries[id(self), name] = weakref.ref(self), a.nbytes
+        return a
+    def clear(self):
+        self._forget(id(self))
+        self.data = {}
+
+# ---------------------------------------------------------------- #
+def setLocalMatrixCacheSize(maxbytes):
+    """
+    memory budget (bytes) of all LocalMatrixCaches, entries are dropped at once if needed
+    """
+    LocalMatrixCache.maxbytes = maxbytes
+    LocalMatrixCache.evict()
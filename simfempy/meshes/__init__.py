@@ -1,3 +1,3 @@
 
-from . import simplexmesh, plotmesh, testmeshes
+from . import simplexmesh, plotmesh, testmeshes, topology, meshcache, adjacency, refine, ordering, locate
 
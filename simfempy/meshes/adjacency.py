@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: becker
+
+adjacency graphs of a simplicial mesh in csr form, built from index arrays
+(SimplexMesh caches them: nodeToCells, faceToCells, cellToCells, nodeToNodes)
+"""
+import numpy as np
+from scipy import sparse
+
+#=================================================================#
+def csrFromPairs(rows, cols, shape, unique=False):
+    """
+    csr graph with entries (rows[k], cols[k]), column indices sorted in each row, data=1
+    unique: remove duplicate pairs
+    """
+    rows, cols = np.asarray(rows).ravel(), np.asarray(cols).ravel()
+    if unique:
+        keys = np.unique(rows.astype(np.int64)*shape[1] + cols)
+        rows, cols = keys // shape[1], keys % shape[1]
+    else:
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+    indptr = np.zeros(shape[0]+1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+    idx_dtype = np.int32 if max(shape[1], len(cols)) < np.iinfo(np.int32).max else np.int64
+    data = np.ones(len(cols), dtype=np.int8)
+    return sparse.csr_matrix((data, cols.astype(idx_dtype), indptr.astype(idx_dtype)), shape=shape)
+# ----------------------------------------------------------------#
+def nodeToCells(simplices, nnodes):
+    ncells, nnpc = simplices.shape
+    return csrFromPairs(simplices, np.repeat(np.arange(ncells), nnpc), (nnodes, ncells))
+# ----------------------------------------------------------------#
+def faceToCells(cellsOfFaces, ncells):
+    nfaces = cellsOfFaces.shape[0]
+    faces = np.repeat(np.arange(nfaces), 2)
+    cells = cellsOfFaces.ravel()
+    return csrFromPairs(faces[cells>=0], cells[cells>=0], (nfaces, ncells))
+# ----------------------------------------------------------------#
+def cellToCells(cellsOfFaces, ncells):
+    """
+    neighbours through interior faces
+    """
+    ci = cellsOfFaces[cellsOfFaces[:,1]>=0]
+    return csrFromPairs(np.concatenate((ci[:,0], ci[:,1])), np.concatenate((ci[:,1], ci[:,0])), (ncells, ncells))
+# ----------------------------------------------------------------#
+def nodeToNodes(simplices, nnodes):
+    """
+    nodes sharing a simplex (without the node itself)
+    """
+    nnpc = simplices.shape[1]
+    rows = np.repeat(simplices, nnpc, axis=1)
+    cols = np.tile(simplices, nnpc)
+    mask = rows != cols
+    return csrFromPairs(rows[mask], cols[mask], (nnodes, nnodes), unique=True)
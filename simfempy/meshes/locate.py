@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+
+point location in simplicial meshes: start cells from a bucket grid (filled with a k-d tree of the barycenters)
+and walk through the neighbours
+"""
+import numpy as np
+from scipy import spatial
+
+#=================================================================#
+class PointLocator(object):
+    """
+    built once per mesh (SimplexMesh.locator), locate(points) is vectorized over the points
+    bary: affine maps x -> barycentric coordinates of shape (ncells, dim+1, dim+1)
+    neighbours[i,ii]: the cell behind the face of cell i opposite to node ii (-1 on the boundary)
+    """
+    def __repr__(self):
+        return f"PointLocator({self.dim=} {self.ncells=})"
+    def __init__(self, mesh, tol=1e-10, maxwalk=100, ncandidates=16):
+        self.dim, self.ncells = mesh.dimension, mesh.ncells
+        self.tol, self.maxwalk, self.ncandidates = tol, maxwalk, ncandidates
+        d = self.dim
+        M = np.ones(shape=(self.ncells, d+1, d+1))
+        M[:, :d, :] = mesh.points[mesh.simplices][:, :, :d].swapaxes(1, 2)
+        self.bary = np.linalg.inv(M)
+        cof = mesh.cellsOfFaces[mesh.facesOfCells]
+        cells = np.arange(self.ncells)[:, np.newaxis]
+        self.neighbours = np.where(cof[:, :, 0] == cells, cof[:, :, 1], cof[:, :, 0])
+        self.tree = spatial.cKDTree(mesh.points[mesh.simplices].mean(axis=1)[:, :d])
+        # start cells: uniform grid of about ncells buckets, each with the cell of the nearest barycenter
+        self.xmin, xmax = mesh.points[:, :d].min(axis=0), mesh.points[:, :d].max(axis=0)
+        h = max(np.prod(xmax-self.xmin)/self.ncells, np.finfo(float).tiny)**(1/d)
+        self.h = h
+        self.nbuckets = np.maximum(np.ceil((xmax-self.xmin)/h).astype(int), 1)
+        centers = np.meshgrid(*[self.xmin[i] + h*(np.arange(self.nbuckets[i])+0.5) for i in range(d)], indexing='ij')
+        self.start = self.tree.query(np.stack([c.ravel() for c in centers], axis=1))[1]
+    def barycentric(self, cells, x):
+        return np.einsum('nij,nj->ni', self.bary[cells, :, :-1], x) + self.bary[cells, :, -1]
+    def locate(self, points):
+        """
+        points of shape (n, k) (only the first dim coordinates are used)
+        returns cells (-1 for points outside) and barycentric coordinates (nan outside) of shape (n, dim+1)
+        """
+        x = np.atleast_2d(np.asarray(points, dtype=float))[:, :self.dim]
+        n = x.shape[0]
+        ib = np.clip(((x - self.xmin)/self.h).astype(int), 0, self.nbuckets-1)
+        cells = self.start[np.ravel_multi_index(ib.T, self.nbuckets)]
+        lam = self.barycentric(cells, x)
+        # walk: leave the cell through the face with the most negative coordinate
+        active = np.flatnonzero(lam.min(axis=1) < -self.tol)
+        stuck = []
+        for it in range(self.maxwalk):
+            if not len(active): break
+            nb = self.neighbours[cells[active], np.argmin(lam[active], axis=1)]
+            out = nb < 0
+            stuck.append(active[out])
+            active, nb = active[~out], nb[~out]
+            cells[active] = nb
+            lam[active] = self.barycentric(nb, x[active])
+            active = active[lam[active].min(axis=1) < -self.tol]
+        stuck.append(active)
+        stuck = np.concatenate(stuck)
+        # boundary reached (non-convex domain or outside): test the cells of the nearest barycenters
+        found = np.ones(n, dtype=bool)
+        found[stuck] = False
+        if len(stuck):
+            k = min(self.ncandidates, self.ncells)
+            candidates = self.tree.query(x[stuck], k=k, workers=-1)[1].reshape(len(stuck), k)
+            lams = self.barycentric(candidates.ravel(), np.repeat(x[stuck], k, axis=0)).reshape(len(stuck), k, -1)
+            inside = lams.min(axis=2) >= -self.tol
+            first = np.argmax(inside, axis=1)
+            ok = inside[np.arange(len(stuck)), first]
+            cells[stuck[ok]] = candidates[ok, first[ok]]
+            lam[stuck[ok]] = lams[ok, first[ok]]
+            found[stuck[ok]] = True
+        cells[~found] = -1
+        lam[~found] = np.nan
+        return cells, lam
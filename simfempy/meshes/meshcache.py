@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: becker
+
+on-disk cache of the derived mesh arrays (one directory of .npy files per mesh)
+"""
+import os, shutil, tempfile, hashlib
+import numpy as np
+
+#=================================================================#
+class MeshCache(object):
+    """
+    entries are keyed by a content hash of points, simplices, boundary faces and cell_sets
+    arrays are loaded memory-mapped read-only, so that several processes share the pages
+    the directory can be set by the environment variable SIMFEMPY_MESHCACHE
+    """
+    version = 1
+    def __repr__(self):
+        return f"MeshCache({self.dirname}) hits/misses: {self.hits}/{self.misses}"
+    def __init__(self, dirname=None, mmap=True):
+        if dirname is None: dirname = os.environ.get('SIMFEMPY_MESHCACHE', None)
+        if dirname is None: raise ValueError(f"needs a directory (or SIMFEMPY_MESHCACHE)")
+        self.dirname, self.mmap = dirname, mmap
+        os.makedirs(self.dirname, exist_ok=True)
+        self.hits, self.misses = 0, 0
+    def key(self, points, simplices, bdryfaces, cell_sets):
+        h = hashlib.sha1(f"simplexmesh-{self.version}".encode())
+        for a in (points, simplices, bdryfaces):
+            a = np.ascontiguousarray(a)
+            h.update(f"{a.dtype}{a.shape}".encode())
+            h.update(a.data)
+        for label in sorted(cell_sets.keys()):
+            h.update(str(label).encode())
+            for cb in cell_sets[label]:
+                if cb is None: h.update(b"None")
+                else: h.update(np.ascontiguousarray(cb, dtype=np.int64).data)
+        return h.hexdigest()
+    def load(self, key):
+        """
+        returns a dict name -> array, dictionaries (as bdrylabels) are stored as name__color
+        None if not cached
+        """
+        dirname = os.path.join(self.dirname, key)
+        if not os.path.isdir(dirname):
+            self.misses += 1
+            return None
+        mmap_mode = 'r' if self.mmap else None
+        data = {}
+        for filename in os.listdir(dirname):
+            name, ext = os.path.splitext(filename)
+            if ext != '.npy': continue
+            a = np.load(os.path.join(dirname, filename), mmap_mode=mmap_mode)
+            if '__' in name:
+                name, color = name.split('__')
+                data.setdefault(name, {})[int(color)] = a
+            else:
+                data[name] = a
+        self.hits += 1
+        return data
+    def save(self, key, data):
+        """
+        written to a temporary directory and renamed, concurrent writers are harmless
+        """
+        dirname = os.path.join(self.dirname, key)
+        if os.path.isdir(dirname): return
+        tmpdir = tempfile.mkdtemp(dir=self.dirname, prefix='.tmp')
+        try:
+            for name, a in data.items():
+                if isinstance(a, dict):
+                    for color, b in a.items(): np.save(os.path.join(tmpdir, f"{name}__{color}.npy"), b)
+                else:
+                    np.save(os.path.join(tmpdir, f"{name}.npy"), a)
+            os.rename(tmpdir, dirname)
+        except OSError:
+            if not os.path.isdir(dirname): raise
+        finally:
+            if os.path.isdir(tmpdir): shutil.rmtree(tmpdir)
+    def clear(self):
+        for name in os.listdir(self.dirname):
+            path = os.path.join(self.dirname, name)
+            if os.path.isdir(path): shutil.rmtree(path)
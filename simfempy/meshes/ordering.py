@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+
+orderings for the renumbering of meshes (SimplexMesh.renumber)
+all functions return perm with perm[new] = old
+"""
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+#=================================================================#
+def inversePermutation(perm, dtype=None):
+    if dtype is None: dtype = perm.dtype
+    inv = np.empty(len(perm), dtype=dtype)
+    inv[perm] = np.arange(len(perm), dtype=dtype)
+    return inv
+# ----------------------------------------------------------------#
+def rcm(graph):
+    """
+    reverse Cuthill-McKee of a symmetric graph (sparse, the values are not used)
+    """
+    graph = sparse.csr_matrix((np.ones(graph.nnz, dtype=np.int8), graph.indices, graph.indptr), shape=graph.shape)
+    return csgraph.reverse_cuthill_mckee(graph, symmetric_mode=True).astype(np.int64)
+# ----------------------------------------------------------------#
+def _spread(x, dim):
+    # inserts dim-1 zero bits between the bits of x (x < 2**21 for dim=3, x < 2**31 for dim=2)
+    x = x.astype(np.uint64)
+    if dim == 2:
+        masks = [(16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333), (1, 0x5555555555555555)]
+    else:
+        masks = [(32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF), (8, 0x100F00F00F00F00F), (4, 0x10C30C30C30C30C3), (2, 0x1249249249249249)]
+    for shift, mask in masks:
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+def mortonKeys(x, dim):
+    """
+    keys of the points x (only the first dim coordinates) on the Morton (z-order) curve
+    """
+    x = x[:, :dim]
+    xmin, xmax = x.min(axis=0), x.max(axis=0)
+    scale = np.where(xmax > xmin, xmax - xmin, 1)
+    if dim == 1: return (x[:,0]-xmin[0])/scale[0]
+    nbits = 63//dim
+    ix = np.minimum(((x - xmin)/scale*2**nbits).astype(np.int64), 2**nbits-1)
+    keys = np.zeros(len(x), dtype=np.uint64)
+    for i in range(dim): keys |= _spread(ix[:,i], dim) << np.uint64(i)
+    return keys
+def morton(x, dim):
+    return np.argsort(mortonKeys(x, dim), kind='stable')
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: becker
+
+uniform refinement of simplicial meshes: each simplex is divided into 2**dim children
+2d: red refinement, 3d: regular refinement of Bey (diagonal m02-m13)
+"""
+import numpy as np
+import meshio
+from scipy import sparse
+from simfempy.meshes import topology
+
+#=================================================================#
+# local nodes of the children: vertices 0..d of the parent, then the midpoints of localEdges()
+children = {
+    1: np.array([[0,2], [2,1]]),
+    2: np.array([[0,3,4], [3,1,5], [4,5,2], [3,5,4]]),
+    3: np.array([[0,4,5,6], [4,1,7,8], [5,7,2,9], [6,8,9,3], [4,5,6,8], [4,5,7,8], [5,6,8,9], [5,7,8,9]]),
+}
+# ----------------------------------------------------------------#
+def extendedBarycentric(dim):
+    """
+    barycentric coordinates of the vertices and edge midpoints w.r.t. the parent (nvertices+nedges, dim+1)
+    """
+    le = topology.localEdges(dim+1)
+    bary = np.zeros(shape=(dim+1+len(le), dim+1))
+    bary[np.arange(dim+1), np.arange(dim+1)] = 1
+    bary[dim+1+np.arange(len(le)), le[:,0]] = 0.5
+    bary[dim+1+np.arange(len(le)), le[:,1]] = 0.5
+    return bary
+# ----------------------------------------------------------------#
+def refine(mesh):
+    """
+    returns the refined SimplexMesh, new nodes (midpoints of edges) are numbered after the old ones
+    boundary and cell labels are inherited, the children of cell i are i*2**dim,...,(i+1)*2**dim-1
+    the fine mesh knows its parents: parentcells and prolongation()
+    """
+    from simfempy.meshes.simplexmesh import SimplexMesh
+    dim, nnodes = mesh.dimension, mesh.nnodes
+    edges, edgesOfCells = topology.edgesFromSimplices(mesh.simplices)
+    points = np.concatenate((mesh.points, mesh.points[edges].mean(axis=1)))
+    ext = np.concatenate((mesh.simplices, nnodes + edgesOfCells), axis=1)
+    nchildren = len(children[dim])
+    simplices = ext[:, children[dim]].reshape(-1, dim+1)
+    # boundary faces: their children are given by the 2d (3d) or 1d (2d) table
+    cell_sets, bdryfaces, n = {}, [], 0
+    for color, faces in mesh.bdrylabels.items():
+        nodes = mesh.faces[faces]
+        if dim > 1:
+            fe = topology.localEdges(dim)
+            pos = topology.matchRows(np.sort(nodes[:, fe], axis=2).reshape(-1,2), edges)
+            if np.any(pos < 0): raise ValueError(f"boundary faces of {color=} without edges")
+            nodes = np.concatenate((nodes, nnodes + pos.reshape(len(faces), len(fe))), axis=1)
+            nodes = nodes[:, children[dim-1]].reshape(-1, dim)
+        bdryfaces.append(nodes)
+        cell_sets[str(color)] = [n + np.arange(len(nodes)), None]
+        n += len(nodes)
+    for color, cells in mesh.cellsoflabel.items():
+        fine = (nchildren*np.asarray(cells, dtype=np.int64)[:,np.newaxis] + np.arange(nchildren)).ravel()
+        cell_sets[str(color)] = [None, n + fine]
+    if len(bdryfaces): bdryfaces = np.concatenate(bdryfaces)
+    else: bdryfaces = np.empty(shape=(0, dim), dtype=simplices.dtype)
+    cells = [(mesh.facesname, bdryfaces), (mesh.simplicesname, simplices)]
+    fine = SimplexMesh(mesh=meshio.Mesh(points, cells, cell_sets=cell_sets), cache=mesh.cache or False)
+    fine.geometry = mesh.geometry
+    fine.parentcells = np.repeat(np.arange(mesh.ncells, dtype=fine.simplices.dtype), nchildren)
+    fine._parent = {'nnodes': nnodes, 'nfaces': mesh.nfaces, 'edges': edges, 'facesOfCells': mesh.facesOfCells}
+    return fine
+# ----------------------------------------------------------------#
+def prolongation(mesh, fem='p1'):
+    """
+    interpolation from the parent mesh to the refined mesh (sparse of shape (nfine, ncoarse))
+    fem in ['p1', 'cr1', 'd0'], cr1: the two values on coarse faces are averaged
+    """
+    if not hasattr(mesh, '_parent'): raise ValueError(f"mesh is not obtained by refine()")
+    parent, dim = mesh._parent, mesh.dimension
+    if fem == 'p1':
+        nc, edges = parent['nnodes'], parent['edges']
+        ne = len(edges)
+        rows = np.concatenate((np.arange(nc), nc + np.arange(ne), nc + np.arange(ne)))
+        cols = np.concatenate((np.arange(nc), edges[:,0], edges[:,1]))
+        vals = np.concatenate((np.ones(nc), 0.5*np.ones(2*ne)))
+        return sparse.coo_matrix((vals, (rows, cols)), shape=(mesh.nnodes, nc)).tocsr()
+    if fem == 'd0':
+        ncoarse = parent['facesOfCells'].shape[0]
+        return sparse.coo_matrix((np.ones(mesh.ncells), (np.arange(mesh.ncells), mesh.parentcells)), shape=(mesh.ncells, ncoarse)).tocsr()
+    if fem == 'cr1':
+        # barycentric coordinates (w.r.t. the parent) of the barycenter of face ii of child k
+        bary = extendedBarycentric(dim)[children[dim]]
+        nnpc = dim+1
+        lf = topology.localFaces(nnpc)
+        baryfaces = bary[:, lf].mean(axis=2)
+        weights = 1 - dim*baryfaces
+        nchildren = len(children[dim])
+        ncoarse = parent['facesOfCells'].shape[0]
+        rows = np.repeat(mesh.facesOfCells.reshape(ncoarse, nchildren, nnpc), nnpc, axis=2).ravel()
+        cols = np.tile(parent['facesOfCells'][:, np.newaxis, :], (1, nchildren, nnpc)).ravel()
+        vals = np.tile(weights.reshape(1, nchildren, nnpc*nnpc), (ncoarse, 1, 1)).ravel()
+        count = np.bincount(mesh.facesOfCells.ravel(), minlength=mesh.nfaces)
+        P = sparse.coo_matrix((vals/count[rows], (rows, cols)), shape=(mesh.nfaces, parent['nfaces'])).tocsr()
+        P.eliminate_zeros()
+        return P
+    raise ValueError(f"unknown {fem=}")
@@ -5,10 +5,12 @@ Created on Sun Dec  4 18:14:29 2016
 @author: becker
 """
 import os, sys, importlib
+from functools import cached_property
 import meshio
 import numpy as np
 from scipy import sparse
 from simfempy.tools import npext
+from simfempy.meshes import topology, meshcache, adjacency
 
 #=================================================================#
 class SimplexMesh(object):
@@ -37,6 +39,18 @@ class SimplexMesh(object):
     dV: shape (ncells), volumes of simplices
     bdrylabels: dictionary(keys: colors, values: id's of boundary faces)
     cellsoflabel: dictionary(keys: colors, values: id's of cells)
+
+    nodeToCells, faceToCells, cellToCells, nodeToNodes: adjacency graphs as csr matrices
+
+    pointsc, pointsf, normals, sigma, dV, innerfaces, cellsOfInteriorFaces, simpOfVert and the graphs are computed on first access
+    materialized(): the computed ones and their memory, invalidate(*names): forget them
+
+    locate(points): containing cells and barycentric coordinates (the PointLocator is built on first call)
+    renumber(): reordering for locality (rcm for nodes and faces, morton for cells), toOriginal()/fromOriginal()
+    (all data refer to the new numbering, except the files of write())
+    refine(): uniform refinement (parentcells, prolongation(fem) from the coarse mesh on the refined mesh)
+
+    cache: directory of a MeshCache (or environment variable SIMFEMPY_MESHCACHE), cache=False disables it
     """
 
     def __repr__(self):
@@ -51,16 +65,25 @@ class SimplexMesh(object):
             mesh = kwargs.pop('mesh')
         else:
             raise KeyError("Needs a mesh (no longer geometry)")
+        cache = kwargs.pop('cache', None)
+        if cache is None and 'SIMFEMPY_MESHCACHE' in os.environ: cache = True
+        if cache is True: cache = meshcache.MeshCache()
+        elif isinstance(cache, str): cache = meshcache.MeshCache(cache)
+        self.cache = cache or None
         self._initMeshPyGmsh(mesh)
         self.check()
+    def _usedNodes(self):
+        used = np.zeros(self.nnodes, dtype=bool)
+        used[self.simplices] = True
+        return used
     def check(self):
-        if len(np.unique(self.simplices)) != self.nnodes:
-            raise ValueError(f"{len(np.unique(self.simplices))=} BUT {self.nnodes=}")
+        if not np.all(self._usedNodes()):
+            raise ValueError(f"{np.count_nonzero(self._usedNodes())=} BUT {self.nnodes=}")
     def bdryFaces(self, colors=None):
         if colors is None: colors = self.bdrylabels.keys()
         pos = [0]
         for color in colors: pos.append(pos[-1]+len(self.bdrylabels[color]))
-        faces = np.empty(pos[-1], dtype=np.uint32)
+        faces = np.empty(pos[-1], dtype=self.faces.dtype)
         for i,color in enumerate(colors): faces[pos[i]:pos[i+1]] = self.bdrylabels[color]
         return faces
 
@@ -95,25 +118,77 @@ class SimplexMesh(object):
         if not hasattr(self,"simplices"):
             raise ValueError(f"something wrong {self.dimension=}")
         # eliminate drangling points
-        nnp = len(np.unique(self.simplices))
+        used = self._usedNodes()
+        nnp = np.count_nonzero(used)
         if nnp != self.nnodes:
-            assert np.all(np.unique(self.simplices)==np.arange(nnp))
+            assert np.all(used[:nnp])
             self.points = self.points[:nnp]
             self.nnodes = nnp
+        # all index arrays get this type, ncomp*nfaces (systems) has to fit
+        self.simplices = npext.asIndex(self.simplices, 3*max(self.nnodes, self.simplices.size))
         # boundaries
         bdryfacesgmsh = np.array(bdryfacesgmshlist)
-        self._constructFacesFromSimplices()
         assert self.dimension+1 == self.simplices.shape[1]
         self.ncells = self.simplices.shape[0]
-        self.pointsc = self.points[self.simplices].mean(axis=1)
-        self.pointsf = self.points[self.faces].mean(axis=1)
-        self._constructNormalsAndAreas()
         self.cell_sets = mesh.cell_sets
+        if self.cache is not None:
+            key = self.cache.key(self.points, self.simplices, bdryfacesgmsh, mesh.cell_sets)
+            if self._loadFromCache(key): return
+        self._constructFacesFromSimplices()
         self._initMeshPyGmsh7(mesh.cells, mesh.cell_sets, bdryfacesgmsh)
+        if self.cache is not None:
+            self.cache.save(key, {name:getattr(self, name) for name in self._cachednames})
         #TODO : remplacer -1 par nan dans les indices
+    # arrays stored by the mesh cache (the lazy ones are computed before saving)
+    _cachednames = ['faces', 'facesOfCells', 'cellsOfFaces', 'sigma', 'normals', 'dV', 'bdrylabels', 'cellsoflabel']
+    def _loadFromCache(self, key):
+        data = self.cache.load(key)
+        if data is None: return False
+        for name in self._cachednames:
+            if name in ['bdrylabels', 'cellsoflabel']: setattr(self, name, data.get(name, {}))
+            else: setattr(self, name, data[name])
+        self.nfaces = self.faces.shape[0]
+        self.verticesoflabel = {}
+        return True
+    # ----------------------------------------------------------------#
+    # derived quantities: computed on first access, see materialized() and invalidate()
+    @classmethod
+    def lazyNames(cls):
+        return [name for c in reversed(cls.__mro__) for name, v in vars(c).items() if isinstance(v, cached_property)]
+    def materialized(self):
+        """
+        derived quantities computed so far, with their memory in bytes
+        """
+        sizes = {}
+        for name in self.lazyNames():
+            if name not in self.__dict__: continue
+            v = self.__dict__[name]
+            if isinstance(v, np.ndarray): sizes[name] = v.nbytes
+            elif sparse.issparse(v): sizes[name] = sum(getattr(v, a).nbytes for a in ['data', 'indices', 'indptr'] if hasattr(v, a))
+            else: sizes[name] = sys.getsizeof(v)
+        return sizes
+    def invalidate(self, *names):
+        """
+        forget derived quantities (all if no names are given), they are recomputed on next access
+        """
+        lazynames = self.lazyNames()
+        if not len(names): names = lazynames
+        for name in names:
+            if name not in lazynames: raise KeyError(f"{name=} is not a derived quantity {lazynames=}")
+            self.__dict__.pop(name, None)
+    @cached_property
+    def pointsc(self): return self.points[self.simplices].mean(axis=1)
+    @cached_property
+    def pointsf(self): return self.points[self.faces].mean(axis=1)
+    @cached_property
+    def sigma(self):
+        return 2 * (self.cellsOfFaces[self.facesOfCells, 0] == np.arange(self.ncells)[:, np.newaxis]) - 1
+    @cached_property
+    def innerfaces(self): return self.cellsOfFaces[:,1]>=0
+    @cached_property
+    def cellsOfInteriorFaces(self): return self.cellsOfFaces[self.innerfaces]
     def constructInnerFaces(self):
-        self.innerfaces = self.cellsOfFaces[:,1]>=0
-        self.cellsOfInteriorFaces= self.cellsOfFaces[self.innerfaces]
+        return self.innerfaces, self.cellsOfInteriorFaces
     def _initMeshPyGmsh7(self, cells, cell_sets, bdryfacesgmsh):
         # cell_sets: dict label --> list of None or np.array for each cell_type
         # the indices of the np.array are not the cellids !
@@ -143,7 +218,7 @@ class SimplexMesh(object):
             #eliminates duplicates
             for l, cb in cellsoflabel[ct].items(): cb -= n
             n += sizes[ct]
-        self.cellsoflabel = cellsoflabel[self.simplicesname]
+        self.cellsoflabel = {l:cb.astype(self.simplices.dtype) for l,cb in cellsoflabel[self.simplicesname].items()}
         self.verticesoflabel = {}
         # print(f"{cellsoflabel=}\n{cellsoflabel.keys()}")
         # if self.dimension > 1: self.verticesoflabel = cellsoflabel['vertex']
@@ -154,106 +229,47 @@ class SimplexMesh(object):
         bdrylabelsgmsh = cellsoflabel[self.facesname]
         self._constructBoundaryFaces7(bdryfacesgmsh, bdrylabelsgmsh)
     def _constructFacesFromSimplices(self):
-        simplices = self.simplices
-        ncells = simplices.shape[0]
-        nnpc = simplices.shape[1]
-        allfaces = np.empty(shape=(nnpc*ncells,nnpc-1), dtype=int)
-        for i in range(ncells):
-            for ii in range(nnpc):
-                mask = np.array( [jj !=ii for jj in range(nnpc)] )
-                allfaces[i*nnpc+ii] = np.sort(simplices[i,mask])
-        s = "{0}" + (nnpc-2)*", {0}"
-        s = s.format(allfaces.dtype)
-        order = ["f0"]+["f{:1d}".format(i) for i in range(1,nnpc-1)]
-        if self.dimension==1:
-            perm = np.argsort(allfaces, axis=0).ravel()
-        else:
-            perm = np.argsort(allfaces.view(s), order=order, axis=0).ravel()
-        allfacescorted = allfaces[perm]
-        self.faces, indices = np.unique(allfacescorted, return_inverse=True, axis=0)
-        locindex = np.tile(np.arange(0,nnpc), ncells)
-        cellindex = np.repeat(np.arange(0,ncells), nnpc)
+        self.faces, self.facesOfCells, self.cellsOfFaces = topology.facesFromSimplices(self.simplices)
         self.nfaces = self.faces.shape[0]
-        self.cellsOfFaces = -1 * np.ones(shape=(self.nfaces, 2), dtype=int)
-        self.facesOfCells = np.zeros(shape=(ncells, nnpc), dtype=int)
-        for ii in range(indices.shape[0]):
-            f = indices[ii]
-            loc = locindex[perm[ii]]
-            cell = cellindex[perm[ii]]
-            self.facesOfCells[cell, loc] = f
-            if self.cellsOfFaces[f,0] == -1: self.cellsOfFaces[f,0] = cell
-            else: self.cellsOfFaces[f,1] = cell
 
     def _constructBoundaryFaces7(self, bdryfacesgmsh, bdrylabelsgmsh):
         # bdries
         # bdryfacesgmsh may contains interior edges for len(celllabels)>1
         bdryfacesgmsh = np.sort(bdryfacesgmsh)
         bdryids = np.flatnonzero(self.cellsOfFaces[:,1] == -1)
-        # print(f"{bdryids=}")
-        # assert np.all(bdryids == np.flatnonzero(np.any(self.cellsOfFaces == -1, axis=1)))
         bdryfaces = np.sort(self.faces[bdryids],axis=1)
-        # print(f"{bdryfacesgmsh=}\n{bdryfaces=}")
-        # ind = np.isin(bdryfacesgmsh, bdryfaces)
-        # print(f"{ind=} {bdryfacesgmsh[ind]=}")
-        # print(f"{bdryfaces=}")
-        nbdryfaces = len(bdryids)
-        nnpc = self.simplices.shape[1]
-        s = "{0}" + (nnpc-2)*", {0}"
-        dtb = s.format(bdryfacesgmsh.dtype)
-        dtf = s.format(bdryfaces.dtype)
-        order = ["f0"]+["f{:1d}".format(i) for i in range(1,nnpc-1)]
-        if self.dimension==1:
-            bp = np.argsort(bdryfacesgmsh.view(dtb), axis=0).ravel()
-            fp = np.argsort(bdryfaces.view(dtf), axis=0).ravel()
-        else:
-            bp = np.argsort(bdryfacesgmsh.view(dtb), order=order, axis=0).ravel()
-            fp = np.argsort(bdryfaces.view(dtf), order=order, axis=0).ravel()
-        # print(f"{bp=}")
-        # print(f"{fp=}")
-#https://stackoverflow.com/questions/51352527/check-for-identical-rows-in-different-numpy-arrays
-        indices = (bdryfacesgmsh[bp, None] == bdryfaces[fp]).all(-1).any(-1)
-        if not np.all(bdryfaces[fp]==bdryfacesgmsh[bp[indices]]):
-            raise ValueError(f"{bdryfaces.T=}\n{bdryfacesgmsh.T=}\n{indices=}\n{bdryfaces[fp].T=}\n{bdryfacesgmsh[bp[indices]].T=}")
-        bp2 = bp[indices]
-        for i in range(len(fp)):
-            if not np.all(bdryfacesgmsh[bp2[i]] == bdryfaces[fp[i]]):
-                raise ValueError(f"{i=} {bdryfacesgmsh[bp2[i]]=} {bdryfaces[fp[i]]=}")
-        bpi = np.argsort(bp)
-        # bp2i = {bp2[i]:i for i in range(len(bp2))}
-        # print(f"{bp=} \n{bp2=} \n{bpi=} \n{bp2i=} \n{indices=}")
-        binv = -1*np.ones_like(bp)
-        binv[bp2] = np.arange(len(bp2))
+        # position of every gmsh face in bdryfaces (-1 for interior faces), by keys
+        pos = topology.matchRows(bdryfacesgmsh, bdryfaces)
+        found = np.zeros(len(bdryids), dtype=bool)
+        found[pos[pos>=0]] = True
+        if not np.all(found):
+            raise ValueError(f"boundary faces without label {bdryfaces[~found].T=}\n{bdryfacesgmsh.T=}")
         self.bdrylabels = {}
         for col, cb in bdrylabelsgmsh.items():
-            # if cb[0] in bp2i.keys():
-            if indices[bpi[cb[0]]]:
-                # for i in range(len(cb)):
-                #     if not bp2i[cb[i]] == binv[cb[i]]:
-                #         raise ValueError(f"{bp2i[cb[i]]} {binv[cb[i]]}")
-                # print(f"{col=}")
-                self.bdrylabels[int(col)] = np.empty_like(cb)
-                # for i in range(len(cb)): self.bdrylabels[int(col)][i] = bdryids[fp[bp2i[cb[i]]]]
-                for i in range(len(cb)): self.bdrylabels[int(col)][i] = bdryids[fp[binv[cb[i]]]]
-            # else:
-            #     assert not indices[bpi[cb[0]]]
-    def _constructNormalsAndAreas(self):
-        elem = self.simplices
-        self.sigma = np.array([2 * (self.cellsOfFaces[self.facesOfCells[ic, :], 0] == ic)-1 for ic in range(self.ncells)])
+            if pos[cb[0]] < 0: continue
+            if np.any(pos[cb] < 0):
+                raise ValueError(f"label {col} contains boundary and interior faces {bdryfacesgmsh[cb[pos[cb]<0]].T=}")
+            self.bdrylabels[int(col)] = bdryids[pos[cb]].astype(self.faces.dtype)
+    @cached_property
+    def dV(self):
+        elem, dim = self.simplices, self.dimension
+        x = self.points[:, :dim]
+        d = x[elem[:, 1:]] - x[elem[:, :1]]
+        if dim==1: return np.abs(d[:, 0, 0])
+        if dim==2: return 0.5 * np.abs(d[:,0,0]*d[:,1,1]-d[:,1,0]*d[:,0,1])
+        return (1/6) * np.abs(d[:,0,0]*(d[:,1,1]*d[:,2,2]-d[:,2,1]*d[:,1,2]) - d[:,1,0]*(d[:,0,1]*d[:,2,2]-d[:,2,1]*d[:,0,2]) + d[:,2,0]*(d[:,0,1]*d[:,1,2]-d[:,1,1]*d[:,0,2]))
+    @cached_property
+    def normals(self):
+        """
+        normal per face of length dS, from cellsOfFaces[:,0] to cellsOfFaces[:,1], outwards on the boundary
+        """
         if self.dimension==1:
-            x = self.points[:,0]
-            self.normals = np.stack((np.ones(self.nfaces), np.zeros(self.nfaces), np.zeros(self.nfaces)), axis=-1)
-            dx1 = x[elem[:, 1]] - x[elem[:, 0]]
-            self.dV = np.abs(dx1)
+            normals = np.stack((np.ones(self.nfaces), np.zeros(self.nfaces), np.zeros(self.nfaces)), axis=-1)
         elif self.dimension==2:
             x,y = self.points[:,0], self.points[:,1]
             sidesx = x[self.faces[:, 1]] - x[self.faces[:, 0]]
             sidesy = y[self.faces[:, 1]] - y[self.faces[:, 0]]
-            self.normals = np.stack((-sidesy, sidesx, np.zeros(self.nfaces)), axis=-1)
-            dx1 = x[elem[:, 1]] - x[elem[:, 0]]
-            dx2 = x[elem[:, 2]] - x[elem[:, 0]]
-            dy1 = y[elem[:, 1]] - y[elem[:, 0]]
-            dy2 = y[elem[:, 2]] - y[elem[:, 0]]
-            self.dV = 0.5 * np.abs(dx1*dy2-dx2*dy1)
+            normals = np.stack((-sidesy, sidesx, np.zeros(self.nfaces)), axis=-1)
         else:
             x, y, z = self.points[:, 0], self.points[:, 1], self.points[:, 2]
             x1 = x[self.faces[:, 1]] - x[self.faces[:, 0]]
@@ -265,26 +281,18 @@ class SimplexMesh(object):
             sidesx = y1*z2 - y2*z1
             sidesy = x2*z1 - x1*z2
             sidesz = x1*y2 - x2*y1
-            self.normals = 0.5*np.stack((sidesx, sidesy, sidesz), axis=-1)
-            dx1 = x[elem[:, 1]] - x[elem[:, 0]]
-            dx2 = x[elem[:, 2]] - x[elem[:, 0]]
-            dx3 = x[elem[:, 3]] - x[elem[:, 0]]
-            dy1 = y[elem[:, 1]] - y[elem[:, 0]]
-            dy2 = y[elem[:, 2]] - y[elem[:, 0]]
-            dy3 = y[elem[:, 3]] - y[elem[:, 0]]
-            dz1 = z[elem[:, 1]] - z[elem[:, 0]]
-            dz2 = z[elem[:, 2]] - z[elem[:, 0]]
-            dz3 = z[elem[:, 3]] - z[elem[:, 0]]
-            self.dV = (1/6) * np.abs(dx1*(dy2*dz3-dy3*dz2) - dx2*(dy1*dz3-dy3*dz1) + dx3*(dy1*dz2-dy2*dz1))
-        for i in range(self.nfaces):
-            i0, i1 = self.cellsOfFaces[i, 0], self.cellsOfFaces[i, 1]
-            if i1 == -1:
-                xt = np.mean(self.points[self.faces[i]], axis=0) - np.mean(self.points[self.simplices[i0]], axis=0)
-                if np.dot(self.normals[i], xt)<0:  self.normals[i] *= -1
-            else:
-                xt = np.mean(self.points[self.simplices[i1]], axis=0) - np.mean(self.points[self.simplices[i0]], axis=0)
-                if np.dot(self.normals[i], xt) < 0:  self.normals[i] *= -1
-        # self.sigma = np.array([1.0 - 2.0 * (self.cellsOfFaces[self.facesOfCells[ic, :], 0] == ic) for ic in range(self.ncells)])
+            normals = 0.5*np.stack((sidesx, sidesy, sidesz), axis=-1)
+        # barycenters only as temporaries, pointsf/pointsc are not materialized
+        i0, i1 = self.cellsOfFaces[:, 0], self.cellsOfFaces[:, 1]
+        bdry = i1 == -1
+        pointsc = self.__dict__.get('pointsc', None)
+        if pointsc is None: pointsc = self.points[self.simplices].mean(axis=1)
+        xt = np.empty_like(normals)
+        xt[bdry] = self.points[self.faces[bdry]].mean(axis=1)
+        xt[~bdry] = pointsc[i1[~bdry]]
+        xt -= pointsc[i0]
+        normals[np.einsum('ni,ni->n', normals, xt) < 0] *= -1
+        return normals
     # ----------------------------------------------------------------#
     def write(self, filename, dirname = None, point_data=None):
         if dirname is not None:
@@ -292,25 +300,116 @@ class SimplexMesh(object):
             if not os.path.isdir(dirname) :
                 os.makedirs(dirname)
             filename = os.path.join(dirname, filename)
+        # in the original numbering (see renumber())
+        nodes = getattr(self, 'permutations', {}).get('nodes', np.arange(self.nnodes))
+        simplices, facesdata = self.toOriginal(nodes[self.simplices], 'cells'), nodes[self.facesdata]
         if self.dimension == 1:
-            cells = {'lines': self.simplices}
-            cells['vertex'] = self.facesdata
+            cells = {'lines': simplices}
+            cells['vertex'] = facesdata
         elif self.dimension ==2:
-            cells = {'triangle': self.simplices}
-            cells['line'] = self.facesdata
+            cells = {'triangle': simplices}
+            cells['line'] = facesdata
         else:
-            cells = {'tetra': self.simplices}
-            cells['triangle'] = self.facesdata
-        mesh = meshio.Mesh(self.points, cells)
+            cells = {'tetra': simplices}
+            cells['triangle'] = facesdata
+        if point_data is not None: point_data = {k:self.toOriginal(v) for k,v in point_data.items()}
+        mesh = meshio.Mesh(self.toOriginal(self.points), cells, point_data=point_data)
         meshio.write(filename, mesh)
     # ----------------------------------------------------------------#
+    def refine(self):
+        from . import refine
+        return refine.refine(self)
+    def prolongation(self, fem='p1'):
+        from . import refine
+        return refine.prolongation(self, fem)
+    # ----------------------------------------------------------------#
+    def renumber(self, nodes='rcm', faces='rcm', cells='morton'):
+        """
+        renumbers nodes, faces and cells in place ('rcm', 'morton' (cells only), None: unchanged)
+        has to be done before the mesh is given to a fem/application
+        permutations[k][new]=old w.r.t. the original numbering, see toOriginal()
+        only write() uses the original numbering: solutions, Results and locate() are in the new one
+        (consistent with points and simplices), use toOriginal() to compare with the original mesh
+        """
+        from . import ordering
+        itype = self.simplices.dtype
+        perms = {}
+        for name, method, n in [('nodes', nodes, self.nnodes), ('faces', faces, self.nfaces), ('cells', cells, self.ncells)]:
+            if method is None: continue
+            if method == 'rcm':
+                if name == 'nodes': graph = self.nodeToNodes
+                elif name == 'cells': graph = self.cellToCells
+                else: graph = self.faceToCells.astype(np.int32) @ self.faceToCells.T.astype(np.int32)
+                perms[name] = ordering.rcm(graph)
+            elif method == 'morton' and name == 'cells':
+                perms[name] = ordering.morton(self.pointsc, self.dimension)
+            else:
+                raise ValueError(f"unknown ordering {method=} for {name}")
+        inv = {name:ordering.inversePermutation(p, itype) for name, p in perms.items()}
+        if 'nodes' in perms:
+            p, ip = perms['nodes'], inv['nodes']
+            self.points = self.points[p]
+            self.simplices, self.faces = ip[self.simplices], np.sort(ip[self.faces], axis=1)
+            if hasattr(self, 'facesdata'): self.facesdata = ip[self.facesdata]
+        if 'cells' in perms:
+            p, ip = perms['cells'], inv['cells']
+            self.simplices, self.facesOfCells = self.simplices[p], self.facesOfCells[p]
+            self.cellsOfFaces = np.where(self.cellsOfFaces >= 0, ip[self.cellsOfFaces], -1).astype(itype)
+            inner = self.cellsOfFaces[:,1] >= 0
+            self.cellsOfFaces[inner] = np.sort(self.cellsOfFaces[inner], axis=1)
+            self.cellsoflabel = {col:np.sort(ip[cells]) for col, cells in self.cellsoflabel.items()}
+            if hasattr(self, 'parentcells'): self.parentcells = self.parentcells[p]
+        if 'faces' in perms:
+            p, ip = perms['faces'], inv['faces']
+            self.faces, self.cellsOfFaces = self.faces[p], self.cellsOfFaces[p]
+            self.facesOfCells = ip[self.facesOfCells]
+            self.bdrylabels = {col:np.sort(ip[faces]) for col, faces in self.bdrylabels.items()}
+        # the refinement relation is given by the numbering of the children
+        if hasattr(self, '_parent'): del self._parent
+        if not hasattr(self, 'permutations'): self.permutations = {}
+        for name, p in perms.items():
+            self.permutations[name] = self.permutations[name][p] if name in self.permutations else p
+        self.invalidate()
+    def toOriginal(self, u, where='nodes'):
+        """
+        u (first axis indexed by nodes, faces or cells) in the numbering before renumber()
+        """
+        if where not in ['nodes', 'faces', 'cells']: raise KeyError(f"unknown {where=}")
+        if where not in getattr(self, 'permutations', {}): return u
+        v = np.empty_like(u)
+        v[self.permutations[where]] = u
+        return v
+    def fromOriginal(self, u, where='nodes'):
+        if where not in ['nodes', 'faces', 'cells']: raise KeyError(f"unknown {where=}")
+        if where not in getattr(self, 'permutations', {}): return u
+        return u[self.permutations[where]]
+    # ----------------------------------------------------------------#
+    @cached_property
+    def locator(self):
+        from . import locate
+        return locate.PointLocator(self)
+    def locate(self, points):
+        """
+        cells containing the points (-1 if outside) and the barycentric coordinates (n, dimension+1)
+        """
+        return self.locator.locate(points)
+    # ----------------------------------------------------------------#
+    # adjacency graphs (csr, data=1)
+    @cached_property
+    def nodeToCells(self): return adjacency.nodeToCells(self.simplices, self.nnodes)
+    @cached_property
+    def faceToCells(self): return adjacency.faceToCells(self.cellsOfFaces, self.ncells)
+    @cached_property
+    def cellToCells(self): return adjacency.cellToCells(self.cellsOfFaces, self.ncells)
+    @cached_property
+    def nodeToNodes(self): return adjacency.nodeToNodes(self.simplices, self.nnodes)
+    @cached_property
+    def simpOfVert(self):
+        # nodeToCells with the cell ids as data
+        S = self.nodeToCells
+        return sparse.csr_matrix((S.indices.astype(int), S.indices, S.indptr), shape=S.shape)
     def computeSimpOfVert(self, test=False):
-        S = sparse.dok_matrix((self.nnodes, self.ncells), dtype=int)
-        for ic in range(self.ncells):
-            S[self.simplices[ic,:], ic] = ic+1
-        S = S.tocsr()
-        S.data -= 1
-        self.simpOfVert = S
+        S = self.simpOfVert
         if test:
             # print("S=",S)
             from . import plotmesh
@@ -164,3 +164,46 @@ def equilateral(h):
     geom.add_physical(p.surface, label=100)
     for i in range(4): geom.add_physical(p.line_loop.lines[i], label=1000 + i)
     return simfempy.meshes.simplexmesh.SimplexMesh(mesh=pygmsh.generate_mesh(geom, verbose=False))
+
+# ------------------------------------- #
+def structured(dim, n, **kwargs):
+    """
+    Kuhn triangulation of n^dim cubes (no gmsh needed), same labels as unitline/unitsquare/unitcube
+    """
+    return simfempy.meshes.simplexmesh.SimplexMesh(mesh=structuredMeshio(dim, n), **kwargs)
+def structuredMeshio(dim, n):
+    import itertools, meshio
+    from simfempy.meshes import topology
+    if dim==1:
+        a, cellname, facename, celllabel = [0,1], 'line', 'vertex', "1000"
+        bdrylabels = {"10000": (0,0), "10001": (0,1)}
+    elif dim==2:
+        a, cellname, facename, celllabel = [-1,1], 'triangle', 'line', "100"
+        bdrylabels = {"1000": (1,0), "1001": (0,1), "1002": (1,1), "1003": (0,0)}
+    elif dim==3:
+        a, cellname, facename, celllabel = [-1,1], 'tetra', 'triangle', "10"
+        bdrylabels = {"100": (2,0), "101": (1,0), "102": (0,1), "103": (1,1), "104": (0,0), "105": (2,1)}
+    else: raise ValueError(f"{dim=}")
+    x = np.linspace(a[0], a[1], n+1)
+    grid = np.meshgrid(*dim*[x], indexing='ij')
+    points = np.zeros(shape=((n+1)**dim, 3))
+    for i in range(dim): points[:,i] = grid[dim-1-i].ravel()
+    strides = (n+1)**np.arange(dim)
+    corners = (np.stack(np.meshgrid(*dim*[np.arange(n)], indexing='ij'), axis=-1).reshape(-1,dim)[:,::-1]@strides)
+    simplices = []
+    for perm in itertools.permutations(range(dim)):
+        path = np.cumsum(np.concatenate(([0], strides[list(perm)])))
+        simplices.append(corners[:,np.newaxis] + path)
+    simplices = np.concatenate(simplices)
+    faces, facesOfCells, cellsOfFaces = topology.facesFromSimplices(simplices)
+    bdryfaces = faces[cellsOfFaces[:,1]==-1]
+    xf = points[bdryfaces].mean(axis=1)
+    cell_sets, ind = {}, []
+    for label, (i,side) in bdrylabels.items():
+        ind.append(np.flatnonzero(np.isclose(xf[:,i], a[side])))
+        cell_sets[label] = [np.arange(len(ind[-1]))+sum(len(j) for j in ind[:-1]), None]
+    nb = sum(len(j) for j in ind)
+    cell_sets[celllabel] = [None, nb+np.arange(len(simplices))]
+    ind = np.concatenate(ind)
+    cells = [(facename, bdryfaces[ind]), (cellname, simplices)]
+    return meshio.Mesh(points, cells, cell_sets=cell_sets)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 2026
+
+@author: becker
+
+array-based construction of the mesh topology (no loops over cells or faces)
+"""
+import numpy as np
+from simfempy.tools import npext
+
+#=================================================================#
+def localFaces(nnpc):
+    """
+    local face ii of a simplex with nnpc nodes is opposite to node ii
+    returns shape (nnpc, nnpc-1)
+    """
+    return np.array([[jj for jj in range(nnpc) if jj != ii] for ii in range(nnpc)])
+# ----------------------------------------------------------------#
+def sortRows(a):
+    """
+    stable lexicographic sort of the rows of a (ties keep their original order)
+    """
+    if a.shape[1]==1: return np.argsort(a[:,0], kind='stable')
+    return np.lexsort(a.T[::-1])
+# ----------------------------------------------------------------#
+def facesFromSimplices(simplices):
+    """
+    faces: node ids of the faces (nfaces, nnpc-1), sorted rows, lexicographic order (as np.unique(axis=0))
+    facesOfCells: facesOfCells[i,ii] is the face of cell i opposite to simplices[i,ii]
+    cellsOfFaces: (nfaces, 2), the cell with smaller id first, -1 for boundary faces
+    all arrays have the (signed) integer type of simplices, or npext.indexType()
+    """
+    ncells, nnpc = simplices.shape
+    if simplices.dtype.kind == 'i': itype = simplices.dtype
+    else: itype = npext.indexType(max(int(simplices.max())+1, ncells*nnpc))
+    allfaces = np.sort(simplices[:, localFaces(nnpc)], axis=2).reshape(ncells*nnpc, nnpc-1).astype(itype)
+    perm = sortRows(allfaces)
+    allfacessorted = allfaces[perm]
+    new = np.empty(len(perm), dtype=bool)
+    new[0] = True
+    np.any(allfacessorted[1:] != allfacessorted[:-1], axis=1, out=new[1:])
+    first = np.flatnonzero(new)
+    faces = allfacessorted[first]
+    nfaces = len(first)
+    indices = np.empty(len(perm), dtype=itype)
+    indices[perm] = np.cumsum(new)-1
+    facesOfCells = indices.reshape(ncells, nnpc)
+    count = np.diff(np.append(first, len(perm)))
+    if np.any(count>2): raise ValueError(f"non-manifold mesh: faces shared by more than two cells {np.flatnonzero(count>2)=}")
+    cells = (perm // nnpc).astype(itype)
+    cellsOfFaces = np.full((nfaces, 2), -1, dtype=facesOfCells.dtype)
+    cellsOfFaces[:,0] = cells[first]
+    inner = count==2
+    cellsOfFaces[inner,1] = cells[first[inner]+1]
+    return faces, facesOfCells, cellsOfFaces
+# ----------------------------------------------------------------#
+def rowKeys(a, n=None):
+    """
+    one key per row of the integer array a (entries in [0,n)):
+    an int64 (lexicographic order is kept) if n**ncols fits, otherwise a void scalar
+    """
+    a = np.asarray(a, dtype=np.int64)
+    if a.ndim == 1: return a
+    if n is None: n = int(a.max())+1 if a.size else 1
+    if float(n)**a.shape[1] < 2**63:
+        keys = a[:,0].copy()
+        for j in range(1,a.shape[1]): keys = keys*n + a[:,j]
+        return keys
+    return np.ascontiguousarray(a).view(np.dtype((np.void, a.dtype.itemsize*a.shape[1]))).ravel()
+# ----------------------------------------------------------------#
+def matchRows(a, b):
+    """
+    for every row of a the index of the identical row in b, -1 if not found
+    (rows of b are supposed to be unique, no pairwise comparison)
+    """
+    if not len(b) or not len(a): return np.full(len(a), -1, dtype=int)
+    n = 1 + max(int(a.max()), int(b.max()))
+    ka, kb = rowKeys(a, n), rowKeys(b, n)
+    order = np.argsort(kb, kind='stable')
+    kb = kb[order]
+    pos = np.searchsorted(kb, ka)
+    pos[pos==len(kb)] = 0
+    return np.where(kb[pos] == ka, order[pos], -1)
+# ----------------------------------------------------------------#
+def localEdges(nnpc):
+    """
+    local edges (i,j), i<j, in lexicographic order
+    """
+    return np.array([[i,j] for i in range(nnpc) for j in range(i+1,nnpc)])
+# ----------------------------------------------------------------#
+def uniqueRows(a):
+    """
+    unique rows (lexicographic order) and the inverse index
+    """
+    perm = sortRows(a)
+    asorted = a[perm]
+    new = np.empty(len(perm), dtype=bool)
+    new[:1] = True
+    np.any(asorted[1:] != asorted[:-1], axis=1, out=new[1:])
+    inverse = np.empty(len(perm), dtype=a.dtype if a.dtype.kind=='i' else int)
+    inverse[perm] = np.cumsum(new)-1
+    return asorted[new], inverse
+# ----------------------------------------------------------------#
+def edgesFromSimplices(simplices):
+    """
+    edges: node ids (nedges, 2), sorted rows
+    edgesOfCells: (ncells, nedgespercell) for the local edges of localEdges()
+    """
+    ncells, nnpc = simplices.shape
+    le = localEdges(nnpc)
+    alledges = np.sort(simplices[:, le], axis=2).reshape(-1, 2)
+    edges, inverse = uniqueRows(alledges)
+    return edges, inverse.reshape(ncells, len(le))
@@ -1 +1 @@
-from . import newton, optimize, newtondata, cfd
\ No newline at end of file
+from . import newton, optimize, newtondata, cfd, direct, amg, krylov
\ No newline at end of file
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+"""
+import inspect
+import numpy as np
+from simfempy.fems import stencil
+
+# ---------------------------------------------------------------- #
+def smoothedAggregation(A, B=None, **kwargs):
+    """
+    pyamg.smoothed_aggregation_solver() remembering the smoothers (needed by refresh())
+    """
+    import pyamg
+    parameters = inspect.signature(pyamg.smoothed_aggregation_solver).parameters
+    presmoother = kwargs.get('presmoother', parameters['presmoother'].default)
+    postsmoother = kwargs.get('postsmoother', parameters['postsmoother'].default)
+    ml = pyamg.smoothed_aggregation_solver(A, B, **kwargs)
+    ml.smoothers = presmoother, postsmoother
+    return ml
+# ---------------------------------------------------------------- #
+def refresh(ml, A):
+    """
+    new finest matrix (same unknowns): the coarse matrices are recomputed as Galerkin products
+    with the prolongations and restrictions of ml, the smoothers and the coarse solver are set up again
+    """
+    from pyamg.relaxation.smoothing import change_smoothers
+    if not hasattr(ml, 'smoothers'): raise ValueError("hierarchy not built by smoothedAggregation()")
+    levels = ml.levels
+    for i, level in enumerate(levels):
+        symmetry = getattr(level.A, 'symmetry', None)
+        if i: A = levels[i-1].R * levels[i-1].A * levels[i-1].P
+        if symmetry is not None: A.symmetry = symmetry
+        # matrices in other formats are cached by the smoothers (pyamg.util.utils.matrix_asformat)
+        for name in [name for name in vars(level) if name[0] == 'A' and name not in ['A', 'AggOp']]: delattr(level, name)
+        level.A = A
+    for name in list(vars(ml.coarse_solver)): delattr(ml.coarse_solver, name)
+    change_smoothers(ml, *ml.smoothers)
+    return ml
+
+#=================================================================#
+class AmgManager(object):
+    """
+    keeps the AMG hierarchy (built by build(A)) of an operator:
+        same matrix: the hierarchy is reused
+        new values: only the Galerkin products are recomputed (refresh()), also if the pattern has changed
+        (sums of sparse matrices drop zero entries, e.g. the convection in NavierStokes)
+        new shape or iteration count (report()) larger than degrade times the one after the last build: rebuild
+    without report() (e.g. a fixed number of cycles as preconditioner in cfd.VelcoitySolver) only a new shape rebuilds
+    """
+    def __repr__(self):
+        return f"AmgManager({self.nbuild=} {self.nrefresh=} {self.nreuse=} {self.niter0=})"
+    def __init__(self, build=None, degrade=1.5):
+        self.build, self.degrade = build, degrade
+        self.ml, self.rebuild = None, False
+        self.nbuild, self.nrefresh, self.nreuse = 0, 0, 0
+    def _asformat(self, A):
+        A0 = self.ml.levels[0].A
+        if A.format != A0.format: A = A.asformat(A0.format)
+        if A.format == 'bsr' and A.blocksize != A0.blocksize: A = A.tobsr(blocksize=A0.blocksize)
+        return A
+    def _save(self):
+        A = self.ml.levels[0].A
+        self.pattern = (A.format, A.shape, getattr(A, 'blocksize', None), A.indices.copy(), A.indptr.copy())
+        self.data = A.data.copy()
+    def hierarchy(self, A, build=None):
+        if build is not None: self.build = build
+        if self.ml is not None and not self.rebuild and A.shape == self.pattern[1]:
+            A = self._asformat(A)
+            if stencil.samePattern(A, self.pattern) and np.array_equal(A.data, self.data):
+                self.nreuse += 1
+            else:
+                refresh(self.ml, A)
+                self._save()
+                self.nrefresh += 1
+            return self.ml
+        self.ml, self.rebuild, self.niter0 = self.build(A), False, None
+        self._save()
+        self.nbuild += 1
+        return self.ml
+    def report(self, niter):
+        """
+        iteration count of a solve with the current hierarchy
+        """
+        if self.niter0 is None: self.niter0 = niter
+        # small iteration counts are noisy
+        elif niter > self.degrade*max(self.niter0, 4): self.rebuild = True
@@ -3,6 +3,7 @@ import pyamg
 import scipy.sparse.linalg as splinalg
 import scipy.sparse as sparse
 from simfempy import tools
+from simfempy.solvers import amg, krylov
 
 #=================================================================#
 class VelcoitySolver():
@@ -12,10 +13,14 @@ class VelcoitySolver():
         self.smoother = kwargs.pop('smoother', 'schwarz')
         smooth = ('energy', {'krylov': 'fgmres'})
         smoother = (self.smoother, {'sweep': 'symmetric', 'iterations': self.nsmooth})
-        pyamgargs = {'B': pyamg.solver_configuration(A, verb=False)['B'], 'smooth': smooth, 'presmoother':smoother, 'postsmoother':smoother}
+        pyamgargs = {'smooth': smooth, 'presmoother':smoother, 'postsmoother':smoother}
         pyamgargs['symmetry'] = 'nonsymmetric'
         pyamgargs['coarse_solver'] = 'splu'
-        self.solver = pyamg.smoothed_aggregation_solver(A, **pyamgargs)
+        def build(A):
+            return amg.smoothedAggregation(A, pyamg.solver_configuration(A, verb=False)['B'], **pyamgargs)
+        # with an amg.AmgManager the hierarchy is kept from one matrix to the next
+        manager = kwargs.pop('amg', None)
+        self.solver = build(A) if manager is None else manager.hierarchy(A, build)
     def solve(self, b):
         return self.solver.solve(b, maxiter=self.maxiter, tol=1e-16)
 #=================================================================#
@@ -43,7 +48,7 @@ class PressureSolverSchur():
         v2 = self.AP.solve(v)
         return self.B.dot(v2)
     def solve(self, b):
-        u, info = splinalg.lgmres(self.solver, b, x0=None, M=self.M, maxiter=self.maxiter, atol=1e-12, tol=1e-10)
+        u, info = krylov.solve('lgmres', self.solver, b, 1e-10, 1e-12, x0=None, M=self.M, maxiter=self.maxiter)
         # u, info = splinalg.bicgstab(self.solver, b, x0=None, M=None, maxiter=20, atol=1e-12, tol=1e-10)
         # u, info = splinalg.gcrotmk(self.solver, b, x0=None, M=None, maxiter=self.maxiter, atol=1e-12, tol=1e-10)
         # self.counter.niter=0
@@ -65,11 +70,11 @@ class SystemSolver():
         self.M = splinalg.LinearOperator(shape=(n, n), matvec=matvecprec)
     def solve(self, b, x0):
         if self.method=='lgmres':
-            u, info = splinalg.lgmres(self.Amult, b, x0=x0, M=self.M, callback=self.counter, atol=self.atol, tol=self.rtol, inner_m=10, outer_k=4)
+            u, info = krylov.solve('lgmres', self.Amult, b, self.rtol, self.atol, x0=x0, M=self.M, callback=self.counter, inner_m=10, outer_k=4)
         elif self.method=='gmres':
-            u, info = splinalg.gmres(self.Amult, b, x0=x0, M=self.M, callback=self.counter, atol=self.atol, tol=self.rtol)
+            u, info = krylov.solve('gmres', self.Amult, b, self.rtol, self.atol, x0=x0, M=self.M, callback=self.counter)
         elif self.method=='gcrotmk':
-            u, info = splinalg.gcrotmk(self.Amult, b, x0=x0, M=self.M, callback=self.counter, atol=self.atol, tol=self.rtol, m=10, truncate='smallest')
+            u, info = krylov.solve('gcrotmk', self.Amult, b, self.rtol, self.atol, x0=x0, M=self.M, callback=self.counter, m=10, truncate='smallest')
         else:
             raise ValueError(f"unknown {self.method=}")
         if info: raise ValueError("no convergence info={}".format(info))
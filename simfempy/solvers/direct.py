@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+"""
+import os, hashlib, collections
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as splinalg
+from simfempy.fems import stencil
+
+#=================================================================#
+class Factorization(object):
+    """
+    LU factors (scipy SuperLU) of a matrix whose columns have possibly been permuted (perm)
+    """
+    def __init__(self, lu, perm=None):
+        self.lu, self.perm = lu, perm
+        # values and row indices of L and U, column pointers and permutations
+        self.nbytes = 12*lu.nnz + 32*lu.shape[0]
+    def solve(self, b):
+        y = self.lu.solve(b)
+        if self.perm is None: return y
+        x = np.empty_like(y)
+        x[self.perm] = y
+        return x
+
+#=================================================================#
+class DirectSolver(object):
+    """
+    sparse LU factorization (scipy splu) with the fill-reducing column ordering computed once per pattern:
+    the following matrices with the same pattern are permuted by index (columns perm_c) and factorized with permc_spec='NATURAL'
+    """
+    def __repr__(self):
+        return f"DirectSolver({self.permc_spec=} {self.nfactor=} {self.nsymbolic=})"
+    def __init__(self, permc_spec='COLAMD'):
+        self.permc_spec = permc_spec
+        self.pattern = None
+        self.nfactor, self.nsymbolic = 0, 0
+    def factor(self, A):
+        """
+        the Factorization of A
+        """
+        A = sparse.csc_matrix(A)
+        A.sum_duplicates()
+        self.nfactor += 1
+        if self.pattern is not None and stencil.samePattern(A, self.pattern):
+            sub = self.columns
+            Ap = sparse.csc_matrix((A.data[sub.pos], sub.indices, sub.indptr), shape=A.shape)
+            return Factorization(splinalg.splu(Ap, permc_spec='NATURAL'), self.perm)
+        self.nsymbolic += 1
+        lu = splinalg.splu(A, permc_spec=self.permc_spec)
+        self.pattern = (A.format, A.shape, None, A.indices, A.indptr)
+        self.perm = np.argsort(lu.perm_c)
+        # the columns of A are the rows of the csr matrix A.T
+        self.columns = stencil.SubStencil(A.indices, A.indptr, A.shape[::-1], self.perm)
+        return Factorization(lu)
+
+#=================================================================#
+class FactorizationCache(object):
+    """
+    Factorizations by a hash of the pattern and of the values of the matrix,
+    least recently used ones are dropped beyond maxbytes (estimated size of the factors), the last one is always kept
+    (maxbytes=0: only the last one, e.g. Newton steps or time steps with new matrices do not accumulate factors)
+    a DirectSolver per pattern keeps the column ordering: only the numeric factorization is done for new values
+    """
+    def __repr__(self):
+        return f"FactorizationCache({self.stats()})"
+    def __init__(self, maxbytes=0, permc_spec='COLAMD'):
+        self.maxbytes, self.permc_spec = maxbytes, permc_spec
+        self.factorizations, self.solvers = collections.OrderedDict(), {}
+        self.nbytes, self.hits, self.misses, self.evictions = 0, 0, 0, 0
+    def stats(self):
+        nsymbolic = sum(solver.nsymbolic for solver in self.solvers.values())
+        return {'hits': self.hits, 'misses': self.misses, 'symbolic': nsymbolic, 'evictions': self.evictions,
+                'entries': len(self.factorizations), 'nbytes': self.nbytes}
+    def clear(self):
+        self.factorizations.clear()
+        self.solvers.clear()
+        self.nbytes = 0
+    def _hash(self, *arrays):
+        h = hashlib.blake2b(digest_size=16)
+        for a in arrays: h.update(np.ascontiguousarray(a))
+        return h.digest()
+    def factor(self, A):
+        A = sparse.csc_matrix(A)
+        A.sum_duplicates()
+        patternkey = (A.shape, A.indices.dtype.str, self._hash(A.indptr, A.indices))
+        key = (patternkey, A.data.dtype.str, self._hash(A.data))
+        if key in self.factorizations:
+            self.hits += 1
+            self.factorizations.move_to_end(key)
+            return self.factorizations[key]
+        self.misses += 1
+        if patternkey not in self.solvers: self.solvers[patternkey] = DirectSolver(self.permc_spec)
+        factorization = self.solvers[patternkey].factor(A)
+        self.factorizations[key] = factorization
+        self.nbytes += factorization.nbytes
+        self.evict()
+        return factorization
+    def evict(self):
+        while self.nbytes > self.maxbytes and len(self.factorizations) > 1:
+            oldkey, old = self.factorizations.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+            if not any(k[0] == oldkey[0] for k in self.factorizations): del self.solvers[oldkey[0]]
+    def solve(self, A, b):
+        return self.factor(A).solve(b)
+
+# shared by the applications ('umf'), by default only the last factorization is kept
+# more can be kept by setCacheSize() or the environment variable SIMFEMPY_FACTORIZATIONCACHE (in MB)
+cache = FactorizationCache(int(float(os.environ.get('SIMFEMPY_FACTORIZATIONCACHE', 0))*2**20))
+def setCacheSize(maxbytes):
+    """
+    maxbytes=0 keeps only the last factorization
+    """
+    cache.maxbytes = maxbytes
+    cache.evict()
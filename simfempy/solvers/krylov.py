@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+@author: becker
+
+the Krylov methods of scipy.sparse.linalg with the relative tolerance 'rtol'
+(called 'tol' before scipy 1.12, deprecated since then)
+"""
+import inspect
+import scipy.sparse.linalg as splinalg
+
+# ---------------------------------------------------------------- #
+def solve(method, A, b, rtol, atol=0, **kwargs):
+    """
+    getattr(splinalg, method)(A, b, ...), stops if ||r|| <= max(rtol*||b||, atol)
+    returns (u, info)
+    """
+    solver = getattr(splinalg, method)
+    if 'rtol' in inspect.signature(solver).parameters: kwargs['rtol'] = rtol
+    else: kwargs['tol'] = rtol
+    return solver(A, b, atol=atol, **kwargs)
@@ -0,0 +1,81 @@
+import sys, time
+from os import path
+simfempypath = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0,simfempypath)
+import numpy as np
+import pyamg
+import simfempy.meshes.testmeshes as testmeshes
+from simfempy import fems
+from simfempy.fems import stencil, kernels, matrixfree
+
+#----------------------------------------------------------------#
+def csrStencil(femsys):
+    """
+    the former csr assembly of the system fems: interleaved dofs ncomp*i+icomp, index arrays of size ncells*(ncomp*nloc)**2
+    """
+    ncomp, nloc, ncells = femsys.ncomp, femsys.fem.nloc, femsys.mesh.ncells
+    dofs = femsys.fem.dofspercell()
+    nlocncomp = ncomp * nloc
+    rows = (np.repeat(ncomp * dofs, ncomp).reshape(ncells * nloc, ncomp) + np.arange(ncomp)).reshape(ncells, nlocncomp)
+    rows = rows.repeat(nlocncomp).reshape(ncells, nlocncomp, nlocncomp)
+    cols = rows.swapaxes(1, 2).ravel()
+    rows = rows.ravel()
+    return stencil.CsrStencil(rows, cols, ncomp*femsys.nunknowns()), rows.nbytes + cols.nbytes
+def interleaved(local):
+    """
+    block local matrices (..., ncells, nloc, nloc, ncomp, ncomp) -> (..., ncells, nloc*ncomp, nloc*ncomp)
+    """
+    s = local.shape
+    return local.swapaxes(-3, -2).reshape(*s[:-4], s[-4]*s[-1], s[-3]*s[-2])
+
+#----------------------------------------------------------------#
+def benchmarkBsr(sizes={2:[200], 3:[20]}, nrep=3, verbose=True):
+    """
+    stencil and assembly time, memory (matrix and index arrays), AMG setup time and iterations (pyamg default near-nullspace)
+    of the bsr and the former csr assembly of the elasticity matrix
+    """
+    results = {}
+    for dim, ns in sizes.items():
+        for n in ns:
+            mesh = testmeshes.structured(dim, n)
+            colors = list(mesh.bdrylabels.keys())
+            mu, lam = np.ones(mesh.ncells), 10*np.ones(mesh.ncells)
+            if verbose: print(f"{dim=} ncells={mesh.ncells}")
+            for name, femsys in [('P1sys', fems.p1sys.P1sys(ncomp=dim, mesh=mesh)), ('CR1sys', fems.cr1sys.CR1sys(ncomp=dim, mesh=mesh))]:
+                local, coeffs = femsys.localElasticity(), [lam, mu]
+                t0 = time.time()
+                csr, indexbytes = csrStencil(femsys)
+                tstencil = {'csr': time.time()-t0}
+                t0 = time.time()
+                stencil.BsrStencil(femsys.fem.stencil, (dim, dim))
+                tstencil['bsr'] = time.time()-t0
+                localcsr = interleaved(local)
+                assemble = {
+                    'csr': lambda: csr.csr(kernels.scatterScaled(csr, localcsr, coeffs)),
+                    'bsr': lambda: femsys.stencilsys.bsr(kernels.scatterScaled(femsys.stencilsys, local, coeffs)),
+                }
+                bytes = {'csr': indexbytes + csr.scatter.nbytes, 'bsr': femsys.stencilsys.scatter.nbytes + femsys.fem.stencil.scatter.nbytes}
+                res = {}
+                bdrydata = femsys.prepareBoundary(colors)
+                for key, fct in assemble.items():
+                    A = fct()
+                    t0 = time.time()
+                    for i in range(nrep): fct()
+                    tassemble = (time.time()-t0)/nrep
+                    A = femsys.matrixBoundary(A, bdrydata, 'strong')
+                    if key == 'csr': A = A.tocsr()
+                    t0 = time.time()
+                    ml = pyamg.smoothed_aggregation_solver(A, B=pyamg.solver_configuration(A, verb=False)['B'])
+                    tamg = time.time()-t0
+                    resid = []
+                    ml.solve(np.random.default_rng(0).random(A.shape[0]), tol=1e-8, maxiter=300, accel='cg', residuals=resid)
+                    res[key] = {'stencil': tstencil[key], 'assemble': tassemble, 'MB': (matrixfree.matrixBytes(A) + bytes[key])/2**20, 'amg': tamg, 'niter': len(resid)-1}
+                results[(dim, n, name)] = res
+                if verbose:
+                    for key, r in res.items():
+                        print(f"    {name:7s} {key}: stencil {r['stencil']:8.2e}s assemble {r['assemble']:8.2e}s {r['MB']:7.1f}MB amg setup {r['amg']:8.2e}s niter {r['niter']:3d}")
+    return results
+
+#================================================================#
+if __name__ == '__main__':
+    benchmarkBsr()
@@ -0,0 +1,61 @@
+import sys, time
+from os import path
+simfempypath = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0,simfempypath)
+import numpy as np
+import simfempy.meshes.testmeshes as testmeshes
+from simfempy import fems
+from simfempy.fems import matrixfree
+
+#----------------------------------------------------------------#
+def operators(mesh):
+    """
+    name -> (assembled matrix, matrix-free operator, memory of the data used by the forms)
+    """
+    dim, ncells = mesh.dimension, mesh.ncells
+    coeff, lam = np.ones(ncells), 10*np.ones(ncells)
+    p1, cr1 = fems.p1.P1(mesh=mesh), fems.cr1.CR1(mesh=mesh)
+    p1sys, cr1sys = fems.p1sys.P1sys(ncomp=dim, mesh=mesh), fems.cr1sys.CR1sys(ncomp=dim, mesh=mesh)
+    def scalar(fem):
+        form = lambda du, u: fem.computeFormDiffusion(du, u, coeff)
+        diagonal = lambda: fem.diagonalDiffusion(coeff)
+        return matrixfree.FormOperator(fem.nunknowns(), [form], [diagonal])
+    formdata = lambda fem: fem.cellgrads.nbytes + mesh.dV.nbytes + fem.dofspercell().nbytes
+    ops = {
+        'P1.diffusion': (p1.computeMatrixDiffusion(coeff), scalar(p1), formdata(p1)),
+        'CR1.diffusion': (cr1.computeMatrixDiffusion(coeff), scalar(cr1), formdata(cr1)),
+        'P1sys.elasticity': (p1sys.computeMatrixElasticity(coeff, lam), p1sys.computeOperatorElasticity(coeff, lam), formdata(p1)),
+        'CR1sys.laplace': (cr1sys.computeMatrixLaplace(coeff), cr1sys.computeOperatorLaplace(coeff), formdata(cr1)),
+    }
+    for fem in [p1, cr1, p1sys, cr1sys]: fem.localmatrices.clear()
+    return ops
+
+#----------------------------------------------------------------#
+def benchmarkMatvec(sizes={2:[400], 3:[40]}, nrep=5, verbose=True):
+    """
+    memory and time per matvec: csr versus matrix-free
+    the forms only use cellgrads, dV and dofspercell, which are stored by the fems anyway
+    """
+    results = {}
+    for dim, ns in sizes.items():
+        for n in ns:
+            mesh = testmeshes.structured(dim, n)
+            if verbose: print(f"{dim=} ncells={mesh.ncells}")
+            for name, (A, Aop, formbytes) in operators(mesh).items():
+                u = np.random.default_rng(0).random(A.shape[0])
+                if not np.allclose(A.dot(u), Aop.dot(u)): raise ValueError(f"{name=} results differ")
+                if not np.allclose(A.diagonal(), Aop.diagonal()): raise ValueError(f"{name=} diagonals differ")
+                times = []
+                for op in [A, Aop]:
+                    t0 = time.time()
+                    for i in range(nrep): op.dot(u)
+                    times.append((time.time()-t0)/nrep)
+                mem = [matrixfree.matrixBytes(A)/2**20, (Aop.nbytes()+formbytes)/2**20]
+                results[(dim, n, name)] = {'time': times, 'MB': mem}
+                if verbose:
+                    print(f"    {name:18s} n={A.shape[0]:8d} csr: {times[0]:8.2e}s {mem[0]:7.1f}MB   matrix-free: {times[1]:8.2e}s {mem[1]:7.1f}MB")
+    return results
+
+#================================================================#
+if __name__ == '__main__':
+    benchmarkMatvec()
@@ -0,0 +1,253 @@
+import sys, time, tracemalloc, tempfile, shutil, subprocess
+from os import path
+simfempypath = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0,simfempypath)
+import numpy as np
+import simfempy.meshes.testmeshes as testmeshes
+from simfempy.meshes import topology
+
+#----------------------------------------------------------------#
+def facesFromSimplicesLoop(simplices):
+    """
+    the former (loop-based) construction of SimplexMesh, kept as reference
+    """
+    ncells, nnpc = simplices.shape
+    allfaces = np.empty(shape=(nnpc*ncells,nnpc-1), dtype=int)
+    for i in range(ncells):
+        for ii in range(nnpc):
+            mask = np.array( [jj !=ii for jj in range(nnpc)] )
+            allfaces[i*nnpc+ii] = np.sort(simplices[i,mask])
+    s = "{0}" + (nnpc-2)*", {0}"
+    s = s.format(allfaces.dtype)
+    order = ["f0"]+["f{:1d}".format(i) for i in range(1,nnpc-1)]
+    if nnpc==2: perm = np.argsort(allfaces, axis=0).ravel()
+    else: perm = np.argsort(allfaces.view(s), order=order, axis=0).ravel()
+    allfacescorted = allfaces[perm]
+    faces, indices = np.unique(allfacescorted, return_inverse=True, axis=0)
+    locindex = np.tile(np.arange(0,nnpc), ncells)
+    cellindex = np.repeat(np.arange(0,ncells), nnpc)
+    nfaces = faces.shape[0]
+    cellsOfFaces = -1 * np.ones(shape=(nfaces, 2), dtype=int)
+    facesOfCells = np.zeros(shape=(ncells, nnpc), dtype=int)
+    for ii in range(indices.shape[0]):
+        f = indices[ii]
+        loc = locindex[perm[ii]]
+        cell = cellindex[perm[ii]]
+        facesOfCells[cell, loc] = f
+        if cellsOfFaces[f,0] == -1: cellsOfFaces[f,0] = cell
+        else: cellsOfFaces[f,1] = cell
+    return faces, facesOfCells, cellsOfFaces
+
+#----------------------------------------------------------------#
+def compareFaces(old, new):
+    """
+    the two cells of an interior face may come in any order in the loop version (unstable argsort)
+    """
+    if not np.array_equal(old[0], new[0]): raise ValueError(f"faces differ")
+    if not np.array_equal(old[1], new[1]): raise ValueError(f"facesOfCells differ")
+    if not np.array_equal(np.sort(old[2], axis=1), np.sort(new[2], axis=1)): raise ValueError(f"cellsOfFaces differ")
+
+#----------------------------------------------------------------#
+def benchmarkFaces(sizes={1:[1000,10000,100000], 2:[20,50,100], 3:[5,10,20]}, verbose=True):
+    results = {}
+    for dim, ns in sizes.items():
+        for n in ns:
+            simplices = testmeshes.structured(dim, n).simplices
+            t0 = time.time()
+            old = facesFromSimplicesLoop(simplices)
+            t1 = time.time()
+            new = topology.facesFromSimplices(simplices)
+            t2 = time.time()
+            compareFaces(old, new)
+            results[(dim,n)] = (len(simplices), t1-t0, t2-t1)
+            if verbose: print(f"{dim=} ncells={len(simplices):8d} loop={t1-t0:8.3f}s vectorized={t2-t1:8.4f}s speedup={(t1-t0)/(t2-t1):7.1f}")
+    return results
+
+#----------------------------------------------------------------#
+def boundaryLabelsPairwise(mesh, bdryfacesgmsh, bdrylabelsgmsh):
+    """
+    the former matching of gmsh faces by pairwise row comparison, kept as reference
+    """
+    bdryfacesgmsh = np.sort(bdryfacesgmsh)
+    bdryids = np.flatnonzero(mesh.cellsOfFaces[:,1] == -1)
+    bdryfaces = np.sort(mesh.faces[bdryids],axis=1)
+    nnpc = mesh.simplices.shape[1]
+    s = "{0}" + (nnpc-2)*", {0}"
+    dtb = s.format(bdryfacesgmsh.dtype)
+    dtf = s.format(bdryfaces.dtype)
+    order = ["f0"]+["f{:1d}".format(i) for i in range(1,nnpc-1)]
+    if nnpc==2:
+        bp = np.argsort(bdryfacesgmsh.view(dtb), axis=0).ravel()
+        fp = np.argsort(bdryfaces.view(dtf), axis=0).ravel()
+    else:
+        bp = np.argsort(bdryfacesgmsh.view(dtb), order=order, axis=0).ravel()
+        fp = np.argsort(bdryfaces.view(dtf), order=order, axis=0).ravel()
+    indices = (bdryfacesgmsh[bp, None] == bdryfaces[fp]).all(-1).any(-1)
+    if not np.all(bdryfaces[fp]==bdryfacesgmsh[bp[indices]]): raise ValueError(f"no match")
+    bp2 = bp[indices]
+    for i in range(len(fp)):
+        if not np.all(bdryfacesgmsh[bp2[i]] == bdryfaces[fp[i]]): raise ValueError(f"{i=}")
+    bpi = np.argsort(bp)
+    binv = -1*np.ones_like(bp)
+    binv[bp2] = np.arange(len(bp2))
+    bdrylabels = {}
+    for col, cb in bdrylabelsgmsh.items():
+        if indices[bpi[cb[0]]]:
+            bdrylabels[int(col)] = np.empty_like(cb)
+            for i in range(len(cb)): bdrylabels[int(col)][i] = bdryids[fp[binv[cb[i]]]]
+    return bdrylabels
+
+#----------------------------------------------------------------#
+def _gmshBoundaryData(mesh):
+    bdryfacesgmsh = np.asarray(mesh.facesdata)
+    sortedgmsh = np.sort(bdryfacesgmsh, axis=1)
+    bdrylabelsgmsh = {col: topology.matchRows(np.sort(mesh.faces[faces], axis=1), sortedgmsh) for col, faces in mesh.bdrylabels.items()}
+    return bdryfacesgmsh, bdrylabelsgmsh
+def _peak(fct, *args):
+    tracemalloc.start()
+    t0 = time.time()
+    r = fct(*args)
+    t = time.time()-t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return r, t, peak
+def benchmarkBoundaryLabels(sizes={2:[50,200,800], 3:[5,10,20,40]}, pairwise=10000, verbose=True):
+    """
+    peak memory (tracemalloc) of the boundary labelling
+    the pairwise version is only run if n_gmsh*n_bdry*dim < pairwise**2
+    """
+    results = {}
+    for dim, ns in sizes.items():
+        for n in ns:
+            mesh = testmeshes.structured(dim, n)
+            bdryfacesgmsh, bdrylabelsgmsh = _gmshBoundaryData(mesh)
+            labels = mesh.bdrylabels
+            _, t, peak = _peak(mesh._constructBoundaryFaces7, bdryfacesgmsh, bdrylabelsgmsh)
+            nb = len(bdryfacesgmsh)
+            msg = f"{dim=} nbdry={nb:8d} keys: {t:8.4f}s {peak/2**20:9.2f}MB"
+            results[(dim,n)] = {'nbdry': nb, 'keys': (t, peak)}
+            if nb*nb*dim < pairwise**2:
+                old, t, peak = _peak(boundaryLabelsPairwise, mesh, bdryfacesgmsh, bdrylabelsgmsh)
+                for col in labels:
+                    if not np.array_equal(old[col], mesh.bdrylabels[col]): raise ValueError(f"{col=}")
+                results[(dim,n)]['pairwise'] = (t, peak)
+                msg += f" pairwise: {t:8.4f}s {peak/2**20:9.2f}MB"
+            if verbose: print(msg)
+    return results
+
+#----------------------------------------------------------------#
+def benchmarkCache(sizes={2:[100,400], 3:[10,30]}, verbose=True):
+    """
+    construction of SimplexMesh without cache, with empty cache and with filled cache
+    """
+    from simfempy.meshes.simplexmesh import SimplexMesh
+    cachedir = tempfile.mkdtemp()
+    results = {}
+    try:
+        for dim, ns in sizes.items():
+            for n in ns:
+                times = []
+                for cache in [False, cachedir, cachedir]:
+                    mesh = testmeshes.structuredMeshio(dim, n)
+                    t0 = time.time()
+                    SimplexMesh(mesh=mesh, cache=cache)
+                    times.append(time.time()-t0)
+                results[(dim,n)] = times
+                if verbose: print(f"{dim=} {n=:4d} nocache={times[0]:8.4f}s save={times[1]:8.4f}s load={times[2]:8.4f}s")
+    finally:
+        shutil.rmtree(cachedir)
+    return results
+
+#----------------------------------------------------------------#
+_memoryscript = """
+import sys, resource
+sys.path.insert(0, {path!r})
+import numpy as np
+from simfempy.tools import npext
+npext.setIndexPolicy({policy!r})
+import simfempy.meshes.testmeshes as testmeshes
+from simfempy import fems
+mesh = testmeshes.structured(3, {n})
+fem = fems.p1.P1(mesh=mesh)
+A = fem.computeMatrixDiffusion(np.ones(mesh.ncells))
+femsys = fems.cr1sys.CR1sys(ncomp=3, mesh=mesh)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, fem.rows.nbytes+fem.cols.nbytes+femsys.fem.rows.nbytes+femsys.fem.cols.nbytes+femsys.stencilsys.scatter.nbytes)
+"""
+def reportIndexMemory(n=40, policies=['int64','auto'], verbose=True):
+    """
+    peak RSS (each policy in a fresh process) for a unit cube with 6*n**3 cells:
+    mesh, P1 stencil and diffusion matrix, CR1 system stencil
+    """
+    results = {}
+    for policy in policies:
+        script = _memoryscript.format(path=simfempypath, policy=policy, n=n)
+        out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout.split()
+        results[policy] = (int(out[0])/1024, int(out[1])/2**20)
+        if verbose: print(f"{policy=:6s} ncells={6*n**3} peak RSS={results[policy][0]:9.1f}MB stencils={results[policy][1]:9.1f}MB")
+    return results
+
+#----------------------------------------------------------------#
+def _assembleAndSolve(mesh, nrep=3):
+    from scipy.sparse import linalg as splinalg
+    from simfempy import fems
+    fem = fems.p1.P1(mesh=mesh)
+    coeff = np.ones(mesh.ncells)
+    t0 = time.time()
+    for i in range(nrep): A = fem.computeMatrixDiffusion(coeff) + fem.computeMassMatrix()
+    t1 = time.time()
+    b = fem.computeMassMatrix() @ np.ones(mesh.nnodes)
+    u = splinalg.spsolve(A.tocsc(), b)
+    t2 = time.time()
+    if not np.allclose(u, 1): raise ValueError(f"wrong solution")
+    A = A.tocoo()
+    return (t1-t0)/nrep, t2-t1, np.abs(A.row-A.col).max()
+def benchmarkRenumbering(sizes={2:[0.01], 3:[0.08]}, verbose=True):
+    """
+    P1 assembly (diffusion+mass) and direct solve (spsolve) in gmsh and in renumbered (rcm/morton) order
+    """
+    create = {2: testmeshes.unitsquare, 3: testmeshes.unitcube}
+    results = {}
+    for dim, hs in sizes.items():
+        for h in hs:
+            mesh = create[dim](h)
+            tgmsh = _assembleAndSolve(mesh)
+            t0 = time.time()
+            mesh.renumber()
+            tr = time.time()-t0
+            tren = _assembleAndSolve(mesh)
+            results[(dim,h)] = (mesh.nnodes, tgmsh, tren, tr)
+            if verbose:
+                print(f"{dim=} nnodes={mesh.nnodes:8d} renumber={tr:7.3f}s")
+                for name, t in [('gmsh', tgmsh), ('renumbered', tren)]:
+                    print(f"    {name:11s} assembly={t[0]:8.4f}s spsolve={t[1]:8.3f}s bandwidth={t[2]:8d}")
+    return results
+
+#----------------------------------------------------------------#
+def benchmarkLocate(sizes={2:[100,700], 3:[20,40]}, nqueries=10**6, verbose=True):
+    """
+    construction of the PointLocator and location of random points in the unit square/cube
+    """
+    rng = np.random.default_rng(0)
+    results = {}
+    for dim, ns in sizes.items():
+        for n in ns:
+            mesh = testmeshes.structured(dim, n)
+            t0 = time.time()
+            mesh.locator
+            t1 = time.time()
+            x = -1 + 2*rng.random((nqueries, 3))
+            cells, lam = mesh.locate(x)
+            t2 = time.time()
+            if np.any(cells < 0): raise ValueError(f"points not found")
+            results[(dim,n)] = (mesh.ncells, t1-t0, t2-t1)
+            if verbose: print(f"{dim=} ncells={mesh.ncells:8d} build={t1-t0:7.3f}s queries/s={nqueries/(t2-t1):10.3g}")
+    return results
+
+#================================================================#
+if __name__ == '__main__':
+    benchmarkFaces()
+    benchmarkBoundaryLabels()
+    benchmarkCache()
+    reportIndexMemory()
+    benchmarkRenumbering()
+    benchmarkLocate()
@@ -0,0 +1,73 @@
+import sys, time
+from os import path
+simfempypath = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0,simfempypath)
+import numpy as np
+import simfempy.meshes.testmeshes as testmeshes
+from simfempy import fems
+from simfempy.tools import npext
+
+#----------------------------------------------------------------#
+def callSites(mesh):
+    """
+    the scatter-add call sites of the fems: name -> function returning the result
+    """
+    rng = np.random.default_rng(0)
+    dim, nnodes, nfaces, ncells = mesh.dimension, mesh.nnodes, mesh.nfaces, mesh.ncells
+    p1, cr1, d0 = fems.p1.P1(mesh=mesh), fems.cr1.CR1(mesh=mesh), fems.d0.D0(mesh=mesh)
+    cr1sys = fems.cr1sys.CR1sys(ncomp=dim, mesh=mesh)
+    un, uf, uc, uv = rng.random(nnodes), rng.random(nfaces), rng.random(ncells), rng.random(dim*nfaces)
+    coeff, colors = np.ones(ncells), list(mesh.bdrylabels.keys())
+    def form(fct, n, *args):
+        du = np.zeros(n)
+        fct(du, *args)
+        return du
+    def divgrad():
+        dv, dp = np.zeros(dim*nfaces), np.zeros(ncells)
+        cr1sys.computeFormDivGrad(dv, dp, uv, uc)
+        return dv
+    return {
+        'P1.massDot': lambda: form(p1.massDot, nnodes, un),
+        'P1.massDotCell': lambda: form(p1.massDotCell, nnodes, uc),
+        'P1.massDotBoundary': lambda: form(p1.massDotBoundary, nnodes, un),
+        'P1.computeFormDiffusion': lambda: form(p1.computeFormDiffusion, nnodes, un, coeff),
+        'P1.computeFormNitscheDiffusion': lambda: form(p1.computeFormNitscheDiffusion, nnodes, un, coeff, colors),
+        'CR1.massDot': lambda: form(cr1.massDot, nfaces, uf),
+        'CR1.massDotBoundary': lambda: form(cr1.massDotBoundary, nfaces, uf),
+        'CR1.computeFormDiffusion': lambda: form(cr1.computeFormDiffusion, nfaces, uf, coeff),
+        'CR1.computeFormNitscheDiffusion': lambda: form(cr1.computeFormNitscheDiffusion, nfaces, uf, coeff, colors),
+        'CR1.tonode': lambda: cr1.tonode(uf),
+        'D0.tonode': lambda: d0.tonode(uc),
+        'CR1sys.computeFormDivGrad': divgrad,
+        'CR1sys.computeFormLaplace': lambda: form(lambda dv, v: cr1sys.computeFormLaplace(coeff, dv, v), dim*nfaces, uv),
+    }
+
+#----------------------------------------------------------------#
+def benchmarkCallSites(sizes={2:[300], 3:[30]}, methods=['numpy', 'auto'], nrep=3, verbose=True):
+    """
+    time of every call site with np.add.at ('numpy') and npext.addAt ('auto')
+    """
+    results = {}
+    try:
+        for dim, ns in sizes.items():
+            for n in ns:
+                mesh = testmeshes.structured(dim, n)
+                if verbose: print(f"{dim=} ncells={mesh.ncells} " + " ".join(f"{m:>10s}" for m in methods))
+                for name, fct in callSites(mesh).items():
+                    times, values = [], []
+                    for method in methods:
+                        npext.setScatterMethod(method)
+                        values.append(fct())
+                        t0 = time.time()
+                        for i in range(nrep): fct()
+                        times.append((time.time()-t0)/nrep)
+                    if not np.allclose(values[0], values[-1]): raise ValueError(f"{name=} results differ")
+                    results[(dim, n, name)] = times
+                    if verbose: print(f"    {name:32s}" + " ".join(f"{t:10.2e}" for t in times) + f" speedup={times[0]/times[-1]:6.1f}")
+    finally:
+        npext.setScatterMethod('auto')
+    return results
+
+#================================================================#
+if __name__ == '__main__':
+    benchmarkCallSites()
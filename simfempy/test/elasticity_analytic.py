@@ -34,6 +34,8 @@ def test(dim, **kwargs):
     data.postproc.set(name='bdrynflux', type='bdry_nflux', colors=colordir)
     linearsolver = kwargs.pop('linearsolver', 'pyamg')
     applicationargs= {'problemdata': data, 'exactsolution': exactsolution, 'linearsolver': linearsolver}
+    # matrix-free operators (fems.matrixfree), iterative solvers only
+    applicationargs['matrixfree'] = kwargs.pop('matrixfree', False)
     return test_analytic(application=Elasticity, createMesh=createMesh, paramargs=paramargs, applicationargs=applicationargs, **kwargs)
 
 
@@ -41,6 +41,8 @@ def test(dim, **kwargs):
     data.postproc.set(name='bdrynflux', type='bdry_nflux', colors=colorsdir[0])
     linearsolver = kwargs.pop('linearsolver', 'pyamg')
     applicationargs= {'problemdata': data, 'exactsolution': exactsolution, 'linearsolver': linearsolver, 'masslumpedbdry':False}
+    # matrix-free operators (fems.matrixfree), iterative solvers only
+    applicationargs['matrixfree'] = kwargs.pop('matrixfree', False)
     # applicationargs['mode'] = 'newton'
     return test_analytic(application=Heat, createMesh=createMesh, paramargs=paramargs, applicationargs=applicationargs, **kwargs)
 
@@ -42,6 +42,8 @@ def test(dim, **kwargs):
     data.postproc.set(name='bdrynflux', type='bdry_nflux', colors=colordir)
     linearsolver = kwargs.pop('linearsolver', 'iter')
     applicationargs= {'problemdata': data, 'exactsolution': exactsolution, 'linearsolver': linearsolver}
+    # matrix-free operators (fems.matrixfree), iterative solvers only
+    applicationargs['matrixfree'] = kwargs.pop('matrixfree', False)
     # applicationargs['mode'] = 'newton'
     return test_analytic(application=Stokes, createMesh=createMesh, paramargs=paramargs, applicationargs=applicationargs, **kwargs)
 
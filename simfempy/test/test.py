@@ -1,5 +1,9 @@
 import unittest
 import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
 
 #================================================================#
 class TestAnalytical(unittest.TestCase):
@@ -51,6 +55,818 @@ class TestAnalytical(unittest.TestCase):
 #         from flow.stokes import test_analytic
 #         self._check(test_analytic(exactsolution = 'Linear', geomname = "unitcube", verbose=0))
 
+#================================================================#
+class TestKernels(unittest.TestCase):
+    def _matrices(self, mesh):
+        from simfempy import fems
+        dim, ncells = mesh.dimension, mesh.ncells
+        rng = np.random.default_rng(0)
+        mu, lam, beta, mus = rng.random(ncells), rng.random(ncells), rng.random((ncells, dim)), rng.random((ncells, dim+1))
+        p1, cr1 = fems.p1.P1(mesh=mesh), fems.cr1.CR1(mesh=mesh)
+        p1sys, cr1sys = fems.p1sys.P1sys(ncomp=dim, mesh=mesh), fems.cr1sys.CR1sys(ncomp=dim, mesh=mesh)
+        cellgrads = p1.cellgrads[:, :, :dim]
+        return {
+            'P1.diffusion': p1.computeMatrixDiffusion(mu), 'CR1.diffusion': cr1.computeMatrixDiffusion(mu),
+            'P1.mass': p1.computeMassMatrix(mu),
+            'P1sys.elasticity': p1sys.computeMatrixElasticity(mu, lam), 'CR1sys.elasticity': cr1sys.computeMatrixElasticity(mu, lam),
+            'transport': p1.stencil.csr(fems.kernels.transport(p1.stencil, cellgrads, beta, mesh.dV, mus)),
+            'navier': fems.kernels.localNavier(mu, mesh.normals[mesh.facesOfCells[:, 0], :dim], cellgrads, beta),
+        }
+    @unittest.skipIf(numba is None, "numba is not installed")
+    def test_numba(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy.fems import kernels
+        for dim in [2, 3]:
+            mesh = testmeshes.structured(dim, 4)
+            try:
+                kernels.setBackend('numpy')
+                ref = self._matrices(mesh)
+                kernels.setBackend('numba')
+                res = self._matrices(mesh)
+            finally:
+                kernels.setBackend('auto')
+            for name, A in ref.items():
+                B = res[name]
+                if hasattr(A, 'indices'):
+                    self.assertTrue(np.array_equal(A.indptr, B.indptr) and np.array_equal(A.indices, B.indices), f"{name=} {dim=}")
+                    A, B = A.data, B.data
+                self.assertTrue(np.allclose(A, B, rtol=1e-13, atol=1e-15*np.abs(A).max()), f"{name=} {dim=}")
+
+#================================================================#
+class TestStencil(unittest.TestCase):
+    """
+    the stencils of fems.stencil against coo matrices converted to csr
+    """
+    def _fems(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy import fems
+        for dim in [2, 3]:
+            mesh = testmeshes.structured(dim, 3)
+            yield fems.p1.P1(mesh=mesh)
+            yield fems.cr1.CR1(mesh=mesh)
+    def _reference(self, rows, cols, values, shape):
+        import scipy.sparse as sparse
+        A = sparse.coo_matrix((np.ravel(values), (np.ravel(rows), np.ravel(cols))), shape=shape).tocsr()
+        A.sum_duplicates()
+        return A
+    def _assertEqual(self, A, ref, msg=""):
+        import scipy.sparse as sparse
+        A = sparse.csr_matrix(A)
+        self.assertEqual(A.shape, ref.shape, msg)
+        self.assertTrue(np.array_equal(A.indptr, ref.indptr) and np.array_equal(A.indices, ref.indices), msg)
+        self.assertTrue(np.allclose(A.data, ref.data, rtol=1e-14, atol=0), msg)
+    def test_csr(self):
+        from simfempy.fems import stencil
+        rng = np.random.default_rng(0)
+        for fem in self._fems():
+            n, msg = fem.nunknowns(), f"{fem=} {fem.mesh.dimension=}"
+            values = rng.random((fem.mesh.ncells, fem.nloc, fem.nloc))
+            ref = self._reference(fem.rows, fem.cols, values, (n, n))
+            A = fem.stencil.matrix(values)
+            self.assertTrue(A.has_sorted_indices)
+            self._assertEqual(A, ref, msg)
+            for M in [A, A.tocsc(), A.tobsr(blocksize=(1, 1))]:
+                rows, cols = stencil.entries(M)
+                self.assertTrue(np.allclose(ref[rows, cols].A1, M.data.ravel(), rtol=1e-14, atol=0), msg)
+        # rectangular
+        rows, cols = rng.integers(0, 7, 50), rng.integers(0, 11, 50)
+        values = rng.random(50)
+        self._assertEqual(stencil.CsrStencil(rows, cols, 7, 11).matrix(values), self._reference(rows, cols, values, (7, 11)))
+    def _systemIndices(self, ind, ncomp, axis):
+        # local entries (..., i, j, icomp, jcomp): dof icomp of the scalar dof i is ncomp*i+icomp
+        ind = ncomp*np.asarray(ind)[..., np.newaxis, np.newaxis]
+        return ind + (np.arange(ncomp)[:, np.newaxis] if axis == 0 else np.arange(ncomp))
+    def test_bsr(self):
+        from simfempy.fems import stencil
+        rng = np.random.default_rng(0)
+        for fem in self._fems():
+            ncomp, n, msg = fem.mesh.dimension, fem.nunknowns(), f"{fem=} {fem.mesh.dimension=}"
+            shape = (fem.mesh.ncells, fem.nloc, fem.nloc, ncomp, ncomp)
+            values = rng.random(shape)
+            rows = self._systemIndices(fem.rows.reshape(shape[:3]), ncomp, 0)
+            cols = self._systemIndices(fem.cols.reshape(shape[:3]), ncomp, 1)
+            ref = self._reference(np.broadcast_to(rows, shape), np.broadcast_to(cols, shape), values, (ncomp*n, ncomp*n))
+            A = stencil.BsrStencil(fem.stencil, (ncomp, ncomp)).matrix(values)
+            self.assertEqual((A.format, A.blocksize), ('bsr', (ncomp, ncomp)))
+            self._assertEqual(A, ref, msg)
+    def test_face(self):
+        import scipy.sparse as sparse
+        from simfempy.fems import stencil
+        rng = np.random.default_rng(0)
+        for fem in self._fems():
+            ncomp, n, nloc, msg = fem.mesh.dimension, fem.nunknowns(), fem.nloc, f"{fem=} {fem.mesh.dimension=}"
+            facestencil, ci = fem.faceStencil(), fem.mesh.cellsOfInteriorFaces
+            # local face entries (face, a, b, i, j): row dofspercell[ci[f,a],i], column dofspercell[ci[f,b],j]
+            shape = (len(ci), 2, 2, nloc, nloc)
+            dofs = fem.dofspercell()[ci]
+            rows = np.broadcast_to(dofs[:, :, np.newaxis, :, np.newaxis], shape)
+            cols = np.broadcast_to(dofs[:, np.newaxis, :, np.newaxis, :], shape)
+            values, cellvalues = rng.random(shape), rng.random((fem.mesh.ncells, nloc, nloc))
+            ref = self._reference(rows, cols, values, (n, n))
+            self._assertEqual(facestencil.csr(facestencil.data(values)), ref, msg)
+            # with the matrix of the cell stencil
+            celldata = fem.stencil.data(cellvalues)
+            ref = self._reference(np.concatenate((rows.ravel(), fem.rows)), np.concatenate((cols.ravel(), fem.cols)), np.concatenate((values.ravel(), cellvalues.ravel())), (n, n))
+            self._assertEqual(facestencil.csr(facestencil.data(values), celldata), ref, msg)
+            # systems: blocks values*Id(ncomp) and a bsr matrix of the cell stencil
+            bsrstencil = stencil.BsrStencil(fem.stencil, (ncomp, ncomp))
+            cellvalues = rng.random((fem.mesh.ncells, nloc, nloc, ncomp, ncomp))
+            A = facestencil.bsr(facestencil.data(values), ncomp, bsrstencil.data(cellvalues))
+            self.assertEqual((A.format, A.blocksize), ('bsr', (ncomp, ncomp)))
+            # the blocks of the faces are stored in full
+            ref = sparse.kron(self._reference(rows, cols, values, (n, n)), np.eye(ncomp)) + bsrstencil.matrix(cellvalues)
+            self.assertTrue(np.allclose(A.toarray(), ref.toarray(), rtol=1e-14, atol=0), msg)
+    def _matrices(self, fem, rng):
+        from simfempy.fems import stencil
+        ncomp, nloc, ncells = fem.mesh.dimension, fem.nloc, fem.mesh.ncells
+        bsrstencil = stencil.BsrStencil(fem.stencil, (ncomp, ncomp))
+        return [(fem.stencil.matrix(rng.random((ncells, nloc, nloc))), 1), (bsrstencil.matrix(rng.random((ncells, nloc, nloc, ncomp, ncomp))), ncomp)]
+    def test_dirichlet(self):
+        from simfempy.fems import stencil
+        rng = np.random.default_rng(0)
+        for fem in self._fems():
+            n = fem.nunknowns()
+            dirall = np.sort(rng.choice(n, n//3, replace=False))
+            inner = np.setdiff1d(np.arange(n), dirall)
+            dirflux = {1: dirall[:3], 2: dirall[-4:]}
+            for A, ncomp in self._matrices(fem, rng):
+                msg = f"{fem=} {fem.mesh.dimension=} {ncomp=}"
+                ind = lambda i: (ncomp*np.asarray(i)[:, np.newaxis] + np.arange(ncomp)).ravel()
+                dense = A.toarray()
+                # sub-matrices
+                rows = rng.permutation(n)[:n//2]
+                for r, c in [(rows, None), (rows, dirall[::-1]), (inner, dirall)]:
+                    sub = stencil.SubStencil(A.indices, A.indptr, (n, n), r, c).matrix(A)
+                    ref = dense[ind(r)] if c is None else dense[ind(r)][:, ind(c)]
+                    self.assertTrue(np.array_equal(sub.toarray(), ref), msg)
+                # Dirichlet conditions
+                dirichlet = stencil.DirichletStencil(A, dirall, inner, dirflux)
+                self.assertTrue(dirichlet.fits(A.copy()) and not dirichlet.fits(dirichlet.matrix(A, 'strong')))
+                isdir = np.zeros(ncomp*n, dtype=bool)
+                isdir[ind(dirall)] = True
+                rowdir, coldir = isdir[:, np.newaxis], isdir[np.newaxis, :]
+                for method in ['strong', 'new']:
+                    for symmetric in [False, True]:
+                        if method == 'strong':
+                            ref = np.where(rowdir, 0, dense)
+                            if symmetric: ref[:, isdir] = 0
+                            ref[isdir, isdir] = 1
+                        else:
+                            ref = np.where(rowdir & ~coldir, 0, dense)
+                            ref[isdir] *= 2.5
+                            if symmetric: ref[~isdir[:, np.newaxis] & coldir] = 0
+                        res = dirichlet.matrix(A, method, symmetric, scale=2.5)
+                        self.assertEqual(res.format, A.format)
+                        self.assertTrue(np.array_equal(res.toarray(), ref), f"{msg} {method=} {symmetric=}")
+                self.assertTrue(np.array_equal(dirichlet.dir_dir.matrix(A).toarray(), dense[ind(dirall)][:, ind(dirall)]))
+                self.assertTrue(np.array_equal(dirichlet.flux[2].matrix(A).toarray(), dense[ind(dirflux[2])]))
+    def test_block(self):
+        import scipy.sparse as sparse
+        from simfempy.fems import stencil
+        rng = np.random.default_rng(0)
+        for fem in self._fems():
+            (A, _), (Asys, ncomp) = self._matrices(fem, rng)
+            n, ncells = fem.nunknowns(), fem.mesh.ncells
+            B = sparse.random(ncells, ncomp*n, density=0.1, format='csr', random_state=0)
+            C = sparse.random(1, ncells, density=1, format='csr', random_state=1)
+            for blocks in [[[A, None], [None, A]], [[Asys, B.T, None], [B, None, C.T], [None, C, None]]]:
+                ref = sparse.bmat(blocks, format='csr')
+                for format in ['csr', 'csc']:
+                    blockstencil = stencil.BlockStencil(blocks, format=format)
+                    res = blockstencil.matrix(blocks)
+                    self.assertEqual(res.format, format)
+                    self.assertTrue(np.allclose(res.toarray(), ref.toarray(), rtol=1e-14, atol=0))
+                    # new values on the same patterns
+                    self.assertTrue(blockstencil.fits(blocks))
+                    blocks2 = [[None if M is None else M.copy() for M in row] for row in blocks]
+                    blocks2[0][0].data *= 2
+                    self.assertTrue(blockstencil.fits(blocks2))
+                    self.assertTrue(np.allclose(blockstencil.matrix(blocks2).toarray(), sparse.bmat(blocks2).toarray(), rtol=1e-14, atol=0))
+                    blocks2[0][0] = blocks2[0][0] + sparse.eye(blocks2[0][0].shape[0], k=1, format=blocks2[0][0].format)
+                    self.assertFalse(blockstencil.fits(blocks2))
+            self.assertRaises(ValueError, stencil.BlockStencil, [[A, B.T]])
+            self.assertRaises(ValueError, stencil.BlockStencil, [[A]], format='coo')
+    def test_localMatrixCache(self):
+        import gc
+        from simfempy.fems import stencil
+        Cache = stencil.LocalMatrixCache
+        maxbytes, ncompute = Cache.maxbytes, []
+        def compute(name):
+            def _compute():
+                ncompute.append(name)
+                return np.zeros(100)
+            return _compute
+        try:
+            stencil.setLocalMatrixCacheSize(0)
+            self.assertEqual(len(Cache.entries), 0)
+            # the budget (two arrays of 800 bytes) is shared by the instances
+            stencil.setLocalMatrixCacheSize(2000)
+            a, b = Cache(), Cache()
+            a.get('x', compute('ax'))
+            b.get('x', compute('bx'))
+            self.assertIs(a.get('x', compute('ax')), a.get('x', compute('ax')))
+            self.assertEqual(ncompute, ['ax', 'bx'])
+            # least recently used: b.x
+            a.get('y', compute('ay'))
+            self.assertEqual((list(a.data), list(b.data)), (['x', 'y'], []))
+            self.assertEqual(Cache.totalbytes(), 1600)
+            b.get('x', compute('bx'))
+            self.assertEqual((list(a.data), list(b.data)), (['y'], ['x']))
+            self.assertEqual(ncompute, ['ax', 'bx', 'ay', 'bx'])
+            # too large: not stored
+            b.get('z', lambda: np.zeros(1000))
+            self.assertEqual(list(b.data), ['x'])
+            # deleted instances and clear() release their part of the budget
+            del b
+            gc.collect()
+            self.assertEqual(Cache.totalbytes(), 800)
+            a.clear()
+            self.assertEqual((Cache.totalbytes(), a.data), (0, {}))
+            a.get('x', compute('ax'))
+            stencil.setLocalMatrixCacheSize(500)
+            self.assertEqual((Cache.totalbytes(), a.data), (0, {}))
+        finally:
+            stencil.setLocalMatrixCacheSize(maxbytes)
+
+#================================================================#
+class TestMeshes(unittest.TestCase):
+    def _meshes(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        return [testmeshes.unitsquare(0.5), testmeshes.unitcube(0.7)]
+    def test_refine(self):
+        for mesh in self._meshes():
+            dim, fine = mesh.dimension, mesh.refine()
+            self.assertEqual(fine.ncells, 2**dim*mesh.ncells)
+            self.assertTrue(np.allclose(np.bincount(fine.parentcells, weights=fine.dV), mesh.dV, rtol=1e-13))
+            self.assertEqual(fine.cellsoflabel.keys(), mesh.cellsoflabel.keys())
+            for color, cells in mesh.cellsoflabel.items():
+                self.assertTrue(np.isclose(fine.dV[fine.cellsoflabel[color]].sum(), mesh.dV[cells].sum(), rtol=1e-13))
+            # the sides of the unit square (cube) are planar: same unit normal and same measure
+            self.assertEqual(fine.bdrylabels.keys(), mesh.bdrylabels.keys())
+            for color, faces in mesh.bdrylabels.items():
+                ffaces = fine.bdrylabels[color]
+                self.assertEqual(len(ffaces), 2**(dim-1)*len(faces))
+                self.assertTrue(np.all(fine.cellsOfFaces[ffaces, 1] < 0))
+                dS, fdS = np.linalg.norm(mesh.normals[faces], axis=1), np.linalg.norm(fine.normals[ffaces], axis=1)
+                self.assertTrue(np.isclose(fdS.sum(), dS.sum(), rtol=1e-13))
+                n, fn = np.abs(mesh.normals[faces]/dS[:,np.newaxis]), np.abs(fine.normals[ffaces]/fdS[:,np.newaxis])
+                self.assertTrue(np.allclose(fn, n[0]) and np.allclose(n, n[0]))
+            # the prolongations are exact for linear functions
+            linear = lambda x: 1 + x[:,0] - 2*x[:,1] + 3*x[:,2]
+            P = fine.prolongation('p1')
+            self.assertTrue(np.allclose(P @ linear(mesh.points), linear(fine.points), rtol=1e-13))
+            P = fine.prolongation('cr1')
+            self.assertTrue(np.allclose(P @ linear(mesh.pointsf), linear(fine.pointsf), rtol=1e-13))
+            P = fine.prolongation('d0')
+            self.assertTrue(np.array_equal(P @ np.arange(mesh.ncells), fine.parentcells))
+    def test_locate(self):
+        rng = np.random.default_rng(0)
+        for mesh in self._meshes():
+            dim = mesh.dimension
+            # the meshes cover [-1,1]**dim
+            inside = 2*rng.random((200, dim)) - 1
+            outside = inside + np.where(rng.random((200, dim)) < 0.5, -2.01, 2.01)
+            cells, lam = mesh.locate(np.concatenate((inside, outside, mesh.points[:, :dim])))
+            n = 2*len(inside)
+            self.assertTrue(np.all(cells[:len(inside)] >= 0) and np.all(cells[n:] >= 0))
+            self.assertTrue(np.all(cells[len(inside):n] == -1) and np.all(np.isnan(lam[len(inside):n])))
+            ok = cells >= 0
+            self.assertTrue(np.allclose(lam[ok].sum(axis=1), 1) and np.all(lam[ok] >= -1e-10))
+            x = np.einsum('nk,nki->ni', lam[ok], mesh.points[mesh.simplices[cells[ok]]][:, :, :dim])
+            self.assertTrue(np.allclose(x, np.concatenate((inside, mesh.points[:, :dim])), atol=1e-12))
+    def _heat(self, mesh, fem, dirichletmethod):
+        import simfempy.applications.problemdata
+        from simfempy.applications.heat import Heat
+        data = simfempy.applications.problemdata.ProblemData()
+        colors = list(mesh.bdrylabels.keys())
+        data.bdrycond.set("Dirichlet", colors[1:])
+        data.bdrycond.set("Neumann", colors[:1])
+        data.params.scal_glob['kheat'] = 0.1
+        heat = Heat(problemdata=data, exactsolution='Quadratic', fem=fem, dirichletmethod=dirichletmethod, mesh=mesh)
+        return heat.static().data
+    def test_renumber(self):
+        import copy
+        for mesh in self._meshes():
+            renumbered = copy.deepcopy(mesh)
+            renumbered.renumber()
+            self.assertFalse(np.array_equal(renumbered.simplices, mesh.simplices))
+            self.assertTrue(np.array_equal(renumbered.toOriginal(renumbered.points), mesh.points))
+            for fem, dirichletmethod in [('p1', 'strong'), ('cr1', 'new')]:
+                ref, res = self._heat(mesh, fem, dirichletmethod), self._heat(renumbered, fem, dirichletmethod)
+                self.assertTrue(np.allclose(renumbered.toOriginal(res['point']['U']), ref['point']['U'], rtol=1e-10, atol=1e-12))
+                self.assertTrue(np.allclose(renumbered.toOriginal(res['cell']['err'], 'cells'), ref['cell']['err'], rtol=1e-8, atol=1e-14))
+                for name in ref['global']:
+                    self.assertTrue(np.allclose(res['global'][name], ref['global'][name], rtol=1e-8, atol=1e-14), f"{name=}")
+    def _assertSameMesh(self, mesh, ref, names):
+        for name in names:
+            a, b = getattr(mesh, name), getattr(ref, name)
+            if isinstance(b, dict):
+                self.assertEqual(a.keys(), b.keys(), f"{name=}")
+                for color in b: self.assertTrue(np.array_equal(a[color], b[color]), f"{name=} {color=}")
+            else:
+                self.assertTrue(np.array_equal(a, b), f"{name=}")
+    def test_cache(self):
+        import copy, os, tempfile
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy.meshes.simplexmesh import SimplexMesh
+        names = SimplexMesh._cachednames
+        ref = testmeshes.structured(3, 4, cache=False)
+        with tempfile.TemporaryDirectory() as dirname:
+            first = testmeshes.structured(3, 4, cache=dirname)
+            self.assertEqual((first.cache.hits, first.cache.misses), (0, 1))
+            mesh = testmeshes.structured(3, 4, cache=dirname)
+            self.assertEqual((mesh.cache.hits, mesh.cache.misses), (1, 0))
+            # read-only memory maps, equal to the arrays built without cache
+            self.assertIsInstance(mesh.faces, np.memmap)
+            self.assertFalse(mesh.faces.flags.writeable or mesh.bdrylabels[100].flags.writeable)
+            self._assertSameMesh(mesh, ref, names + ['nfaces', 'pointsc', 'pointsf', 'innerfaces'])
+            self._assertSameMesh(first, ref, names)
+            self.assertEqual(len(os.listdir(dirname)), 1)
+            # renumber() and refine() on the memory maps
+            fine, fineref = mesh.refine(), ref.refine()
+            self._assertSameMesh(fine, fineref, names + ['points', 'simplices', 'parentcells'])
+            renumbered, renumberedref = copy.deepcopy(mesh), copy.deepcopy(ref)
+            renumbered.renumber()
+            renumberedref.renumber()
+            self._assertSameMesh(renumbered, renumberedref, names + ['points', 'simplices'])
+            # other points: other key
+            entries = set(os.listdir(dirname))
+            data = testmeshes.structuredMeshio(3, 4)
+            data.points *= 2
+            scaled = SimplexMesh(mesh=data, cache=dirname)
+            self.assertEqual((scaled.cache.hits, scaled.cache.misses), (0, 1))
+            self.assertTrue(np.allclose(scaled.dV, 8*ref.dV, rtol=1e-14))
+            self.assertEqual(len(set(os.listdir(dirname)) - entries), 1)
+            scaled.cache.clear()
+            self.assertEqual(os.listdir(dirname), [])
+            mesh = testmeshes.structured(3, 4, cache=dirname)
+            self.assertEqual((mesh.cache.hits, mesh.cache.misses), (0, 1))
+            self._assertSameMesh(mesh, ref, names)
+
+#================================================================#
+class TestBoundary(unittest.TestCase):
+    """
+    Dirichlet conditions on the data arrays (stencil.DirichletStencil) against products with diagonal matrices
+    """
+    def _reference(self, A, dirall, inner, dirflux, method, scale, ncomp):
+        import scipy.sparse as sparse
+        ind = lambda i: (ncomp*np.asarray(i)[:, np.newaxis] + np.arange(ncomp)).ravel()
+        A = sparse.csr_matrix(A)
+        n, inddir = A.shape[0], ind(dirall)
+        ref = {'Asaved': {color: A[ind(i)] for color, i in dirflux.items()}, 'A_inner_dir': A[ind(inner)][:, inddir]}
+        isdir = np.zeros(n)
+        isdir[inddir] = 1
+        D0, D1 = sparse.dia_matrix((1-isdir, 0), shape=(n, n)), sparse.dia_matrix((isdir, 0), shape=(n, n))
+        # scalar fems keep the couplings of the inner dofs to the Dirichlet dofs
+        Ain = D0 @ A if ncomp == 1 else D0 @ A @ D0
+        if method == 'strong':
+            ref['A'] = Ain + D1
+        else:
+            ref['A_dir_dir'] = scale*A[inddir][:, inddir]
+            ref['A'] = Ain + scale*(D1 @ A @ D1)
+        return ref
+    def _compare(self, fem, A, method, name):
+        import scipy.sparse as sparse
+        ncomp = getattr(fem, 'ncomp', 1)
+        femscalar = getattr(fem, 'fem', fem)
+        colors = list(fem.mesh.bdrylabels.keys())
+        bdrydata = fem.prepareBoundary(colors[:2], colors[1:3])
+        if hasattr(bdrydata, 'nodedirall'): dirall, inner, dirflux = bdrydata.nodedirall, bdrydata.nodesinner, bdrydata.nodesdirflux
+        else: dirall, inner, dirflux = bdrydata.facesdirall, bdrydata.facesinner, bdrydata.facesdirflux
+        scale = femscalar.dirichlet_al if ncomp == 1 else 1
+        dense = lambda M: M.toarray() if sparse.issparse(M) else M
+        # new values on the same pattern: the stencil is reused, a new pattern: it is recomputed
+        i, j = inner[0], next(j for j in dirall[::-1] if sparse.csr_matrix(A)[ncomp*inner[0], ncomp*j] == 0)
+        E = sparse.coo_matrix(([1.0], ([ncomp*i], [ncomp*j])), shape=A.shape)
+        stencils = []
+        for M in [A, 2*A, sparse.csr_matrix(A) + E]:
+            Mcopy = dense(M).copy()
+            res = fem.matrixBoundary(M, bdrydata, method)
+            stencils.append(bdrydata.dirichletstencil)
+            self.assertTrue(np.array_equal(dense(M), Mcopy), f"{name=} {method=}: input changed")
+            ref = self._reference(M, dirall, inner, dirflux, method, scale, ncomp)
+            self.assertTrue(np.allclose(dense(res), dense(ref['A']), rtol=1e-14, atol=0), f"{name=} {method=}")
+            for key in ['A_inner_dir', 'A_dir_dir']:
+                if key in ref:
+                    self.assertTrue(np.array_equal(dense(getattr(bdrydata, key)), dense(ref[key])), f"{name=} {method=} {key=}")
+            for color, Asaved in ref['Asaved'].items():
+                self.assertTrue(np.array_equal(dense(bdrydata.Asaved[color]), dense(Asaved)), f"{name=} {method=} {color=}")
+        self.assertIs(stencils[0], stencils[1])
+        self.assertIsNot(stencils[1], stencils[2])
+    def test_matrixBoundary(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy import fems
+        for mesh in [testmeshes.unitsquare(0.5), testmeshes.unitcube(0.7)]:
+            dim, ncells = mesh.dimension, mesh.ncells
+            mu, lam = np.linspace(1, 2, ncells), np.linspace(2, 1, ncells)
+            p1, cr1 = fems.p1.P1(mesh=mesh), fems.cr1.CR1(mesh=mesh)
+            p1sys, cr1sys = fems.p1sys.P1sys(ncomp=dim, mesh=mesh), fems.cr1sys.CR1sys(ncomp=dim, mesh=mesh)
+            # scaling of the Dirichlet block of 'new' (default 1)
+            p1.dirichlet_al = cr1.dirichlet_al = 2.5
+            for method in ['strong', 'new']:
+                self._compare(p1, p1.computeMatrixDiffusion(mu), method, 'P1')
+                self._compare(cr1, cr1.computeMatrixDiffusion(mu), method, 'CR1')
+                self._compare(p1sys, p1sys.computeMatrixElasticity(mu, lam), method, 'P1sys')
+                self._compare(cr1sys, cr1sys.computeMatrixElasticity(mu, lam), method, 'CR1sys')
+
+#================================================================#
+class TestBatch(unittest.TestCase):
+    """
+    Heat.staticBatch() against separate static() solves
+    """
+    def _problemdata(self, a, rhs=True):
+        import simfempy.applications.problemdata
+        data = simfempy.applications.problemdata.ProblemData()
+        data.bdrycond.set("Dirichlet", [1000, 1003])
+        data.bdrycond.set("Neumann", [1001])
+        data.bdrycond.set("Robin", [1002])
+        data.bdrycond.param[1002] = 2.
+        data.bdrycond.fct[1000] = lambda x, y, z: a*x
+        data.bdrycond.fct[1003] = lambda x, y, z: 1 + a + 0*x
+        data.bdrycond.fct[1001] = lambda x, y, z, nx, ny, nz: a*y
+        data.bdrycond.fct[1002] = lambda x, y, z, nx, ny, nz: a + 0*x
+        data.postproc.set(name='bdrymean', type='bdry_mean', colors=1001)
+        data.postproc.set(name='bdrynflux', type='bdry_nflux', colors=[1000])
+        data.params.scal_glob["kheat"] = 0.1
+        if rhs: data.params.fct_glob["rhs"] = lambda x, y, z: a*np.sin(x+y)
+        return data
+    def _compare(self, results, references, msg):
+        self.assertEqual(len(results), len(references))
+        for res, ref in zip(results, references):
+            res, ref = res.data, ref.data
+            self.assertTrue(np.allclose(res['point']['U'], ref['point']['U'], rtol=1e-9, atol=1e-9), msg)
+            for name in ref['global']:
+                self.assertTrue(np.allclose(res['global'][name], ref['global'][name], rtol=1e-9, atol=1e-9), f"{msg} {name=}")
+    def test_staticBatch(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy.applications.heat import Heat
+        mesh = testmeshes.unitsquare(0.3)
+        factors = [0.5, 1, 2]
+        for fem in ['p1', 'cr1']:
+            for dirichletmethod in ['strong', 'new']:
+                for linearsolver in ['umf', 'pyamg', 'cg']:
+                    msg = f"{fem=} {dirichletmethod=} {linearsolver=}"
+                    args = {'mesh': mesh, 'fem': fem, 'dirichletmethod': dirichletmethod, 'linearsolver': linearsolver}
+                    # problemdatas: only the data of the right-hand side differ
+                    heat = Heat(problemdata=self._problemdata(0), **args)
+                    results = heat.staticBatch(problemdatas=[self._problemdata(a) for a in factors])
+                    references = [Heat(problemdata=self._problemdata(a), **args).static() for a in factors]
+                    self._compare(results, references, msg)
+                    # rhs: sources added to the right-hand side of the problemdata
+                    heat = Heat(problemdata=self._problemdata(1, rhs=False), **args)
+                    fcts = [lambda x, y, z, a=a: a*np.sin(x+y) for a in factors]
+                    results = heat.staticBatch(rhs=np.stack([heat.fem.interpolate(f) for f in fcts], axis=1))
+                    references = []
+                    for f in fcts:
+                        data = self._problemdata(1, rhs=False)
+                        data.params.fct_glob["rhs"] = f
+                        references.append(Heat(problemdata=data, **args).static())
+                    self._compare(results, references, msg + " (rhs)")
+
+#================================================================#
+class TestDirect(unittest.TestCase):
+    """
+    solvers.direct: the column ordering per pattern and the cache of the factorizations
+    """
+    def _matrices(self, n=3):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy import fems
+        # non-symmetric, same pattern and different values
+        mesh = testmeshes.structured(2, 6)
+        p1, rng = fems.p1.P1(mesh=mesh), np.random.default_rng(0)
+        A = p1.computeMatrixDiffusion(np.ones(mesh.ncells)) + p1.computeMassMatrix()
+        matrices = []
+        for i in range(n):
+            B = A.tocsr(copy=True)
+            B.data *= 1 + 0.5*rng.random(B.nnz)
+            matrices.append(B)
+        return matrices, rng.random(A.shape[0])
+    def test_solver(self):
+        import scipy.sparse as sparse
+        import scipy.sparse.linalg as splinalg
+        from simfempy.solvers import direct
+        matrices, b = self._matrices()
+        solver = direct.DirectSolver()
+        for A in matrices:
+            x = solver.factor(A).solve(b)
+            self.assertTrue(np.allclose(x, splinalg.spsolve(A.tocsc(), b), rtol=1e-12, atol=0))
+            B = np.stack([b, 2*b+1], axis=1)
+            self.assertTrue(np.allclose(solver.factor(A).solve(B), splinalg.spsolve(A.tocsc(), B), rtol=1e-12, atol=0))
+        # the COLAMD ordering is computed once, the following factorizations are permuted
+        self.assertEqual((solver.nsymbolic, solver.nfactor), (1, 2*len(matrices)))
+        self.assertIsNotNone(solver.factor(matrices[0]).perm)
+        # a new pattern: new ordering
+        A = matrices[0] + 0.1*sparse.eye(b.shape[0], k=b.shape[0]//2)
+        self.assertTrue(np.allclose(solver.factor(A).solve(b), splinalg.spsolve(A.tocsc(), b), rtol=1e-12, atol=0))
+        self.assertEqual(solver.nsymbolic, 2)
+    def test_cache(self):
+        import scipy.sparse as sparse
+        from simfempy.solvers import direct
+        (A, B, C), b = self._matrices()
+        # default: only the last factorization
+        cache = direct.FactorizationCache()
+        fA = cache.factor(A)
+        self.assertIs(cache.factor(A.copy()), fA)
+        self.assertTrue(np.array_equal(cache.solve(A, b), fA.solve(b)))
+        self.assertIsNot(cache.factor(B), fA)
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2, 'symbolic': 1, 'evictions': 1, 'entries': 1, 'nbytes': cache.factor(B).nbytes})
+        self.assertIsNot(cache.factor(A), fA)
+        self.assertEqual((cache.misses, cache.stats()['symbolic']), (3, 1))
+        # room for two factorizations: the least recently used one is evicted
+        cache = direct.FactorizationCache(maxbytes=2*fA.nbytes)
+        fA, fB = cache.factor(A), cache.factor(B)
+        self.assertIs(cache.factor(A), fA)
+        fC = cache.factor(C)
+        self.assertEqual(list(cache.factorizations.values()), [fA, fC])
+        self.assertEqual((cache.hits, cache.misses, cache.evictions, cache.nbytes), (1, 3, 1, fA.nbytes + fC.nbytes))
+        self.assertEqual(cache.stats()['symbolic'], 1)
+        # the DirectSolver of a pattern is dropped with its last factorization
+        D = A + 0.1*sparse.eye(A.shape[0], k=A.shape[0]//2)
+        cache.factor(D)
+        cache.factor(D*2)
+        self.assertEqual(len(cache.solvers), 1)
+        self.assertEqual(cache.stats()['symbolic'], 1)
+        # setCacheSize() evicts
+        saved = direct.cache
+        try:
+            direct.cache = cache
+            direct.setCacheSize(0)
+            self.assertEqual(len(cache.factorizations), 1)
+        finally:
+            direct.cache = saved
+
+#================================================================#
+class TestAmg(unittest.TestCase):
+    """
+    solvers.amg.AmgManager: reuse, refresh and rebuild of the hierarchies
+    """
+    def _heat(self, mesh):
+        import simfempy.applications.problemdata
+        from simfempy.applications.heat import Heat
+        data = simfempy.applications.problemdata.ProblemData()
+        data.bdrycond.set("Dirichlet", list(mesh.bdrylabels.keys()))
+        data.params.scal_glob['kheat'] = 0.1
+        return Heat(problemdata=data, exactsolution='Quadratic', mesh=mesh, linearsolver='pyamg')
+    def test_manager(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy import fems
+        from simfempy.solvers import amg
+        mesh = testmeshes.structured(2, 16)
+        p1 = fems.p1.P1(mesh=mesh)
+        A = p1.computeMatrixDiffusion(np.ones(mesh.ncells)) + p1.computeMassMatrix()
+        manager = amg.AmgManager(lambda A: amg.smoothedAggregation(A.tocsr()))
+        counts = lambda: (manager.nbuild, manager.nrefresh, manager.nreuse)
+        ml = manager.hierarchy(A)
+        coarse = [level.A.copy() for level in ml.levels]
+        self.assertGreater(len(coarse), 1)
+        self.assertEqual(counts(), (1, 0, 0))
+        # same matrix: reused
+        self.assertIs(manager.hierarchy(A.copy()), ml)
+        self.assertEqual(counts(), (1, 0, 1))
+        # new values: same aggregates, Galerkin products of the new matrix
+        self.assertIs(manager.hierarchy(2*A), ml)
+        self.assertEqual(counts(), (1, 1, 1))
+        for level, Ac in zip(ml.levels, coarse):
+            self.assertTrue(np.allclose(level.A.toarray(), 2*Ac.toarray(), rtol=1e-13, atol=0))
+        b = np.ones(A.shape[0])
+        self.assertTrue(np.linalg.norm(b - 2*A@ml.solve(b, tol=1e-10)) < 1e-8*np.linalg.norm(b))
+        # iteration counts: a worse one triggers a rebuild with the next matrix
+        manager.report(10)
+        manager.report(14)
+        self.assertIs(manager.hierarchy(2*A), ml)
+        manager.report(16)
+        self.assertIsNot(manager.hierarchy(2*A), ml)
+        self.assertEqual(counts(), (2, 1, 2))
+        self.assertIsNone(manager.niter0)
+        # new shape: rebuild
+        p1 = fems.p1.P1(mesh=testmeshes.structured(2, 8))
+        manager.hierarchy(p1.computeMatrixDiffusion(np.ones(p1.mesh.ncells)))
+        self.assertEqual(counts(), (3, 1, 2))
+    def test_application(self):
+        import copy
+        import simfempy.meshes.testmeshes as testmeshes
+        mesh = testmeshes.unitsquare(0.2)
+        heat = self._heat(mesh)
+        ref = heat.static()
+        manager = heat.amg
+        self.assertEqual((manager.nbuild, manager.nrefresh), (1, 0))
+        self.assertIsNotNone(manager.niter0)
+        heat.static()
+        self.assertEqual((manager.nbuild, manager.nrefresh, manager.nreuse), (1, 0, 1))
+        # a new mesh with the same number of unknowns: new manager, the hierarchy is built again
+        renumbered = copy.deepcopy(mesh)
+        renumbered.renumber()
+        heat.setMesh(renumbered)
+        self.assertIsNot(heat.amg, manager)
+        self.assertEqual((heat.amg.nbuild, heat.amg.nrefresh, heat.amg.nreuse), (0, 0, 0))
+        res = heat.static()
+        self.assertEqual((heat.amg.nbuild, heat.amg.nrefresh, heat.amg.nreuse), (1, 0, 0))
+        self.assertTrue(np.allclose(renumbered.toOriginal(res.data['point']['U']), ref.data['point']['U'], rtol=1e-10, atol=1e-12))
+        # dynamic(): the iteration counts are reported
+        heat = self._heat(mesh)
+        heat.dynamic(np.zeros(heat.fem.nunknowns()), t_span=(0, 1), nframes=2, dt=0.1, verbose=0)
+        self.assertEqual(heat.amg.nbuild, 1)
+        self.assertIsNotNone(heat.amg.niter0)
+
+#================================================================#
+class TestMatrixFree(unittest.TestCase):
+    """
+    applications with matrixfree=True (fems.matrixfree) against the assembled matrices
+    """
+    def _problemdata(self, mesh, ncomp=1):
+        import simfempy.applications.problemdata
+        data = simfempy.applications.problemdata.ProblemData()
+        data.ncomp = ncomp
+        colors = list(mesh.bdrylabels.keys())
+        data.bdrycond.set("Dirichlet", colors[:-1])
+        data.bdrycond.set("Neumann", colors[-1:])
+        data.params.scal_glob['kheat'] = 0.1
+        data.params.scal_glob['mu'] = 1
+        return data
+    def _compare(self, application, args, msg, rtol):
+        import scipy.sparse as sparse
+        results = {}
+        for matrixfree in [False, True]:
+            app = application(matrixfree=matrixfree, **args())
+            results[matrixfree] = app.static().data
+            A = app.A[0] if isinstance(app.A, list) else app.A
+            self.assertEqual(sparse.issparse(A), not matrixfree, msg)
+        ref, res = results[False], results[True]
+        for where in ['point', 'cell']:
+            for name, u in ref[where].items():
+                self.assertTrue(np.allclose(res[where][name], u, rtol=0, atol=rtol[name[0]]*np.abs(u).max()), f"{msg} {name=}")
+    def test_static(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        from simfempy.applications.heat import Heat
+        from simfempy.applications.elasticity import Elasticity
+        from simfempy.applications.stokes import Stokes
+        # U: solutions, E, err: derived quantities, k: coefficients
+        rtol = {'U': 1e-10, 'E': 1e-8, 'e': 1e-8, 'k': 0, 'V': 1e-7, 'P': 1e-5}
+        for mesh in [testmeshes.unitsquare(0.3), testmeshes.unitcube(0.5)]:
+            dim = mesh.dimension
+            for fem in ['p1', 'cr1']:
+                for dirichletmethod in ['strong', 'nitsche']:
+                    args = lambda: {'problemdata': self._problemdata(mesh), 'exactsolution': 'Quadratic', 'mesh': mesh, 'fem': fem, 'dirichletmethod': dirichletmethod}
+                    self._compare(Heat, args, f"Heat {dim=} {fem=} {dirichletmethod=}", rtol)
+                args = lambda: {'problemdata': self._problemdata(mesh, dim), 'exactsolution': 'Quadratic', 'mesh': mesh, 'fem': fem, 'dirichletmethod': 'strong'}
+                self._compare(Elasticity, args, f"Elasticity {dim=} {fem=}", rtol)
+            for dirichletmethod in ['strong', 'nitsche']:
+                args = lambda: {'problemdata': self._problemdata(mesh, dim), 'exactsolution': ['Quadratic', 'Linear'], 'mesh': mesh, 'dirichletmethod': dirichletmethod, 'linearsolver': 'iter'}
+                self._compare(Stokes, args, f"Stokes {dim=} {dirichletmethod=}", rtol)
+        self.assertRaises(ValueError, Heat, problemdata=self._problemdata(mesh), dirichletmethod='new', matrixfree=True)
+
+#================================================================#
+class TestCoefficients(unittest.TestCase):
+    def _setup(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        import simfempy.applications.problemdata
+        mesh = testmeshes.structured(2, 6)
+        # two cell labels: left and right half
+        left = mesh.pointsc[:, 0] < 0
+        mesh.cellsoflabel = {10: np.flatnonzero(left), 20: np.flatnonzero(~left)}
+        return mesh, simfempy.applications.problemdata.ProblemData().params
+    def _labels(self, mesh):
+        label = np.empty(mesh.ncells, dtype=int)
+        for color, cells in mesh.cellsoflabel.items(): label[cells] = color
+        return label
+    def test_evaluate(self):
+        import math, warnings
+        from simfempy.applications.coefficient import Coefficients
+        mesh, params = self._setup()
+        label, coeffs = self._labels(mesh), Coefficients()
+        params.scal_glob['a'] = 2.5
+        params.scal_cells['b'] = {10: 1., 20: 3.}
+        params.fct_glob['c'] = lambda color, x, y, z: color + x*y
+        cellsofnodes = mesh.nodeToCells.tolil().rows
+        for where, points in [('cell', mesh.pointsc), ('face', mesh.pointsf), ('node', mesh.points)]:
+            self.assertTrue(np.array_equal(coeffs.evaluate(mesh, params, 'a', where), np.full(len(points), 2.5)))
+            b, c = coeffs.evaluate(mesh, params, 'b', where), coeffs.evaluate(mesh, params, 'c', where)
+            self.assertFalse(b.flags.writeable or c.flags.writeable)
+            # faces: label of cellsOfFaces[:,0], nodes: label of one of their cells
+            if where == 'cell': colors = label
+            elif where == 'face': colors = label[mesh.cellsOfFaces[:,0]]
+            else: colors = np.where(b == 1, 10, 20)
+            if where == 'node':
+                self.assertTrue(all(color in label[cells] for color, cells in zip(colors, cellsofnodes)))
+            self.assertTrue(np.array_equal(b, np.where(colors == 10, 1., 3.)))
+            self.assertTrue(np.allclose(c, colors + points[:,0]*points[:,1], rtol=1e-15))
+        # cached as long as the parameter is unchanged
+        n = coeffs.nevaluations
+        self.assertIs(coeffs.cell(mesh, params, 'c'), coeffs.cell(mesh, params, 'c'))
+        self.assertEqual(coeffs.nevaluations, n)
+        params.fct_glob['c'] = lambda color, x, y, z: 2*x
+        self.assertTrue(np.allclose(coeffs.cell(mesh, params, 'c'), 2*mesh.pointsc[:,0]))
+        # not vectorized: pointwise with a warning, other errors are raised
+        params.fct_glob['d'] = lambda color, x, y, z: 1. if x > 0 else 2.
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            d = coeffs.cell(mesh, params, 'd')
+        self.assertEqual(len(w), 1)
+        self.assertTrue(np.array_equal(d, np.where(mesh.pointsc[:,0] > 0, 1., 2.)))
+        params.fct_glob['e'] = lambda color, x, y, z: {}[color]
+        self.assertRaises(KeyError, coeffs.cell, mesh, params, 'e')
+        params.fct_glob['f'] = lambda color, x, y, z: math.sqrt(-1-x*x)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.assertRaises(ValueError, coeffs.cell, mesh, params, 'f')
+    def test_solution(self):
+        from simfempy.applications.coefficient import Coefficients
+        mesh, params = self._setup()
+        coeffs = Coefficients()
+        params.fct_glob['k'] = lambda color, x, y, z, u: color + x*u
+        u = np.linspace(0, 1, mesh.ncells)
+        exact = lambda u: self._labels(mesh) + mesh.pointsc[:,0]*u
+        self.assertTrue(np.allclose(coeffs.cell(mesh, params, 'k', u), exact(u), rtol=1e-15))
+        # only the cells with a new value of u are evaluated
+        u = u.copy()
+        u[[3, 40]] = 7
+        self.assertTrue(np.allclose(coeffs.cell(mesh, params, 'k', u), exact(u), rtol=1e-15))
+        self.assertTrue(np.allclose(coeffs.cell(mesh, params, 'k', 2*u), exact(2*u), rtol=1e-15))
+    def test_application(self):
+        import simfempy.meshes.testmeshes as testmeshes
+        import simfempy.applications.problemdata
+        from simfempy.applications.heat import Heat
+        data = simfempy.applications.problemdata.ProblemData()
+        data.bdrycond.set("Dirichlet", [1000, 1001, 1002, 1003])
+        data.params.scal_glob['kheat'] = 0.1
+        heat = Heat(problemdata=data, mesh=testmeshes.structured(2, 4))
+        # the arrays of the application are copies of the cached ones
+        k = heat.compute_cell_vector_from_params('kheat', data.params)
+        k *= 2
+        self.assertTrue(np.all(heat.compute_cell_vector_from_params('kheat', data.params) == 0.1))
+        heat.kheatcell[:] = 0.2
+
+#================================================================#
+class TestTools(unittest.TestCase):
+    def test_addAt(self):
+        from simfempy.tools import npext
+        rng = np.random.default_rng(0)
+        ind2, ind1 = rng.integers(0, 50, size=(30, 3)), rng.integers(0, 1000, size=20)
+        cases = [
+            (np.zeros(50), ind2, rng.random((30, 3))),
+            (np.zeros(50), ind2, rng.random((30, 1))),
+            (np.zeros(50), ind2.T, rng.random(30)),
+            (np.zeros(50), ind2, 2.5),
+            (np.zeros(50, dtype=int), ind2, 1),
+            (np.zeros(50, dtype=np.int32), ind2, 3),
+            (np.zeros(1000), ind1, rng.random(20)),
+            (np.zeros((50, 4))[:, 1], ind2, rng.random((30, 3))),
+            (np.zeros(100)[::2], ind2, rng.random((30, 3))),
+        ]
+        try:
+            for method in ['auto', 'bincount', 'unique']:
+                npext.setScatterMethod(method)
+                for i, (b, ind, values) in enumerate(cases):
+                    ref, res = b.copy(), b.copy()
+                    np.add.at(ref, ind, values)
+                    r = npext.addAt(res, ind, values)
+                    self.assertIs(r, res)
+                    self.assertEqual(res.dtype, ref.dtype)
+                    self.assertTrue(np.allclose(res, ref, rtol=1e-14, atol=0), f"{method=} {i=}")
+                # b is a view: the base is changed
+                base = np.zeros((50, 4))
+                npext.addAt(base[:, 1], ind2, 1.)
+                self.assertTrue(np.array_equal(base[:, 1], np.bincount(ind2.ravel(), minlength=50)) and not base[:, [0,2,3]].any())
+        finally:
+            npext.setScatterMethod('auto')
+
+    def test_analyticalFunction(self):
+        from simfempy.tools.analyticalfunction import AnalyticalFunction
+        x, y, z = np.array([0.5, 1., 2.]), np.array([1., 0., -1.]), np.array([0., 3., 1.])
+        u = AnalyticalFunction('x**4*y + sin(z)')
+        self.assertTrue(np.allclose(u(x, y, z), x**4*y + np.sin(z)))
+        fx, fxx = u.fct_x, u.fct_xx
+        self.assertEqual((len(fx), len(fxx), len(fxx[0])), (3, 3, 3))
+        for f, g in [(fx[0], 4*x**3*y), (fx[1], x**4), (fx[2], np.cos(z)), (fxx[0][0], 12*x**2*y), (fxx[0][1], 4*x**3), (fxx[1][0], 4*x**3),
+                     (fxx[1][1], 0*x), (fxx[2][2], -np.sin(z)), (u.fct_xxxx, 24*y), (u.x, 4*x**3*y)]:
+            self.assertTrue(np.allclose(f(x, y, z), g, rtol=1e-14))
+        self.assertTrue(np.allclose(u.dd(2, 2, x, y, z), -np.sin(z), rtol=1e-14))
+        # constant derivatives are broadcast
+        self.assertEqual(fxx[1][1](x, y, z).shape, x.shape)
+        u = AnalyticalFunction('x*x', dim=1)
+        self.assertTrue(np.allclose(u.fct_x[0](x), 2*x) and np.allclose(u.fct_xx[0][0](x), 2))
+    def test_expressionCache(self):
+        import os, tempfile
+        from simfempy.tools import analyticalfunction
+        expr, x = 'x0*x0+sin(x1)', (np.array([1., 2.]), np.array([0., 1.]))
+        ref = analyticalfunction.compileExpression(expr, 2)(*x)
+        cachedir, compiled = analyticalfunction.cachedir, dict(analyticalfunction._compiled)
+        try:
+            with tempfile.TemporaryDirectory() as dirname:
+                analyticalfunction.setCacheDir(dirname)
+                analyticalfunction._compiled.clear()
+                self.assertTrue(np.allclose(analyticalfunction.compileExpression(expr, 2)(*x), ref))
+                filename = next(os.path.join(dirname, f) for f in os.listdir(dirname) if f.endswith('.py'))
+                # a changed file is not executed but generated again
+                with open(filename) as file: source = file.read()
+                with open(filename, 'w') as file: file.write(source.replace('numpy.sin', '2*numpy.sin'))
+                analyticalfunction._compiled.clear()
+                self.assertTrue(np.allclose(analyticalfunction.compileExpression(expr, 2)(*x), ref))
+                with open(filename) as file: self.assertEqual(file.read(), source)
+        finally:
+            analyticalfunction.setCacheDir(cachedir)
+            analyticalfunction._compiled.clear()
+            analyticalfunction._compiled.update(compiled)
 
 #================================================================#
 if __name__ == '__main__':
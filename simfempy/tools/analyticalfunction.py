@@ -3,15 +3,111 @@
 
 """
 
+import os, hashlib, hmac
 import numpy as np
-import sympy
 
 
+# compiled functions by (expr, dim, derivative), shared by all AnalyticalFunction
+_compiled = {}
+# directory of the generated numpy sources, a warm start does not import sympy
+# opt-in (setCacheDir() or environment variable SIMFEMPY_CACHE), None: no disk cache
+cachedir = os.environ.get('SIMFEMPY_CACHE', None)
+def setCacheDir(dirname):
+    global cachedir
+    cachedir = dirname
+# version of _generateSource(), part of the key: a new format does not read old files
+_sourceformat = 1
+# ---------------------------------------------------------------- #
+def _broadcast(f):
+    """
+    constant expressions (and derivatives) give scalars: broadcast to the shape of the arguments,
+    an expression being a variable returns it: copy
+    """
+    def _f(*x):
+        x = [np.asarray(xi) for xi in x]
+        r = f(*x)
+        shape = np.broadcast(*x).shape
+        if np.shape(r) != shape: return np.full(shape, r, dtype=float)
+        if any(r is xi for xi in x): return np.array(r, dtype=float)
+        return np.asarray(r, dtype=float)
+    return _f
+# ---------------------------------------------------------------- #
+def _versions():
+    from importlib import metadata
+    try: sympyversion = metadata.version('sympy')
+    except metadata.PackageNotFoundError: sympyversion = None
+    return f"sympy={sympyversion} numpy={np.__version__}"
+# ---------------------------------------------------------------- #
+def _generateSource(expr, dim, derivative):
+    """
+    python source of a function of x0,...,x{dim-1} evaluating the derivative of expr with numpy
+    """
+    import sympy
+    from sympy.printing.numpy import NumPyPrinter
+    s = sympy.symbols([f"x{i}" for i in range(dim)])
+    f = sympy.sympify(expr)
+    if len(derivative): f = sympy.diff(f, *[s[i] for i in derivative])
+    return f"def _f({', '.join(map(str, s))}):\n    return {NumPyPrinter().doprint(f)}\n"
+# ---------------------------------------------------------------- #
+def _secret():
+    """
+    key of the signatures of the cached sources, created in cachedir (readable by the owner only)
+    None (no disk cache) if it cannot be created or is accessible to others
+    """
+    filename = os.path.join(cachedir, 'secret')
+    try:
+        os.makedirs(cachedir, exist_ok=True)
+        try:
+            fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as file: file.write(os.urandom(32))
+        except FileExistsError: pass
+        stat = os.stat(filename)
+        if stat.st_mode & 0o077 or (hasattr(os, 'getuid') and stat.st_uid != os.getuid()): return None
+        with open(filename, 'rb') as file: return file.read()
+    except OSError:
+        return None
+# ---------------------------------------------------------------- #
+def _source(expr, dim, derivative):
+    """
+    the generated source, read from (or written to) cachedir, keyed by expression, dimension, derivative,
+    format and versions; a file is only used if its signature (hmac of key and source) matches
+    """
+    secret = None if cachedir is None else _secret()
+    if secret is None: return _generateSource(expr, dim, derivative)
+    key = f"# {expr!r} {dim} {derivative} format={_sourceformat} {_versions()}\n"
+    filename = os.path.join(cachedir, hashlib.sha1(key.encode()).hexdigest() + '.py')
+    sign = lambda source: f"# {hmac.new(secret, (key + source).encode(), 'sha256').hexdigest()}\n"
+    try:
+        with open(filename) as file:
+            signature, source = file.readline(), file.read()
+        if source.startswith(key) and hmac.compare_digest(signature, sign(source[len(key):])): return source[len(key):]
+    except (OSError, UnicodeDecodeError): pass
+    source = _generateSource(expr, dim, derivative)
+    try:
+        tmpname = f"{filename}.{os.getpid()}"
+        with open(tmpname, 'w') as file:
+            file.write(sign(source) + key + source)
+        os.replace(tmpname, filename)
+    except OSError: pass
+    return source
+# ---------------------------------------------------------------- #
+def compileExpression(expr, dim, derivative=()):
+    """
+    numpy function (with broadcasting) of the derivative of expr with respect to the variables with indices in derivative,
+    memoized by (expr, dim, derivative)
+    """
+    key = (expr, dim, derivative)
+    if key not in _compiled:
+        namespace = {'numpy': np}
+        exec(compile(_source(expr, dim, derivative), f"<{expr} {derivative}>", 'exec'), namespace)
+        _compiled[key] = _broadcast(namespace['_f'])
+    return _compiled[key]
+
 #=================================================================#
 class AnalyticalFunction():
     """
     computes numpy vectorized functions for the function and its dericatives up to two
-    for a given expression, derivatives computed with sympy
+    for a given expression, derivatives computed with sympy on first use (compileExpression())
     """
     def __repr__(self):
         return f"expr={str(self.expr)}"
@@ -26,54 +122,49 @@ class AnalyticalFunction():
         if dim==1 and expr.find('x0') == -1:
             expr = expr.replace('x', 'x0')
         self.dim, self.expr = dim, expr
-        symbc = ""
-        for i in range(dim): symbc += f"x{i},"
-        symbc = symbc[:-1]
-        s = sympy.symbols(symbc)
-        # print(f"{expr=} {symbc=} {s=}")
-        self.fct = np.vectorize(sympy.lambdify(symbc,expr))
-        self.fct_x = []
-        self.fct_xx = []
-        for i in range(dim):
-            self.fct_xxxx = np.vectorize(sympy.lambdify(symbc, sympy.diff(expr, s[0], 4)),otypes=[float])
-            if dim==1: fx = sympy.diff(expr, s)
-            else: fx = sympy.diff(expr, s[i])
-            self.fct_x.append(np.vectorize(sympy.lambdify(symbc, fx),otypes=[float]))
-            self.fct_xx.append([])
-            for j in range(dim):
-                if dim == 1: fxx = sympy.diff(fx, s)
-                else: fxx = sympy.diff(fx, s[j])
-                self.fct_xx[i].append(np.vectorize(sympy.lambdify(symbc, fxx),otypes=[float]))
+        self.fct = compileExpression(expr, dim)
+    # the lists of derivatives of the former (sympy.lambdify) version, compiled on access
+    @property
+    def fct_x(self):
+        return [self.derivative(i) for i in range(self.dim)]
+    @property
+    def fct_xx(self):
+        return [[self.derivative(i, j) for j in range(self.dim)] for i in range(self.dim)]
+    @property
+    def fct_xxxx(self):
+        return self.derivative(0, 0, 0, 0)
+    def derivative(self, *indices):
+        return compileExpression(self.expr, self.dim, indices)
     def d(self, i, *x):
-        return self.fct_x[i](*x)
+        return self.derivative(i)(*x)
     def x(self, *x):
-        return self.fct_x[0](*x)
+        return self.derivative(0)(*x)
     def y(self, *x):
-        return self.fct_x[1](*x)
+        return self.derivative(1)(*x)
     def z(self, *x):
-        return self.fct_x[2](*x)
+        return self.derivative(2)(*x)
     def dd(self, i, j, *x):
-        return self.fct_xx[i][j](*x)
+        return self.derivative(i, j)(*x)
     def dddd(self, *x):
-        return self.fct_xxxx(*x)
+        return self.derivative(0, 0, 0, 0)(*x)
     def xx(self, *x):
-        return self.fct_xx[0][0](*x)
+        return self.derivative(0, 0)(*x)
     def xy(self, *x):
-        return self.fct_xx[0][1](*x)
+        return self.derivative(0, 1)(*x)
     def xz(self, *x):
-        return self.fct_xx[0][2](*x)
+        return self.derivative(0, 2)(*x)
     def yy(self, *x):
-        return self.fct_xx[1][1](*x)
+        return self.derivative(1, 1)(*x)
     def yx(self, *x):
-        return self.fct_xx[1][0](*x)
+        return self.derivative(1, 0)(*x)
     def yz(self, *x):
-        return self.fct_xx[1][2](*x)
+        return self.derivative(1, 2)(*x)
     def zz(self, *x):
-        return self.fct_xx[2][2](*x)
+        return self.derivative(2, 2)(*x)
     def zx(self, *x):
-        return self.fct_xx[2][0](*x)
+        return self.derivative(2, 0)(*x)
     def zy(self, *x):
-        return self.fct_xx[2][1](*x)
+        return self.derivative(2, 1)(*x)
 
 #=================================================================#
 def analyticalSolution(function, dim, ncomp=1, random=True):
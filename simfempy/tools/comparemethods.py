@@ -56,7 +56,7 @@ class CompareMethods(object):
                 mesh = self._mesh_from_geom_or_fct()
                 gmshrefine = True
                 if niter is None: raise KeyError("please give 'niter' ({self.paramname=}")
-                params = [mesh.ncells*mesh.dimension**i for i in range(niter)]
+                params = [mesh.ncells*2**(mesh.dimension*i) for i in range(niter)]
             else:
                 params = h
                 gmshrefine = False
@@ -72,7 +72,7 @@ class CompareMethods(object):
             if self.verbose: print(f"{self.paramname=} {param=}")
             if self.paramname == "ncells":
                 if gmshrefine:
-                    mesh = simfempy.meshes.pygmshext.gmshRefine(mesh)
+                    mesh = mesh.refine()
                 else:
                     mesh = self._mesh_from_geom_or_fct(param)
                 self.parameters.append(mesh.ncells)
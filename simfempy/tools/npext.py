@@ -1,5 +1,60 @@
 import numpy as np
 
+# ------------------------------------- #
+# index dtype policy for mesh and stencil arrays: 'auto' (int32 whenever the counts allow), 'int32' or 'int64'
+indexpolicy = 'auto'
+def setIndexPolicy(policy):
+    global indexpolicy
+    if policy not in ['auto', 'int32', 'int64']: raise ValueError(f"unknown {policy=}")
+    indexpolicy = policy
+def indexType(n):
+    """
+    signed integer type for indices in [-1, n) (-1 is used for missing neighbours)
+    """
+    if indexpolicy == 'int64': return np.int64
+    if n > np.iinfo(np.int32).max:
+        if indexpolicy == 'int32': raise ValueError(f"{n=} too large for int32 indices")
+        return np.int64
+    return np.int32
+def asIndex(a, n=None):
+    """
+    a as array of index type (no copy if it already is)
+    """
+    a = np.asarray(a)
+    if n is None: n = int(a.max())+1 if a.size else 0
+    return a.astype(indexType(n), copy=False)
+
+# ------------------------------------- #
+# b[indices] += values with summation over repeated indices (replaces np.add.at, which is slow)
+# 'auto': bincount, or bincount on the unique indices if they are few compared to len(b)
+# 'bincount', 'unique' or 'numpy' (np.add.at)
+scattermethod = 'auto'
+def setScatterMethod(method):
+    global scattermethod
+    if method not in ['auto', 'bincount', 'unique', 'numpy']: raise ValueError(f"unknown {method=}")
+    scattermethod = method
+def addAt(b, indices, values):
+    """
+    as np.add.at(b, indices, values) for one-dimensional b (may be a view), values are broadcast to indices
+    (indices >= 0, negative indices are not wrapped around)
+    """
+    indices, method = np.asarray(indices), scattermethod
+    counting = np.ndim(values) == 0 and np.asarray(values).dtype.kind in 'iub'
+    if b.ndim != 1 or b.dtype.kind not in 'fi' or (b.dtype.kind == 'i' and not counting): method = 'numpy'
+    if method == 'numpy':
+        np.add.at(b, indices, values)
+        return b
+    weights = None if counting else np.broadcast_to(values, indices.shape).ravel()
+    indices = indices.ravel()
+    if method == 'unique' or (method == 'auto' and 16*len(indices) < len(b)):
+        ind, inv = np.unique(indices, return_inverse=True)
+        r = np.bincount(inv.ravel(), weights=weights)
+    else:
+        ind, r = slice(None), np.bincount(indices, weights=weights, minlength=len(b))
+    if counting and values != 1: r *= values
+    b[ind] += r
+    return b
+
 # ------------------------------------- #
 def positionin(x,y):
     # assert len(x.shape) ==2
@@ -12,14 +67,8 @@ def positionin(x,y):
             pos[i]= np.nonzero(y[i]==x[i])[0]
             # print(f"{x[i]=} {y[i]=} {pos[i]=}")
         return pos
-    for i in range(x.shape[0]):
-        index = np.argsort(y[i])
-        ysorted = y[i][index]
-        sorted_index = np.searchsorted(ysorted, x[i])
-        pos[i] = np.take(index, sorted_index, mode="clip")
-        # print(f"{x[i]=}")
-        # print(f"{y[i]=}")
-        # print(f"{pos[i]=}")
+    # rows are short (simplices): compare all entries at once
+    pos[:] = np.argmax(y[:, np.newaxis, :] == x[:, :, np.newaxis], axis=2)
     return pos
 
 # ------------------------------------- #